@@ -6,7 +6,6 @@ from fastapi import APIRouter, Depends, HTTPException, status, UploadFile, File,
 from sqlalchemy.orm import Session
 import os
 import hashlib
-import shutil
 from pathlib import Path
 
 from ....core.database import get_db
@@ -21,17 +20,10 @@ from ....schemas.document import (
     DocumentSearch
 )
 from ....core.config import settings
+from ....core.uploads import save_upload
 
 router = APIRouter()
 
-def calculate_file_hash(file_path: str) -> str:
-    """Calculate SHA-256 hash of a file"""
-    hash_sha256 = hashlib.sha256()
-    with open(file_path, "rb") as f:
-        for chunk in iter(lambda: f.read(4096), b""):
-            hash_sha256.update(chunk)
-    return hash_sha256.hexdigest()
-
 @router.post("/upload", response_model=FileUploadResponse)
 async def upload_document(
     file: UploadFile = File(...),
@@ -40,11 +32,20 @@ async def upload_document(
     category: Optional[str] = Form(None),
     tags: Optional[str] = Form(None),
     is_public: bool = Form(False),
+    extracted_text: Optional[str] = Form(None),
+    ocr_confidence: Optional[int] = Form(None, ge=0, le=100),
     current_user: User = Depends(get_current_user),
     db: Session = Depends(get_db)
 ):
     """
     Upload a new document
+
+    Clients that already ran the file through the ML service can pass the
+    extracted text and its OCR confidence (0-100) so the document is stored
+    as processed.
+
+    The file must not exceed MAX_FILE_SIZE (413) and its extension and
+    content must match one of ALLOWED_FILE_TYPES (415).
     """
     # Create uploads directory if it doesn't exist
     upload_dir = Path(settings.UPLOAD_DIR)
@@ -55,13 +56,8 @@ async def upload_document(
     unique_filename = f"{current_user.id}_{title}_{hashlib.md5(file.filename.encode()).hexdigest()}{file_extension}"
     file_path = upload_dir / unique_filename
     
-    # Save file
-    with open(file_path, "wb") as buffer:
-        shutil.copyfileobj(file.file, buffer)
-    
-    # Calculate file hash and size
-    file_hash = calculate_file_hash(str(file_path))
-    file_size = file_path.stat().st_size
+    # Save file, validating type and size; the hash is computed during the copy
+    file_size, file_hash = await save_upload(file, file_path)
     
     # Create database record
     db_document = Document(
@@ -75,6 +71,9 @@ async def upload_document(
         file_hash=file_hash,
         category=category,
         tags=tags,
+        extracted_text=extracted_text,
+        ocr_confidence=ocr_confidence,
+        is_processed=extracted_text is not None,
         is_public=is_public,
         owner_id=current_user.id
     )
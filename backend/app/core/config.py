@@ -40,6 +40,13 @@ class Settings(BaseSettings):
     SMTP_USERNAME: Optional[str] = None
     SMTP_PASSWORD: Optional[str] = None
     
+    # Request profiling (see app/core/profiling.py)
+    PROFILING_ENABLED: bool = False
+    PROFILE_DIR: str = "./profiles"
+    PROFILE_SAMPLE_RATE: float = 0.0
+    PROFILE_TOKEN: Optional[str] = None
+    PROFILE_KEEP: int = 100
+    
     # Redis
     REDIS_URL: str = "redis://localhost:6379/0"
     
@@ -0,0 +1,74 @@
+"""
+On-demand cProfile of individual requests
+
+When PROFILING_ENABLED is set, a request is profiled if it carries an
+``X-Profile-Token`` header matching PROFILE_TOKEN, or at random with
+probability PROFILE_SAMPLE_RATE. The pstats file is written to PROFILE_DIR
+(keeping the PROFILE_KEEP newest) and named in the ``X-Profile-File``
+response header; open it with ``python -m pstats`` or snakeviz.
+
+Sampling mode and the /profiles endpoints live in the ML service
+(frontend/backend-ml/profiling.py); the API only needs the pstats capture.
+"""
+import cProfile
+import random
+import re
+import threading
+from datetime import datetime
+from pathlib import Path
+
+from .config import settings
+
+PROFILE_DIR = Path(settings.PROFILE_DIR)
+
+# cProfile cannot run two profilers on the same thread
+_busy = threading.Lock()
+
+
+def _requested(scope) -> bool:
+    if settings.PROFILE_TOKEN:
+        for name, value in scope.get("headers", ()):
+            if name == b"x-profile-token":
+                return value.decode("latin-1") == settings.PROFILE_TOKEN
+    rate = settings.PROFILE_SAMPLE_RATE
+    return rate > 0 and random.random() < rate
+
+
+def _prune():
+    """Keep only the PROFILE_KEEP most recent profiles"""
+    files = sorted(PROFILE_DIR.glob("*.prof"), key=lambda path: path.stat().st_mtime, reverse=True)
+    for path in files[settings.PROFILE_KEEP:]:
+        path.unlink(missing_ok=True)
+
+
+class ProfilingMiddleware:
+    """ASGI middleware that profiles selected requests on the event loop thread"""
+
+    def __init__(self, app):
+        self.app = app
+        PROFILE_DIR.mkdir(parents=True, exist_ok=True)
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not _requested(scope) or not _busy.acquire(blocking=False):
+            await self.app(scope, receive, send)
+            return
+
+        slug = re.sub(r"[^A-Za-z0-9_-]+", "_", scope["path"]).strip("_")[:60] or "root"
+        filename = f"{datetime.now():%Y%m%d-%H%M%S-%f}_{scope['method']}_{slug}.prof"
+
+        async def send_with_profile(message):
+            if message["type"] == "http.response.start":
+                message["headers"] = list(message.get("headers", [])) + [
+                    (b"x-profile-file", filename.encode("latin-1"))
+                ]
+            await send(message)
+
+        profiler = cProfile.Profile()
+        profiler.enable()
+        try:
+            await self.app(scope, receive, send_with_profile)
+        finally:
+            profiler.disable()
+            _busy.release()
+            profiler.dump_stats(str(PROFILE_DIR / filename))
+            _prune()
@@ -0,0 +1,184 @@
+"""
+Upload validation: size limit and file type
+
+MAX_FILE_SIZE and ALLOWED_FILE_TYPES are enforced while the upload is being
+copied, not after it is on disk:
+
+- the first chunk is sniffed for the magic bytes of the file's extension, so
+  a wrong-type upload is rejected (415) after reading a few KB
+- the copy stops as soon as the file exceeds MAX_FILE_SIZE (413) and the
+  partial file is removed
+
+Starlette parses the whole multipart body before the endpoint runs, so
+UploadLimitMiddleware also rejects requests whose declared Content-Length is
+already over the limit before any of the body is read.
+"""
+import hashlib
+import json
+import os
+import re
+from pathlib import Path
+from typing import Dict, Optional, Set, Tuple
+
+from fastapi import HTTPException, UploadFile
+from fastapi.concurrency import run_in_threadpool
+
+from .config import settings
+
+_CHUNK_SIZE = 1024 * 1024
+
+# Bytes read from the start of the upload to recognize the file type
+_SNIFF_BYTES = 8 * 1024
+
+_SIZE_UNITS = {"": 1, "B": 1, "KB": 1024, "MB": 1024 ** 2, "GB": 1024 ** 3}
+
+# Magic bytes per extension; None means plain text (no NUL bytes)
+_SIGNATURES: Dict[str, Optional[Tuple[bytes, ...]]] = {
+    "pdf": (b"%PDF-",),
+    "png": (b"\x89PNG\r\n\x1a\n",),
+    "jpg": (b"\xff\xd8\xff",),
+    "jpeg": (b"\xff\xd8\xff",),
+    "gif": (b"GIF87a", b"GIF89a"),
+    # Office Open XML is a ZIP archive, legacy Word an OLE2 compound file
+    "docx": (b"PK\x03\x04",),
+    "doc": (b"\xd0\xcf\x11\xe0\xa1\xb1\x1a\xe1",),
+    "txt": None,
+}
+
+
+def parse_size(value: str) -> int:
+    """Parse a size such as ``"50MB"`` or ``"512 KB"`` into bytes (0 = no limit)"""
+    match = re.fullmatch(r"\s*(\d+(?:\.\d+)?)\s*([KMG]?B?)\s*", value.upper())
+    if not match:
+        raise ValueError(f"Invalid size: {value!r}")
+    return int(float(match.group(1)) * _SIZE_UNITS[match.group(2)])
+
+
+MAX_UPLOAD_BYTES = parse_size(settings.MAX_FILE_SIZE)
+
+ALLOWED_TYPES: Set[str] = {
+    extension.strip().lower().lstrip(".")
+    for extension in settings.ALLOWED_FILE_TYPES.split(",")
+    if extension.strip()
+}
+
+
+def check_file_type(filename: str, head: bytes) -> str:
+    """
+    Validate the extension against ALLOWED_FILE_TYPES and the first bytes of
+    the file against that extension's magic bytes
+
+    Returns:
+        The normalized extension
+
+    Raises:
+        HTTPException: 415 if the type is not allowed or the content does not match
+    """
+    extension = Path(filename or "").suffix.lower().lstrip(".")
+    if extension not in ALLOWED_TYPES:
+        raise HTTPException(
+            status_code=415,
+            detail=f"File type not allowed: .{extension or '?'} (allowed: {', '.join(sorted(ALLOWED_TYPES))})"
+        )
+
+    signatures = _SIGNATURES.get(extension)
+    if signatures is None:
+        # Plain text, or an allowed extension without a known signature
+        valid = extension != "txt" or b"\x00" not in head
+    elif extension == "pdf":
+        # PDF readers accept junk before the header
+        valid = b"%PDF-" in head[:1024]
+    else:
+        valid = head.startswith(signatures)
+
+    if not valid:
+        raise HTTPException(status_code=415, detail=f"File content does not match its .{extension} extension")
+    return extension
+
+
+def _format_size(size: int) -> str:
+    for unit in ("GB", "MB", "KB"):
+        if size >= _SIZE_UNITS[unit] and size % _SIZE_UNITS[unit] == 0:
+            return f"{size // _SIZE_UNITS[unit]}{unit}"
+    return f"{size} bytes"
+
+
+def _too_large(max_bytes: int) -> HTTPException:
+    return HTTPException(status_code=413, detail=f"File exceeds the maximum size of {_format_size(max_bytes)}")
+
+
+def _copy(head: bytes, source, path: Path, max_bytes: int) -> Tuple[int, str]:
+    size = len(head)
+    digest = hashlib.sha256(head)
+    with open(path, "wb") as buffer:
+        buffer.write(head)
+        for chunk in iter(lambda: source.read(_CHUNK_SIZE), b""):
+            size += len(chunk)
+            if max_bytes and size > max_bytes:
+                raise _too_large(max_bytes)
+            digest.update(chunk)
+            buffer.write(chunk)
+    return size, digest.hexdigest()
+
+
+async def save_upload(file: UploadFile, path: Path, max_bytes: int = MAX_UPLOAD_BYTES) -> Tuple[int, str]:
+    """
+    Validate and copy an upload to ``path``
+
+    Returns:
+        The file size and its SHA-256 hash, computed during the copy
+
+    Raises:
+        HTTPException: 415 for a disallowed or mismatched type, 413 when the
+            file exceeds ``max_bytes``; nothing is left on disk in either case
+    """
+    head = await file.read(_SNIFF_BYTES)
+    check_file_type(file.filename, head)
+    if max_bytes and len(head) > max_bytes:
+        raise _too_large(max_bytes)
+
+    try:
+        return await run_in_threadpool(_copy, head, file.file, path, max_bytes)
+    except HTTPException:
+        if os.path.exists(path):
+            os.remove(path)
+        raise
+
+
+class UploadLimitMiddleware:
+    """
+    ASGI middleware that answers 413 before reading the body when a POST to
+    one of ``paths`` declares a Content-Length over ``max_body``
+
+    ``max_bytes`` is the per-file limit reported to the client; ``max_body``
+    (defaults to ``max_bytes``) leaves room for the other form fields.
+    """
+
+    def __init__(self, app, paths, max_bytes: int, max_body: Optional[int] = None):
+        self.app = app
+        self.paths = set(paths)
+        self.max_bytes = max_bytes
+        self.max_body = max_body if max_body is not None else max_bytes
+
+    async def __call__(self, scope, receive, send):
+        if (self.max_body and scope["type"] == "http" and scope["method"] == "POST"
+                and scope["path"] in self.paths):
+            for name, value in scope["headers"]:
+                if name == b"content-length" and value.isdigit() and int(value) > self.max_body:
+                    await self._reject(send)
+                    return
+        await self.app(scope, receive, send)
+
+    async def _reject(self, send):
+        body = json.dumps({"detail": _too_large(self.max_bytes).detail}).encode("utf-8")
+        await send({
+            "type": "http.response.start",
+            "status": 413,
+            "headers": [
+                (b"content-type", b"application/json"),
+                (b"content-length", str(len(body)).encode("latin-1")),
+                # The body was not read: close instead of draining it
+                (b"connection", b"close"),
+            ],
+        })
+        await send({"type": "http.response.body", "body": body})
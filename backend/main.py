@@ -7,6 +7,8 @@ from fastapi.staticfiles import StaticFiles
 import os
 
 from app.core.config import settings
+from app.core import profiling
+from app.core.uploads import MAX_UPLOAD_BYTES, UploadLimitMiddleware
 
 try:
     from app.core.database import engine
@@ -37,6 +39,16 @@ app = FastAPI(
     openapi_url=f"{settings.API_V1_STR}/openapi.json"
 )
 
+# Reject oversized uploads from their Content-Length before the body is read;
+# added before CORS so the 413 still carries CORS headers. The form may also
+# carry the extracted text, so the body may be up to twice the file limit.
+app.add_middleware(
+    UploadLimitMiddleware,
+    paths=[f"{settings.API_V1_STR}/documents/upload"],
+    max_bytes=MAX_UPLOAD_BYTES,
+    max_body=2 * MAX_UPLOAD_BYTES,
+)
+
 # Set up CORS
 if settings.BACKEND_CORS_ORIGINS:
     app.add_middleware(
@@ -47,6 +59,10 @@ if settings.BACKEND_CORS_ORIGINS:
         allow_headers=["*"],
     )
 
+# On-demand request profiling; not installed at all unless enabled
+if settings.PROFILING_ENABLED:
+    app.add_middleware(profiling.ProfilingMiddleware)
+
 # Include API router only if database is ready
 if DATABASE_READY and api_router:
     app.include_router(api_router, prefix=settings.API_V1_STR)
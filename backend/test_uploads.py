@@ -0,0 +1,130 @@
+"""
+Tests for upload validation: size parsing, type sniffing and the size limit middleware
+"""
+import asyncio
+import io
+import json
+
+import pytest
+from fastapi import HTTPException, UploadFile
+
+from app.core import uploads
+from app.core.uploads import UploadLimitMiddleware, check_file_type, parse_size
+
+PDF = b"%PDF-1.7\n" + b"0" * 100
+
+
+@pytest.mark.parametrize("value, size", [
+    ("50MB", 50 * 1024 ** 2),
+    ("512 KB", 512 * 1024),
+    ("1.5gb", int(1.5 * 1024 ** 3)),
+    ("100B", 100),
+    ("2048", 2048),
+    ("0", 0),
+])
+def test_parse_size(value, size):
+    assert parse_size(value) == size
+
+
+@pytest.mark.parametrize("value", ["", "MB", "-1MB", "10TB", "ten"])
+def test_parse_size_rejects_invalid(value):
+    with pytest.raises(ValueError):
+        parse_size(value)
+
+
+@pytest.mark.parametrize("filename, head", [
+    ("report.pdf", PDF),
+    ("Report.PDF", b"junk\n" + PDF),
+    ("scan.png", b"\x89PNG\r\n\x1a\n"),
+    ("photo.jpeg", b"\xff\xd8\xff\xe0"),
+    ("letter.docx", b"PK\x03\x04"),
+    ("notes.txt", b"plain text"),
+])
+def test_check_file_type_accepts_matching_content(filename, head):
+    assert check_file_type(filename, head) == filename.rsplit(".", 1)[1].lower()
+
+
+@pytest.mark.parametrize("filename, head", [
+    ("report.pdf", b"\x89PNG\r\n\x1a\n"),
+    ("scan.png", PDF),
+    ("notes.txt", b"binary\x00data"),
+    ("tool.exe", b"MZ"),
+    ("noextension", PDF),
+])
+def test_check_file_type_rejects_with_415(filename, head):
+    with pytest.raises(HTTPException) as rejected:
+        check_file_type(filename, head)
+    assert rejected.value.status_code == 415
+
+
+@pytest.mark.parametrize("size, text", [
+    (50 * 1024 ** 2, "50MB"),
+    (512 * 1024, "512KB"),
+    (1024 ** 3, "1GB"),
+    (1000, "1000 bytes"),
+])
+def test_too_large_reports_limit(size, text):
+    error = uploads._too_large(size)
+    assert error.status_code == 413
+    assert error.detail.endswith(text)
+
+
+def test_save_upload_stops_copy_and_removes_partial_file(tmp_path):
+    path = tmp_path / "report.pdf"
+    upload = UploadFile(io.BytesIO(PDF + b"0" * (64 * 1024)), filename="report.pdf")
+
+    with pytest.raises(HTTPException) as rejected:
+        asyncio.run(uploads.save_upload(upload, path, max_bytes=32 * 1024))
+    assert rejected.value.status_code == 413
+    assert not path.exists()
+
+
+def test_save_upload_returns_size_and_hash(tmp_path):
+    path = tmp_path / "report.pdf"
+    data = PDF + b"0" * (64 * 1024)
+
+    size, digest = asyncio.run(uploads.save_upload(UploadFile(io.BytesIO(data), filename="report.pdf"), path))
+    assert size == len(data)
+    assert len(digest) == 64
+    assert path.read_bytes() == data
+
+
+async def _ok_app(scope, receive, send):
+    await send({"type": "http.response.start", "status": 200, "headers": []})
+    await send({"type": "http.response.body", "body": b"ok"})
+
+
+def _call(app, path, content_length):
+    messages = []
+
+    async def receive():
+        return {"type": "http.request", "body": b"", "more_body": False}
+
+    async def send(message):
+        messages.append(message)
+
+    scope = {"type": "http", "method": "POST", "path": path,
+             "headers": [(b"content-length", str(content_length).encode("latin-1"))]}
+    asyncio.run(app(scope, receive, send))
+    return messages
+
+
+def test_middleware_reports_file_limit_but_allows_form_overhead():
+    max_bytes = 10 * 1024 ** 2
+    app = UploadLimitMiddleware(_ok_app, paths=("/upload",), max_bytes=max_bytes,
+                                max_body=max_bytes + 64 * 1024)
+
+    assert _call(app, "/upload", max_bytes + 1)[0]["status"] == 200
+
+    start, body = _call(app, "/upload", max_bytes + 64 * 1024 + 1)
+    assert start["status"] == 413
+    # The client sees the per-file limit, not the body allowance
+    assert json.loads(body["body"])["detail"].endswith("10MB")
+
+    assert _call(app, "/other", max_bytes * 2)[0]["status"] == 200
+
+
+def test_middleware_body_limit_defaults_to_file_limit():
+    app = UploadLimitMiddleware(_ok_app, paths=("/upload",), max_bytes=1024)
+    assert _call(app, "/upload", 1024)[0]["status"] == 200
+    assert _call(app, "/upload", 1025)[0]["status"] == 413
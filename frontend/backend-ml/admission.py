@@ -0,0 +1,225 @@
+"""
+Control de admisión para los endpoints que hacen OCR
+
+Sin límite, una ráfaga de PDFs escaneados hace que cada petición escriba su
+archivo temporal y lance OCR hasta que la máquina se queda sin memoria. Este
+middleware pone delante de ``/ocr``, ``/process``, ``/bulk-process`` y
+``/bulk-process-archive`` un límite de peticiones en curso por endpoint y una
+cola acotada:
+
+- hay lugar: la petición pasa
+- todos los lugares ocupados: espera en la cola (FIFO) hasta
+  ``ADMISSION_QUEUE_TIMEOUT`` segundos; si vence, ``503``
+- la cola también está llena: ``429`` inmediato
+
+Las respuestas rechazadas llevan ``Retry-After`` estimado con la duración
+promedio de las peticiones del endpoint. Se rechaza antes de leer el cuerpo:
+un rechazo no escribe nada a disco.
+
+Los límites son por proceso: con varios workers (prefork.py) se multiplican
+por ``ML_WORKERS``.
+"""
+import asyncio
+import json
+import math
+import os
+import time
+from collections import deque
+from typing import Deque, Dict, Optional, Tuple
+
+import metrics
+
+# Activar el control de admisión
+ADMISSION_ENABLED = os.getenv("ADMISSION_ENABLED", "true").lower() in ("1", "true", "yes")
+
+# Límites por endpoint: "ruta=en_curso:cola,..." (p. ej. "/ocr=4:16,/bulk-process=1:2").
+# Vacío = en curso igual a los procesos de extracción y cola de 4 veces eso
+# (la mitad para los endpoints de lotes); cola omitida = 4 × en curso
+ADMISSION_LIMITS = os.getenv("ADMISSION_LIMITS", "")
+
+# Segundos que una petición puede esperar en la cola antes de recibir 503
+ADMISSION_QUEUE_TIMEOUT = float(os.getenv("ADMISSION_QUEUE_TIMEOUT", "30"))
+
+# Endpoints con admisión; los de lotes cuentan como más pesados
+_ENDPOINTS = ("/ocr", "/process")
+_BATCH_ENDPOINTS = ("/bulk-process", "/bulk-process-archive")
+
+# Peso del último valor en el promedio móvil de la duración
+_DURATION_SMOOTHING = 0.2
+
+queue_depth = metrics.registry.register(metrics.Gauge(
+    "ml_admission_queue_depth", "Peticiones esperando lugar por endpoint", ("endpoint",)
+))
+admitted_in_flight = metrics.registry.register(metrics.Gauge(
+    "ml_admission_in_flight", "Peticiones admitidas en curso por endpoint", ("endpoint",)
+))
+queue_wait = metrics.registry.register(metrics.Histogram(
+    "ml_admission_wait_seconds", "Espera en la cola de admisión", ("endpoint",)
+))
+rejected = metrics.registry.register(metrics.Counter(
+    "ml_admission_rejected_total", "Peticiones rechazadas por endpoint y estado (429 o 503)",
+    ("endpoint", "status")
+))
+
+
+class Rejected(Exception):
+    def __init__(self, status: int, retry_after: int, detail: str):
+        super().__init__(detail)
+        self.status = status
+        self.retry_after = retry_after
+        self.detail = detail
+
+
+class Gate:
+    """
+    Límite de peticiones en curso más cola FIFO de un endpoint. Vive en el
+    event loop del proceso, así que no necesita locks.
+    """
+
+    def __init__(self, endpoint: str, limit: int, queue_size: int):
+        self.endpoint = endpoint
+        self.limit = max(1, limit)
+        self.queue_size = max(0, queue_size)
+        self.active = 0
+        self._waiters: Deque[asyncio.Future] = deque()
+        # Duración promedio de una petición admitida, para Retry-After
+        self._duration: Optional[float] = None
+
+    def retry_after(self) -> int:
+        """Segundos estimados hasta que se libere lugar para una petición nueva"""
+        duration = self._duration or 1.0
+        return max(1, math.ceil(duration * (len(self._waiters) + 1) / self.limit))
+
+    async def acquire(self, timeout: float):
+        """Ocupa un lugar, esperando en la cola si hace falta; lanza Rejected si no hay"""
+        if self.active < self.limit and not self._waiters:
+            self.active += 1
+            admitted_in_flight.inc(endpoint=self.endpoint)
+            return
+
+        if len(self._waiters) >= self.queue_size:
+            raise Rejected(429, self.retry_after(), "Demasiadas peticiones en curso; reintentar más tarde")
+
+        waiter = asyncio.get_running_loop().create_future()
+        self._waiters.append(waiter)
+        queue_depth.set(len(self._waiters), endpoint=self.endpoint)
+        try:
+            # release() transfiere su lugar al primero de la cola
+            await asyncio.wait_for(waiter, timeout)
+        except asyncio.TimeoutError:
+            raise Rejected(503, self.retry_after(), "Servicio saturado; reintentar más tarde")
+        except asyncio.CancelledError:
+            if waiter.done() and not waiter.cancelled():
+                self.release()
+            raise
+        finally:
+            if waiter in self._waiters:
+                self._waiters.remove(waiter)
+            queue_depth.set(len(self._waiters), endpoint=self.endpoint)
+
+    def release(self, duration: Optional[float] = None):
+        if duration is not None:
+            self._duration = duration if self._duration is None else (
+                _DURATION_SMOOTHING * duration + (1 - _DURATION_SMOOTHING) * self._duration
+            )
+
+        while self._waiters:
+            waiter = self._waiters.popleft()
+            if not waiter.done():
+                waiter.set_result(None)
+                queue_depth.set(len(self._waiters), endpoint=self.endpoint)
+                return
+
+        self.active -= 1
+        admitted_in_flight.dec(endpoint=self.endpoint)
+
+
+def parse_limits(value: str) -> Dict[str, Tuple[int, int]]:
+    """``"/ocr=4:16,/bulk-process=1"`` -> ``{"/ocr": (4, 16), "/bulk-process": (1, 4)}``"""
+    limits = {}
+    for item in value.split(","):
+        if not item.strip():
+            continue
+        path, _, spec = item.strip().partition("=")
+        limit, _, queue = spec.partition(":")
+        limits[path] = (int(limit), int(queue) if queue else 4 * int(limit))
+    return limits
+
+
+def default_limits() -> Dict[str, Tuple[int, int]]:
+    """Límites según los procesos del pool de extracción de este worker"""
+    from extraction_executor import extraction_executor
+
+    workers = extraction_executor.max_workers
+    batch = max(1, workers // 2)
+    limits = {path: (workers, 4 * workers) for path in _ENDPOINTS}
+    limits.update({path: (batch, 4 * batch) for path in _BATCH_ENDPOINTS})
+    return limits
+
+
+class AdmissionMiddleware:
+    """
+    Middleware ASGI de admisión. Se instala dentro de CORS para que los
+    rechazos también lleven sus cabeceras.
+    """
+
+    def __init__(self, app, limits: Optional[Dict[str, Tuple[int, int]]] = None,
+                 queue_timeout: float = ADMISSION_QUEUE_TIMEOUT):
+        self.app = app
+        self._limits = limits
+        self.queue_timeout = queue_timeout
+        self._gates: Optional[Dict[str, Gate]] = None
+
+    def gates(self) -> Dict[str, Gate]:
+        # Se crean en la primera petición: con prefork.py el pool de
+        # extracción se dimensiona dentro de cada worker, después del import
+        if self._gates is None:
+            limits = self._limits
+            if limits is None:
+                limits = {**default_limits(), **parse_limits(ADMISSION_LIMITS)}
+            self._gates = {
+                path: Gate(path, limit, queue_size) for path, (limit, queue_size) in limits.items()
+            }
+        return self._gates
+
+    async def __call__(self, scope, receive, send):
+        gate = None
+        if scope["type"] == "http" and scope["method"] == "POST":
+            gate = self.gates().get(scope["path"])
+        if gate is None:
+            await self.app(scope, receive, send)
+            return
+
+        waiting_since = time.perf_counter()
+        try:
+            await gate.acquire(self.queue_timeout)
+        except Rejected as e:
+            rejected.inc(endpoint=gate.endpoint, status=e.status)
+            await self._reject(send, e)
+            return
+
+        waited = time.perf_counter() - waiting_since
+        queue_wait.observe(waited, endpoint=gate.endpoint)
+        metrics.record_stage("admission_wait", waited)
+
+        start = time.perf_counter()
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            gate.release(time.perf_counter() - start)
+
+    @staticmethod
+    async def _reject(send, error: Rejected):
+        body = json.dumps({"detail": error.detail}, ensure_ascii=False).encode("utf-8")
+        await send({
+            "type": "http.response.start",
+            "status": error.status,
+            "headers": [
+                (b"content-type", b"application/json"),
+                (b"content-length", str(len(body)).encode("latin-1")),
+                (b"retry-after", str(error.retry_after).encode("latin-1")),
+                # El cuerpo no se leyó: se cierra la conexión en lugar de drenarlo
+                (b"connection", b"close"),
+            ],
+        })
+        await send({"type": "http.response.body", "body": body})
@@ -0,0 +1,182 @@
+"""
+Lectura de lotes enviados como un único archivo ZIP o tar
+
+En lugar de miles de partes multipart, la importación masiva puede subir un
+solo archivo comprimido. Las entradas se leen de a una: cada una se entrega
+como bytes (o como archivo temporal si supera ``UPLOAD_MEMORY_MAX_MB``) y se
+descarta después de procesarla, así que nunca se descomprime el lote completo
+a disco.
+
+Cada entrada pasa la misma validación que un upload suelto: sus primeros bytes
+tienen que corresponder al tipo que indica la extensión y no puede superar
+``UPLOAD_MAX_MB``. Las entradas rechazadas se reportan con error sin cortar el
+lote; el lote completo se corta si lo descomprimido supera
+``ARCHIVE_MAX_TOTAL_MB`` (protección contra bombas zip).
+"""
+import mimetypes
+import os
+import shutil
+import tarfile
+import uuid
+import zipfile
+from typing import IO, Iterator, Optional
+
+from extraction_executor import MAX_INFLIGHT
+from ocr_service import Source
+from uploads import (
+    _SNIFF_BYTES, UPLOAD_DIR, UPLOAD_MAX_BYTES, UPLOAD_MEMORY_MAX_BYTES, _format_size, content_error,
+)
+
+# Tamaño máximo del archivo comprimido subido (0 = sin límite)
+ARCHIVE_MAX_BYTES = int(float(os.getenv("ARCHIVE_MAX_MB", "1024")) * 1024 * 1024)
+
+# Entradas máximas por archivo comprimido
+ARCHIVE_MAX_ENTRIES = int(os.getenv("ARCHIVE_MAX_ENTRIES", "10000"))
+
+# Entradas en proceso a la vez (0 = OCR_MAX_INFLIGHT). Acota la memoria: no se
+# lee la siguiente entrada hasta que haya lugar
+ARCHIVE_CONCURRENCY = int(os.getenv("ARCHIVE_CONCURRENCY", "0")) or MAX_INFLIGHT
+
+# Tamaño máximo descomprimido de una entrada (0 = UPLOAD_MAX_MB, el mismo
+# límite que un archivo subido suelto)
+ARCHIVE_MAX_ENTRY_BYTES = int(float(os.getenv("ARCHIVE_MAX_ENTRY_MB", "0")) * 1024 * 1024) or UPLOAD_MAX_BYTES
+
+# Tamaño máximo descomprimido de todas las entradas juntas (protección contra
+# bombas zip; 0 = sin límite)
+ARCHIVE_MAX_TOTAL_BYTES = int(float(os.getenv("ARCHIVE_MAX_TOTAL_MB", "4096")) * 1024 * 1024)
+
+
+class ArchiveEntry:
+    """Una entrada del archivo comprimido lista para extraer"""
+
+    __slots__ = ("name", "mime_type", "source", "error")
+
+    def __init__(self, name: str, mime_type: str, source: Optional[Source] = None,
+                 error: Optional[str] = None):
+        self.name = name
+        self.mime_type = mime_type
+        self.source = source
+        self.error = error
+
+    def cleanup(self):
+        """Borra el archivo temporal si la entrada se volcó a disco"""
+        if isinstance(self.source, str) and os.path.exists(self.source):
+            os.remove(self.source)
+
+
+def _guess_mime_type(name: str) -> str:
+    return mimetypes.guess_type(name)[0] or "application/octet-stream"
+
+
+def _is_skipped(name: str) -> bool:
+    """Metadatos que agregan los compresores (macOS) y archivos ocultos"""
+    return name.startswith("__MACOSX/") or os.path.basename(name).startswith(".")
+
+
+def _read_entry(name: str, size: int, stream: IO[bytes]) -> ArchiveEntry:
+    mime_type = _guess_mime_type(name)
+
+    if ARCHIVE_MAX_ENTRY_BYTES > 0 and size > ARCHIVE_MAX_ENTRY_BYTES:
+        return ArchiveEntry(
+            name, mime_type,
+            error=f"La entrada supera el tamaño máximo de {_format_size(ARCHIVE_MAX_ENTRY_BYTES)}"
+        )
+
+    # El tipo se valida con los primeros bytes, antes de descomprimir el resto
+    head = stream.read(_SNIFF_BYTES)
+    error = content_error(head, mime_type)
+    if error:
+        return ArchiveEntry(name, mime_type, error=error)
+
+    if size <= UPLOAD_MEMORY_MAX_BYTES:
+        return ArchiveEntry(name, mime_type, source=head + stream.read())
+
+    temp_path = UPLOAD_DIR / f"{uuid.uuid4()}{os.path.splitext(name)[1]}"
+    with open(temp_path, "wb") as buffer:
+        buffer.write(head)
+        shutil.copyfileobj(stream, buffer)
+    return ArchiveEntry(name, mime_type, source=str(temp_path))
+
+
+def detect_format(fileobj: IO[bytes]) -> str:
+    """
+    Devuelve ``"zip"`` o ``"tar"``
+
+    Raises:
+        ValueError: Si el archivo no es un ZIP ni un tar (plano o comprimido)
+    """
+    fileobj.seek(0)
+    if zipfile.is_zipfile(fileobj):
+        fileobj.seek(0)
+        return "zip"
+
+    fileobj.seek(0)
+    try:
+        with tarfile.open(fileobj=fileobj, mode="r:*"):
+            pass
+    except tarfile.TarError:
+        raise ValueError("El archivo no es un ZIP ni un tar válido")
+    finally:
+        fileobj.seek(0)
+    return "tar"
+
+
+def iter_entries(fileobj: IO[bytes]) -> Iterator[ArchiveEntry]:
+    """
+    Recorre las entradas de un ZIP o tar de a una
+
+    Las entradas que no se pueden leer (CRC incorrecto, demasiado grandes,
+    contenido que no corresponde a la extensión) se entregan con ``error`` en
+    lugar de cortar el recorrido.
+
+    Raises:
+        ValueError: Si el formato no es válido, hay más de ARCHIVE_MAX_ENTRIES
+            entradas o lo descomprimido supera ARCHIVE_MAX_TOTAL_BYTES
+    """
+    archive_format = detect_format(fileobj)
+    count = 0
+    total_bytes = 0
+
+    def check_limits(size: int):
+        nonlocal count, total_bytes
+        count += 1
+        if count > ARCHIVE_MAX_ENTRIES:
+            raise ValueError(f"El archivo supera el máximo de {ARCHIVE_MAX_ENTRIES} entradas")
+        # Las entradas demasiado grandes no se leen: no cuentan para el total
+        if ARCHIVE_MAX_ENTRY_BYTES > 0 and size > ARCHIVE_MAX_ENTRY_BYTES:
+            return
+        total_bytes += size
+        if ARCHIVE_MAX_TOTAL_BYTES > 0 and total_bytes > ARCHIVE_MAX_TOTAL_BYTES:
+            raise ValueError(
+                f"El contenido descomprimido supera el máximo de {_format_size(ARCHIVE_MAX_TOTAL_BYTES)}"
+            )
+
+    if archive_format == "zip":
+        with zipfile.ZipFile(fileobj) as archive:
+            for info in archive.infolist():
+                if info.is_dir() or _is_skipped(info.filename):
+                    continue
+                check_limits(info.file_size)
+                try:
+                    with archive.open(info) as stream:
+                        entry = _read_entry(info.filename, info.file_size, stream)
+                except (zipfile.BadZipFile, OSError, RuntimeError) as e:
+                    # RuntimeError: entrada cifrada
+                    entry = ArchiveEntry(info.filename, _guess_mime_type(info.filename),
+                                         error=f"No se pudo leer la entrada: {str(e)}")
+                yield entry
+        return
+
+    # Modo "r|*": lectura secuencial sin cargar el índice del tar completo
+    with tarfile.open(fileobj=fileobj, mode="r|*") as archive:
+        for member in archive:
+            if not member.isfile() or _is_skipped(member.name):
+                continue
+            check_limits(member.size)
+            try:
+                stream = archive.extractfile(member)
+                entry = _read_entry(member.name, member.size, stream)
+            except (tarfile.TarError, OSError) as e:
+                entry = ArchiveEntry(member.name, _guess_mime_type(member.name),
+                                     error=f"No se pudo leer la entrada: {str(e)}")
+            yield entry
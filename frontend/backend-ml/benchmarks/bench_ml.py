@@ -0,0 +1,350 @@
+"""
+Benchmark de extremo a extremo del servicio ML
+
+Mide latencia (p50/p95/p99) y throughput (docs/s) de:
+- classify_1 / classify_100 / classify_10k: ``classify_documents`` con lotes de
+  1, 100 y 10.000 textos
+- keywords: ``extract_keywords`` por documento
+- pdf_text_layer: ``extract_document`` de PDFs con capa de texto
+- pdf_ocr_page: OCR de PDFs escaneados, una muestra por página (requiere
+  tesseract y poppler; si faltan se reporta como omitido)
+- endpoint_process / endpoint_bulk_process: ``/process`` y ``/bulk-process``
+  contra ``run_server.py`` con ``--concurrency`` clientes a la vez
+
+Los textos salen de ``test_documents/`` y del generador de ``synthetic.py``;
+cada muestra es un documento distinto para que las cachés de OCR y de
+clasificación no intervengan (además se desactivan con sus variables).
+
+Uso:
+    python benchmarks/bench_ml.py [--only classify_1,keywords] [--quick]
+                                  [--concurrency N] [--output resultados.json]
+
+Imprime un JSON con los resultados de cada escenario para comparar entre
+versiones.
+"""
+import argparse
+import json
+import os
+import shutil
+import socket
+import subprocess
+import sys
+import threading
+import time
+import urllib.error
+import urllib.request
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, List, Tuple
+
+ML_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ML_DIR)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+# Sin cachés: cada muestra debe hacer el trabajo completo. Sin control de
+# admisión: con --concurrency por encima de sus límites se mediría la cola
+BENCH_ENV = {
+    "OCR_CACHE_ENABLED": "false",
+    "CLASSIFIER_CACHE_ITEMS": "0",
+    "ADMISSION_ENABLED": "false",
+}
+os.environ.update(BENCH_ENV)
+
+import synthetic  # noqa: E402
+
+SCENARIOS = [
+    "classify_1",
+    "classify_100",
+    "classify_10k",
+    "keywords",
+    "pdf_text_layer",
+    "pdf_ocr_page",
+    "endpoint_process",
+    "endpoint_bulk_process",
+]
+
+
+# Reintentos de una petición rechazada con 429/503 antes de darla por fallida
+_MAX_RETRIES = 20
+
+
+class Skipped(Exception):
+    """El escenario no se puede medir en este entorno"""
+
+
+def _percentile(ordered: List[float], percent: float) -> float:
+    """Percentil por rango más cercano sobre una lista ordenada"""
+    index = max(0, min(len(ordered) - 1, int(round(percent / 100 * len(ordered) + 0.5)) - 1))
+    return ordered[index]
+
+
+def _summary(latencies: List[float], docs: int, wall_seconds: float) -> Dict[str, float]:
+    ordered = sorted(latencies)
+    return {
+        "p50_ms": round(_percentile(ordered, 50) * 1000, 3),
+        "p95_ms": round(_percentile(ordered, 95) * 1000, 3),
+        "p99_ms": round(_percentile(ordered, 99) * 1000, 3),
+        "mean_ms": round(sum(ordered) / len(ordered) * 1000, 3),
+        "docs_per_sec": round(docs / wall_seconds, 2) if wall_seconds > 0 else None,
+        "samples": len(ordered),
+        "docs": docs,
+        "wall_s": round(wall_seconds, 3),
+    }
+
+
+def _run_serial(items: list, call: Callable, docs_per_item: int = 1) -> Dict[str, float]:
+    latencies = []
+    start = time.perf_counter()
+    for item in items:
+        t = time.perf_counter()
+        call(item)
+        latencies.append(time.perf_counter() - t)
+    return _summary(latencies, len(items) * docs_per_item, time.perf_counter() - start)
+
+
+# --- Clasificación y palabras clave -------------------------------------------
+
+def bench_classify(batch_size: int, batches: int) -> Dict[str, float]:
+    from classifier_service import get_classifier
+
+    classifier = get_classifier()
+    # Calentamiento: carga del modelo fuera de la medición
+    classifier.classify_documents(synthetic.synthetic_texts(4, seed=-1))
+
+    texts = synthetic.synthetic_texts(batch_size * batches, seed=batch_size)
+    groups = [texts[i:i + batch_size] for i in range(0, len(texts), batch_size)]
+    return _run_serial(groups, classifier.classify_documents, docs_per_item=batch_size)
+
+
+def bench_keywords(count: int) -> Dict[str, float]:
+    from classifier_service import get_classifier
+
+    classifier = get_classifier()
+    classifier.extract_keywords(synthetic.synthetic_texts(1, seed=-1)[0])
+
+    texts = list(synthetic.load_test_documents().values())
+    texts += synthetic.synthetic_texts(max(0, count - len(texts)), seed=7)
+    return _run_serial(texts[:count], classifier.extract_keywords)
+
+
+# --- Extracción de PDFs -------------------------------------------------------
+
+def bench_pdf_text_layer(count: int, pages: int) -> Dict[str, float]:
+    from ocr_service import ocr_service
+
+    pdfs = [synthetic.text_pdf(text, pages=pages)
+            for text in synthetic.synthetic_texts(count, seed=11)]
+    result = _run_serial(pdfs, lambda pdf: ocr_service.extract_document(pdf, "application/pdf"))
+    result["pages_per_doc"] = pages
+    return result
+
+
+def _require_ocr_tools():
+    missing = [tool for tool in ("tesseract", "pdftoppm") if shutil.which(tool) is None]
+    if missing:
+        raise Skipped(f"No se encontró {', '.join(missing)} en el PATH")
+
+
+def bench_pdf_ocr_page(count: int) -> Dict[str, float]:
+    _require_ocr_tools()
+    from ocr_service import ocr_service
+
+    ocr_service.warm_up()
+    # PDFs de una página: cada muestra es el OCR de una página
+    pdfs = [synthetic.scanned_pdf(text, pages=1)
+            for text in synthetic.synthetic_texts(count, seed=13)]
+    return _run_serial(pdfs, lambda pdf: ocr_service.extract_document(pdf, "application/pdf"))
+
+
+# --- Endpoints bajo carga -----------------------------------------------------
+
+def _free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def _multipart(field: str, files: List[Tuple[str, bytes, str]]) -> Tuple[bytes, str]:
+    boundary = uuid.uuid4().hex
+    body = bytearray()
+    for filename, content, mime_type in files:
+        body += (
+            f"--{boundary}\r\n"
+            f'Content-Disposition: form-data; name="{field}"; filename="{filename}"\r\n'
+            f"Content-Type: {mime_type}\r\n\r\n"
+        ).encode("utf-8")
+        body += content + b"\r\n"
+    body += f"--{boundary}--\r\n".encode("utf-8")
+    return bytes(body), f"multipart/form-data; boundary={boundary}"
+
+
+class _Server:
+    """
+    ``run_server.py`` en un puerto libre, con las cachés desactivadas.
+
+    Las respuestas 429/503 del control de admisión no son errores: se cuentan
+    en ``rejected`` y la petición se reintenta tras ``Retry-After``.
+    """
+
+    def __init__(self, timeout: float = 60.0, env: Dict[str, str] = None):
+        self.timeout = timeout
+        self.env = env or {}
+        self.port = _free_port()
+        self.base = f"http://127.0.0.1:{self.port}"
+        self.process = None
+        self.rejected = 0
+        self._lock = threading.Lock()
+
+    def __enter__(self):
+        self.process = subprocess.Popen(
+            [sys.executable, "-W", "ignore", "run_server.py"],
+            cwd=ML_DIR,
+            env={**os.environ, **BENCH_ENV, **self.env, "ML_PORT": str(self.port)},
+            stdout=subprocess.DEVNULL,
+            stderr=subprocess.DEVNULL,
+        )
+        deadline = time.monotonic() + self.timeout
+        while time.monotonic() < deadline:
+            if self.process.poll() is not None:
+                raise RuntimeError("run_server.py terminó durante el arranque")
+            try:
+                with urllib.request.urlopen(f"{self.base}/", timeout=1):
+                    return self
+            except OSError:
+                time.sleep(0.05)
+        self.__exit__()
+        raise TimeoutError(f"Sin respuesta de {self.base}")
+
+    def __exit__(self, *exc):
+        self.process.terminate()
+        self.process.wait(timeout=10)
+
+    def post(self, path: str, field: str, files: List[Tuple[str, bytes, str]]):
+        body, content_type = _multipart(field, files)
+        request = urllib.request.Request(
+            f"{self.base}{path}", data=body, headers={"Content-Type": content_type}
+        )
+        for attempt in range(_MAX_RETRIES + 1):
+            try:
+                with urllib.request.urlopen(request, timeout=300) as response:
+                    response.read()
+                return
+            except urllib.error.HTTPError as e:
+                if e.code not in (429, 503) or attempt == _MAX_RETRIES:
+                    raise
+                retry_after = e.headers.get("Retry-After", "1")
+                e.close()
+            with self._lock:
+                self.rejected += 1
+            time.sleep(float(retry_after) if retry_after.isdigit() else 1.0)
+
+
+def _endpoint_documents(count: int) -> List[Tuple[str, bytes, str]]:
+    """Mezcla de textos planos y PDFs con capa de texto, todos distintos"""
+    documents = []
+    for index, text in enumerate(synthetic.synthetic_texts(count, seed=17)):
+        if index % 2:
+            documents.append((f"doc_{index}.pdf", synthetic.text_pdf(text), "application/pdf"))
+        else:
+            documents.append((f"doc_{index}.txt", text.encode("utf-8"), "text/plain"))
+    return documents
+
+
+def _run_concurrent(items: list, call: Callable, concurrency: int,
+                    docs_per_item: int = 1) -> Dict[str, float]:
+    def timed(item) -> float:
+        t = time.perf_counter()
+        call(item)
+        return time.perf_counter() - t
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        latencies = list(pool.map(timed, items))
+    result = _summary(latencies, len(items) * docs_per_item, time.perf_counter() - start)
+    result["concurrency"] = concurrency
+    return result
+
+
+def bench_endpoint_process(count: int, concurrency: int) -> Dict[str, float]:
+    documents = _endpoint_documents(count)
+    with _Server() as server:
+        server.post("/process", "file", [documents[0]])
+        result = _run_concurrent(
+            documents, lambda doc: server.post("/process", "file", [doc]), concurrency
+        )
+    result["rejected"] = server.rejected
+    return result
+
+
+def bench_endpoint_bulk_process(batches: int, batch_size: int, concurrency: int) -> Dict[str, float]:
+    documents = _endpoint_documents(batches * batch_size)
+    groups = [documents[i:i + batch_size] for i in range(0, len(documents), batch_size)]
+    with _Server() as server:
+        server.post("/bulk-process", "files", groups[0][:1])
+        result = _run_concurrent(
+            groups, lambda group: server.post("/bulk-process", "files", group),
+            concurrency, docs_per_item=batch_size,
+        )
+    result["batch_size"] = batch_size
+    result["rejected"] = server.rejected
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--only", help="Escenarios separados por comas (por defecto, todos)")
+    parser.add_argument("--quick", action="store_true", help="Menos muestras, para una verificación rápida")
+    parser.add_argument("--concurrency", type=int, default=8, help="Clientes simultáneos contra los endpoints")
+    parser.add_argument("--output", help="Archivo donde guardar el JSON")
+    args = parser.parse_args()
+
+    selected = args.only.split(",") if args.only else SCENARIOS
+    unknown = set(selected) - set(SCENARIOS)
+    if unknown:
+        parser.error(f"Escenarios desconocidos: {', '.join(sorted(unknown))}")
+
+    def n(full: int, quick: int) -> int:
+        """Muestras del escenario según --quick"""
+        return quick if args.quick else full
+
+    runners = {
+        "classify_1": lambda: bench_classify(1, n(500, 50)),
+        "classify_100": lambda: bench_classify(100, n(50, 5)),
+        "classify_10k": lambda: bench_classify(10000, n(5, 1)),
+        "keywords": lambda: bench_keywords(n(500, 50)),
+        "pdf_text_layer": lambda: bench_pdf_text_layer(n(200, 20), pages=n(5, 2)),
+        "pdf_ocr_page": lambda: bench_pdf_ocr_page(n(30, 3)),
+        "endpoint_process": lambda: bench_endpoint_process(n(400, 40), args.concurrency),
+        "endpoint_bulk_process": lambda: bench_endpoint_bulk_process(
+            n(40, 4), 25, max(1, args.concurrency // 4)
+        ),
+    }
+
+    # Los servicios resuelven models/ y temp_uploads/ respecto del directorio actual
+    os.chdir(ML_DIR)
+
+    results = {}
+    for name in selected:
+        try:
+            results[name] = runners[name]()
+        except Skipped as e:
+            results[name] = {"skipped": str(e)}
+        print(f"{name}: {json.dumps(results[name])}", file=sys.stderr)
+
+    report = {
+        "benchmark": "ml",
+        "python": sys.version.split()[0],
+        "cpu_count": os.cpu_count(),
+        "quick": args.quick,
+        "results": results,
+    }
+
+    output = json.dumps(report, indent=2)
+    print(output)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            f.write(output + "\n")
+
+
+if __name__ == "__main__":
+    main()
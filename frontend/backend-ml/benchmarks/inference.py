@@ -0,0 +1,107 @@
+"""
+Benchmark del motor de inferencia NumPy contra el pipeline de sklearn
+
+Para lotes de 1, 100 y 10.000 textos ya preprocesados mide las dos rutas de
+``inference_engine.py``:
+- sklearn: ``vectorizer.transform`` + ``predict_proba`` del pipeline activo
+- numpy: ``engine.transform`` + ``engine.predict_proba`` del modelo compilado
+
+y verifica que las probabilidades sean idénticas bit a bit en todas las
+muestras (``identical``). ``speedup`` es el cociente de las medianas.
+
+Uso:
+    python benchmarks/inference.py [--quick] [--output resultados.json]
+"""
+import argparse
+import json
+import os
+import sys
+
+import numpy as np
+
+from bench_ml import ML_DIR, _run_serial
+
+import synthetic
+
+# (nombre, tamaño del lote, lotes, lotes con --quick)
+SCENARIOS = [
+    ("batch_1", 1, 2000, 200),
+    ("batch_100", 100, 50, 5),
+    ("batch_10k", 10000, 3, 1),
+]
+
+
+def _sklearn_path(model):
+    vectorizer = model.steps[0][1]
+    clf = model.steps[-1][1]
+    return lambda texts: clf.predict_proba(vectorizer.transform(texts))
+
+
+def _numpy_path(engine):
+    return lambda texts: engine.predict_proba([engine.transform(text) for text in texts])
+
+
+def bench_scenario(model, engine, batch_size: int, batches: int) -> dict:
+    from classifier_service import get_classifier
+
+    classifier = get_classifier()
+    texts = [
+        classifier.preprocess_text(text)
+        for text in synthetic.synthetic_texts(batch_size * batches, seed=batch_size)
+    ]
+    groups = [texts[i:i + batch_size] for i in range(0, len(texts), batch_size)]
+
+    sklearn_call = _sklearn_path(model)
+    numpy_call = _numpy_path(engine)
+    # Calentamiento fuera de la medición
+    sklearn_call(groups[0])
+    numpy_call(groups[0])
+
+    identical = all(np.array_equal(sklearn_call(group), numpy_call(group)) for group in groups)
+    sklearn_result = _run_serial(groups, sklearn_call, docs_per_item=batch_size)
+    numpy_result = _run_serial(groups, numpy_call, docs_per_item=batch_size)
+    return {
+        "sklearn": sklearn_result,
+        "numpy": numpy_result,
+        "speedup": round(sklearn_result["p50_ms"] / numpy_result["p50_ms"], 2),
+        "identical": identical,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--quick", action="store_true", help="Menos muestras, para una verificación rápida")
+    parser.add_argument("--output", help="Archivo donde guardar el JSON")
+    args = parser.parse_args()
+
+    # Los servicios resuelven models/ respecto del directorio actual
+    os.chdir(ML_DIR)
+
+    import inference_engine
+    from classifier_service import get_classifier
+
+    model = get_classifier().model
+    engine = inference_engine.InferenceEngine.from_pipeline(model)
+
+    results = {}
+    for name, batch_size, batches, quick_batches in SCENARIOS:
+        results[name] = bench_scenario(model, engine, batch_size, quick_batches if args.quick else batches)
+        print(f"{name}: {json.dumps(results[name])}", file=sys.stderr)
+
+    report = {
+        "benchmark": "inference",
+        "python": sys.version.split()[0],
+        "cpu_count": os.cpu_count(),
+        "quick": args.quick,
+        "results": results,
+    }
+
+    output = json.dumps(report, indent=2)
+    print(output)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            f.write(output + "\n")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,153 @@
+"""
+Benchmark de arranque del servicio ML
+
+Mide, en intérpretes nuevos para que no influya lo ya importado:
+- import_main: tiempo de ``import main`` (no debería cargar sklearn ni pytesseract)
+- classifier_<formato>: crear el clasificador con MODEL_FORMAT=compact y =pickle
+- run_server_ready: desde lanzar ``run_server.py`` hasta que ``GET /`` responde
+- run_server_first_classify: desde el lanzamiento hasta la primera respuesta de ``/classify``
+
+Uso:
+    python benchmarks/startup.py [--repeat N] [--output resultados.json]
+
+Imprime un JSON con la mediana, el mínimo y el máximo de cada medición para
+poder compararlo entre versiones.
+"""
+import argparse
+import json
+import os
+import socket
+import statistics
+import subprocess
+import sys
+import time
+import urllib.request
+
+ML_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def _timed_snippet(code: str, env: dict = None) -> float:
+    """Ejecuta código en un intérprete nuevo y devuelve los segundos que imprime"""
+    result = subprocess.run(
+        [sys.executable, "-W", "ignore", "-c", code],
+        cwd=ML_DIR,
+        env={**os.environ, **(env or {})},
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+    return float(result.stdout.strip().splitlines()[-1])
+
+
+def measure_import_main() -> float:
+    return _timed_snippet(
+        "import time; t = time.perf_counter(); import main; "
+        "print(time.perf_counter() - t)"
+    )
+
+
+def measure_classifier(model_format: str) -> float:
+    return _timed_snippet(
+        "import time; t = time.perf_counter(); "
+        "from classifier_service import get_classifier; "
+        "get_classifier().classify_document('factura'); "
+        "print(time.perf_counter() - t)",
+        env={"MODEL_FORMAT": model_format},
+    )
+
+
+def _free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def _wait_for(request: urllib.request.Request, deadline: float):
+    while time.monotonic() < deadline:
+        try:
+            with urllib.request.urlopen(request, timeout=1) as response:
+                if response.status == 200:
+                    return
+        except OSError:
+            time.sleep(0.02)
+    raise TimeoutError(f"Sin respuesta de {request.full_url}")
+
+
+def measure_run_server(timeout: float = 60.0) -> dict:
+    port = _free_port()
+    base = f"http://127.0.0.1:{port}"
+    start = time.monotonic()
+    process = subprocess.Popen(
+        [sys.executable, "-W", "ignore", "run_server.py"],
+        cwd=ML_DIR,
+        env={**os.environ, "ML_PORT": str(port)},
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.DEVNULL,
+    )
+    try:
+        _wait_for(urllib.request.Request(f"{base}/"), start + timeout)
+        ready = time.monotonic() - start
+
+        classify = urllib.request.Request(
+            f"{base}/classify",
+            data=json.dumps({"text": "factura número iva total"}).encode("utf-8"),
+            headers={"Content-Type": "application/json"},
+        )
+        _wait_for(classify, start + timeout)
+        first_classify = time.monotonic() - start
+    finally:
+        process.terminate()
+        process.wait(timeout=10)
+
+    return {"ready": ready, "first_classify": first_classify}
+
+
+def _summary(samples):
+    return {
+        "median_s": round(statistics.median(samples), 4),
+        "min_s": round(min(samples), 4),
+        "max_s": round(max(samples), 4),
+        "samples": len(samples),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--output", help="Archivo donde guardar el JSON")
+    args = parser.parse_args()
+
+    # Una pasada previa crea models/ (importa el modelo anterior si hace falta)
+    measure_classifier("compact")
+
+    samples = {
+        "import_main": [],
+        "classifier_compact": [],
+        "classifier_pickle": [],
+        "run_server_ready": [],
+        "run_server_first_classify": [],
+    }
+    for _ in range(args.repeat):
+        samples["import_main"].append(measure_import_main())
+        samples["classifier_compact"].append(measure_classifier("compact"))
+        samples["classifier_pickle"].append(measure_classifier("pickle"))
+        server = measure_run_server()
+        samples["run_server_ready"].append(server["ready"])
+        samples["run_server_first_classify"].append(server["first_classify"])
+
+    report = {
+        "benchmark": "startup",
+        "python": sys.version.split()[0],
+        "cpu_count": os.cpu_count(),
+        "results": {name: _summary(values) for name, values in samples.items()},
+    }
+
+    output = json.dumps(report, indent=2)
+    print(output)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            f.write(output + "\n")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,136 @@
+"""
+Generador de documentos sintéticos para los benchmarks
+
+Parte de los textos de ``test_documents/`` y genera variantes únicas (para
+que las cachés de OCR y de clasificación no falseen las mediciones), PDFs con
+capa de texto y PDFs "escaneados" (solo imagen).
+"""
+import io
+import os
+import random
+from typing import Dict, List
+
+ML_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+TEST_DOCUMENTS_DIR = os.path.join(ML_DIR, "test_documents")
+
+# Líneas por página en los PDFs generados
+_LINES_PER_PAGE = 40
+_CHARS_PER_LINE = 90
+
+
+def load_test_documents() -> Dict[str, str]:
+    """Textos de ``test_documents/`` por nombre de archivo"""
+    documents = {}
+    for name in sorted(os.listdir(TEST_DOCUMENTS_DIR)):
+        if name.endswith(".txt"):
+            with open(os.path.join(TEST_DOCUMENTS_DIR, name), "r", encoding="utf-8") as f:
+                documents[name] = f.read()
+    return documents
+
+
+def synthetic_texts(count: int, seed: int = 0, words: int = 250) -> List[str]:
+    """
+    Genera ``count`` textos distintos a partir de las oraciones de
+    ``test_documents/``: cada texto mezcla oraciones de un documento base con
+    números al azar, como facturas o contratos de plantilla con otros datos
+    """
+    rng = random.Random(seed)
+    sources = [
+        [line.strip() for line in text.splitlines() if line.strip()]
+        for text in load_test_documents().values()
+    ]
+
+    texts = []
+    for index in range(count):
+        lines = sources[index % len(sources)]
+        chosen = []
+        total = 0
+        while total < words:
+            line = rng.choice(lines)
+            line = f"{line} {rng.randint(1000, 999999)}"
+            chosen.append(line)
+            total += len(line.split())
+        texts.append("\n".join(chosen))
+    return texts
+
+
+def _wrap(text: str) -> List[str]:
+    lines = []
+    for paragraph in text.splitlines():
+        while len(paragraph) > _CHARS_PER_LINE:
+            cut = paragraph.rfind(" ", 0, _CHARS_PER_LINE)
+            cut = cut if cut > 0 else _CHARS_PER_LINE
+            lines.append(paragraph[:cut])
+            paragraph = paragraph[cut:].lstrip()
+        lines.append(paragraph)
+    return lines
+
+
+def _paginate(text: str, pages: int) -> List[List[str]]:
+    """Reparte el texto en ``pages`` páginas, repitiéndolo si no alcanza"""
+    lines = _wrap(text) or [""]
+    needed = pages * _LINES_PER_PAGE
+    lines = (lines * (needed // len(lines) + 1))[:needed]
+    return [lines[i:i + _LINES_PER_PAGE] for i in range(0, needed, _LINES_PER_PAGE)]
+
+
+def _pdf_string(line: str) -> bytes:
+    escaped = line.replace("\\", "\\\\").replace("(", "\\(").replace(")", "\\)")
+    return escaped.encode("latin-1", errors="replace")
+
+
+def text_pdf(text: str, pages: int = 1) -> bytes:
+    """PDF con capa de texto (Helvetica), como los que genera un sistema de facturación"""
+    from PyPDF2 import PdfWriter
+    from PyPDF2.generic import DecodedStreamObject, DictionaryObject, NameObject
+
+    writer = PdfWriter()
+    font = writer._add_object(DictionaryObject({
+        NameObject("/Type"): NameObject("/Font"),
+        NameObject("/Subtype"): NameObject("/Type1"),
+        NameObject("/BaseFont"): NameObject("/Helvetica"),
+        NameObject("/Encoding"): NameObject("/WinAnsiEncoding"),
+    }))
+
+    for page_lines in _paginate(text, pages):
+        writer.add_blank_page(612, 792)
+        page = writer.pages[-1]
+        page[NameObject("/Resources")] = DictionaryObject({
+            NameObject("/Font"): DictionaryObject({NameObject("/F1"): font})
+        })
+        content = b"BT /F1 10 Tf 14 TL 50 750 Td " + b" ".join(
+            b"(" + _pdf_string(line) + b") '" for line in page_lines
+        ) + b" ET"
+        stream = DecodedStreamObject()
+        stream.set_data(content)
+        page[NameObject("/Contents")] = writer._add_object(stream)
+
+    buffer = io.BytesIO()
+    writer.write(buffer)
+    return buffer.getvalue()
+
+
+def scanned_pdf(text: str, pages: int = 1, dpi: int = 150) -> bytes:
+    """PDF de solo imágenes (sin capa de texto), como el de un escáner"""
+    from PIL import Image, ImageDraw, ImageFont
+
+    width, height = int(8.5 * dpi), int(11 * dpi)
+    try:
+        font = ImageFont.load_default(size=max(10, dpi // 8))
+    except TypeError:
+        # Pillow < 10.1 no acepta tamaño para la fuente por defecto
+        font = ImageFont.load_default()
+
+    images = []
+    for page_lines in _paginate(text, pages):
+        image = Image.new("L", (width, height), 255)
+        draw = ImageDraw.Draw(image)
+        y = dpi // 2
+        for line in page_lines:
+            draw.text((dpi // 2, y), line, fill=0, font=font)
+            y += int(dpi / 5)
+        images.append(image)
+
+    buffer = io.BytesIO()
+    images[0].save(buffer, format="PDF", save_all=True, append_images=images[1:], resolution=dpi)
+    return buffer.getvalue()
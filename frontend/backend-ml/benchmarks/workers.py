@@ -0,0 +1,140 @@
+"""
+Benchmark de memoria y throughput con varios workers (ver prefork.py)
+
+Para cada cantidad de workers de ``--workers`` lanza ``run_server.py`` con
+``ML_WORKERS``, envía ``--requests`` peticiones a ``/classify`` con
+``--concurrency`` clientes y después lee la memoria de cada proceso en
+``/proc/<pid>/smaps_rollup``:
+
+- rss: memoria residente, cuenta completas las páginas compartidas
+- pss: las páginas compartidas se reparten entre quienes las usan; la suma de
+  los PSS del padre y los workers es la memoria que de verdad ocupa el servicio
+
+Si el modelo se comparte por copy-on-write, ``total_pss_mb`` crece bastante
+menos que ``workers`` veces el valor con un solo worker, aunque la suma de los
+RSS sí crezca linealmente. Solo Linux (necesita fork y /proc).
+
+Uso:
+    python benchmarks/workers.py [--workers 1,2,4] [--requests 2000]
+                                 [--concurrency 16] [--output resultados.json]
+"""
+import argparse
+import json
+import os
+import sys
+import time
+import urllib.request
+from typing import Dict, List
+
+from bench_ml import _run_concurrent, _Server
+
+import synthetic
+
+from metrics import process_memory
+
+
+def _children(pid: int) -> List[int]:
+    """Procesos hijos directos de ``pid`` (los workers del servidor)"""
+    children = []
+    for entry in os.listdir("/proc"):
+        if not entry.isdigit():
+            continue
+        try:
+            with open(f"/proc/{entry}/stat", "r") as f:
+                # El nombre va entre paréntesis y puede tener espacios
+                fields = f.read().rsplit(")", 1)[1].split()
+        except OSError:
+            continue
+        if int(fields[1]) == pid:
+            children.append(int(entry))
+    return sorted(children)
+
+
+def _megabytes(value: int) -> float:
+    return round(value / (1024 * 1024), 1)
+
+
+def _memory_row(pid: int, role: str) -> Dict:
+    memory = process_memory(pid)
+    return {"pid": pid, "role": role, **{f"{kind}_mb": _megabytes(value) for kind, value in memory.items()}}
+
+
+def bench_workers(workers: int, requests: int, concurrency: int, max_requests: int) -> Dict:
+    texts = synthetic.synthetic_texts(requests, seed=workers)
+    env = {"ML_WORKERS": str(workers), "WORKER_MAX_REQUESTS": str(max_requests)}
+
+    with _Server(env=env) as server:
+        launcher = server.process.pid
+        deadline = time.monotonic() + 30
+        while workers > 1 and len(_children(launcher)) < workers and time.monotonic() < deadline:
+            time.sleep(0.05)
+
+        def classify(text: str):
+            request = urllib.request.Request(
+                f"{server.base}/classify",
+                data=json.dumps({"text": text}).encode("utf-8"),
+                headers={"Content-Type": "application/json"},
+            )
+            with urllib.request.urlopen(request, timeout=60) as response:
+                response.read()
+
+        classify(texts[0])
+        load = _run_concurrent(texts, classify, concurrency)
+
+        if workers > 1:
+            rows = [_memory_row(launcher, "parent")]
+            rows += [_memory_row(pid, "worker") for pid in _children(launcher)]
+        else:
+            rows = [_memory_row(launcher, "worker")]
+
+    worker_rows = [row for row in rows if row["role"] == "worker"]
+    return {
+        "workers": workers,
+        "requests_per_sec": load["docs_per_sec"],
+        "p50_ms": load["p50_ms"],
+        "p99_ms": load["p99_ms"],
+        "total_rss_mb": round(sum(row.get("rss_mb", 0) for row in rows), 1),
+        "total_pss_mb": round(sum(row.get("pss_mb", 0) for row in rows), 1),
+        "worker_pss_mb": round(sum(row.get("pss_mb", 0) for row in worker_rows) / len(worker_rows), 1),
+        "processes": rows,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--workers", default="1,2,4", help="Cantidades de workers separadas por comas")
+    parser.add_argument("--requests", type=int, default=2000, help="Peticiones a /classify por medición")
+    parser.add_argument("--concurrency", type=int, default=16, help="Clientes simultáneos")
+    parser.add_argument("--max-requests", type=int, default=0,
+                        help="WORKER_MAX_REQUESTS de los workers (0 = sin reciclado)")
+    parser.add_argument("--output", help="Archivo donde guardar el JSON")
+    args = parser.parse_args()
+
+    if not hasattr(os, "fork") or not os.path.exists("/proc/self/smaps_rollup"):
+        parser.error("Este benchmark necesita Linux (fork y /proc/<pid>/smaps_rollup)")
+
+    results = []
+    for workers in [int(value) for value in args.workers.split(",")]:
+        result = bench_workers(workers, args.requests, args.concurrency, args.max_requests)
+        results.append(result)
+        summary = {key: value for key, value in result.items() if key != "processes"}
+        print(f"workers={workers}: {json.dumps(summary)}", file=sys.stderr)
+
+    report = {
+        "benchmark": "workers",
+        "python": sys.version.split()[0],
+        "cpu_count": os.cpu_count(),
+        "requests": args.requests,
+        "concurrency": args.concurrency,
+        "results": results,
+    }
+
+    output = json.dumps(report, indent=2)
+    print(output)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            f.write(output + "\n")
+
+
+if __name__ == "__main__":
+    main()
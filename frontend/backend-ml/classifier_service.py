@@ -2,17 +2,89 @@
 Servicio de clasificación de documentos usando Machine Learning
 """
 import re
-from sklearn.feature_extraction.text import TfidfVectorizer
-from sklearn.naive_bayes import MultinomialNB
-from sklearn.pipeline import Pipeline
-import joblib
+import hashlib
+import json
 import os
-from typing import Tuple, Dict, List
+import shutil
+import threading
+import time
+from collections import Counter, OrderedDict
+from datetime import datetime
+from typing import TYPE_CHECKING, Tuple, Dict, List, Iterator, Optional, Any
 import numpy as np
 
+import compact_model
+import inference_engine
+import metrics
+
+# sklearn y joblib se importan al usarse: tardan más de un segundo en cargar y
+# los workers que solo hacen OCR nunca los necesitan
+if TYPE_CHECKING:
+    from sklearn.pipeline import Pipeline
+
+# Resultados de clasificación memorizados (0 desactiva la caché)
+CLASSIFIER_CACHE_ITEMS = int(os.getenv("CLASSIFIER_CACHE_ITEMS", "2048"))
+
+# Modo de entrenamiento:
+# - "full": re-entrena el pipeline TF-IDF con los ejemplos base más todo el corpus
+# - "incremental": pipeline en línea (hashing + partial_fit), cada actualización
+#   cuesta solo lo proporcional a los ejemplos nuevos
+TRAINING_MODE = os.getenv("CLASSIFIER_TRAINING_MODE", "full").lower()
+
+# Corpus de entrenamiento persistido (JSON Lines con "text" y "label")
+TRAINING_CORPUS_PATH = os.getenv("TRAINING_CORPUS_PATH", "training_corpus.jsonl")
+
+# Ejemplos por bloque al recorrer un corpus en modo incremental
+TRAINING_CHUNK_SIZE = int(os.getenv("TRAINING_CHUNK_SIZE", "1000"))
+
+# Dimensión del espacio de features del pipeline en línea
+HASHING_FEATURES = 2 ** 18
+
+# Artefactos versionados del modelo: models/<versión>.pkl + models/manifest.json
+MODELS_DIR = os.getenv("MODELS_DIR", "models")
+
+# Versiones que se conservan en disco además de la activa
+MODEL_KEEP_VERSIONS = int(os.getenv("MODEL_KEEP_VERSIONS", "10"))
+
+# Formato con el que se carga el modelo: "compact" (arreglos numpy mapeados en
+# memoria, ver compact_model.py) o "pickle" (joblib)
+MODEL_FORMAT = os.getenv("MODEL_FORMAT", "compact").lower()
+
+# Motor de inferencia: "numpy" (modelo compilado a arreglos, ver
+# inference_engine.py; si no reproduce exactamente a sklearn se usa el
+# pipeline) o "sklearn" (siempre el pipeline)
+CLASSIFIER_ENGINE = os.getenv("CLASSIFIER_ENGINE", "numpy").lower()
+
+
+class ModelState:
+    """
+    Modelo publicado junto con lo que se deriva de él.
+    
+    Nunca se modifica después de crearse: publicar o recargar un modelo crea
+    un estado nuevo y reemplaza la referencia de una sola vez, así las
+    peticiones en curso terminan con el estado que tomaron al empezar.
+    """
+    __slots__ = ("model", "version", "feature_names", "engine")
+    
+    def __init__(self, model: "Pipeline", version: str,
+                 engine: Optional[inference_engine.InferenceEngine] = None):
+        self.model = model
+        self.version = version
+        self.engine = engine
+        vectorizer = model.steps[0][1]
+        self.feature_names = (
+            vectorizer.get_feature_names_out()
+            if hasattr(vectorizer, 'vocabulary_') else None
+        )
+
+
 class DocumentClassifier:
     def __init__(self):
-        self.model = None
+        self._state: Optional[ModelState] = None
+        self._cache = OrderedDict()
+        self._cache_lock = threading.Lock()
+        self.cache_hits = 0
+        self.cache_misses = 0
         self.categories = [
             'Contrato',
             'Contrato de Granos',
@@ -27,15 +99,36 @@ class DocumentClassifier:
             'Recibo',
             'Otro'
         ]
+        # Modelo anterior al versionado; se importa como primera versión
         self.model_path = 'classifier_model.pkl'
+        self.models_dir = MODELS_DIR
+        self.manifest_path = os.path.join(self.models_dir, 'manifest.json')
+        self.corpus_path = TRAINING_CORPUS_PATH
+        self._train_lock = threading.Lock()
         
         # Cargar modelo si existe, si no, crear uno básico
-        if os.path.exists(self.model_path):
+        if os.path.exists(self.manifest_path):
             self.load_model()
+        elif os.path.exists(self.model_path):
+            import joblib
+            self._publish(joblib.load(self.model_path), source="legacy")
         else:
             self.create_basic_model()
     
-    def preprocess_text(self, text: str) -> str:
+    @property
+    def model(self) -> Optional["Pipeline"]:
+        """Pipeline activo (solo lectura; se reemplaza publicando una versión)"""
+        state = self._state
+        return state.model if state else None
+    
+    @property
+    def model_version(self) -> Optional[str]:
+        """Versión del modelo activo; también es su huella para la caché"""
+        state = self._state
+        return state.version if state else None
+    
+    @staticmethod
+    def preprocess_text(text: str) -> str:
         """
         Preprocesa el texto para mejorar la clasificación
         """
@@ -54,6 +147,55 @@ class DocumentClassifier:
         """
         Crea un modelo básico con ejemplos de entrenamiento
         """
+        training_texts, training_labels = self.basic_training_data()
+        
+        # Crear pipeline con TF-IDF y Naive Bayes
+        model = self.create_vocabulary_pipeline()
+        
+        # Entrenar modelo
+        model.fit(training_texts, training_labels)
+        
+        # Guardar y activar modelo
+        self._publish(model, source="basic")
+    
+    @staticmethod
+    def create_vocabulary_pipeline() -> "Pipeline":
+        """Pipeline por defecto: vocabulario TF-IDF + Naive Bayes"""
+        from sklearn.feature_extraction.text import TfidfVectorizer
+        from sklearn.naive_bayes import MultinomialNB
+        from sklearn.pipeline import Pipeline
+        
+        return Pipeline([
+            ('tfidf', TfidfVectorizer(max_features=1000, ngram_range=(1, 2))),
+            ('clf', MultinomialNB())
+        ])
+    
+    @staticmethod
+    def create_online_pipeline() -> "Pipeline":
+        """
+        Pipeline para entrenamiento incremental: el hashing no necesita
+        vocabulario previo y MultinomialNB admite ``partial_fit``
+        """
+        from sklearn.feature_extraction.text import HashingVectorizer
+        from sklearn.naive_bayes import MultinomialNB
+        from sklearn.pipeline import Pipeline
+        
+        return Pipeline([
+            ('hashing', HashingVectorizer(
+                n_features=HASHING_FEATURES,
+                ngram_range=(1, 2),
+                alternate_sign=False
+            )),
+            ('clf', MultinomialNB())
+        ])
+    
+    def basic_training_data(self) -> Tuple[List[str], List[str]]:
+        """
+        Ejemplos base con los que se crea el modelo inicial
+        
+        Returns:
+            Tupla con (textos, etiquetas)
+        """
         # Datos de entrenamiento básicos (expandir con más ejemplos reales)
         training_texts = [
             # Contratos generales
@@ -132,17 +274,7 @@ class DocumentClassifier:
             'Otro', 'Otro', 'Otro'
         ]
         
-        # Crear pipeline con TF-IDF y Naive Bayes
-        self.model = Pipeline([
-            ('tfidf', TfidfVectorizer(max_features=1000, ngram_range=(1, 2))),
-            ('clf', MultinomialNB())
-        ])
-        
-        # Entrenar modelo
-        self.model.fit(training_texts, training_labels)
-        
-        # Guardar modelo
-        self.save_model()
+        return training_texts, training_labels
     
     def classify_document(self, text: str) -> Tuple[str, float, Dict[str, float]]:
         """
@@ -154,31 +286,153 @@ class DocumentClassifier:
         Returns:
             Tupla con (categoría_predicha, confianza, probabilidades_todas)
         """
-        if not self.model:
+        return self.classify_documents([text])[0]
+    
+    def classify_documents(self, texts: List[str]) -> List[Tuple[str, float, Dict[str, float]]]:
+        """
+        Clasifica un lote de documentos en una sola pasada
+        
+        Vectoriza todo el lote con un único ``transform`` y obtiene las
+        probabilidades con un único ``predict_proba`` sobre la matriz dispersa,
+        en lugar de recorrer el pipeline una vez por documento.
+        
+        Args:
+            texts: Lista de textos de documentos a clasificar
+            
+        Returns:
+            Lista de tuplas (categoría_predicha, confianza, probabilidades_todas)
+            en el mismo orden que ``texts``
+        """
+        return [result[:3] for result in self.analyze_documents(texts, top_n=0)]
+    
+    def analyze_document(self, text: str, top_n: int = 10) -> Tuple[str, float, Dict[str, float], List[str]]:
+        """
+        Clasifica un documento y extrae sus palabras clave en una sola pasada
+        
+        Args:
+            text: Texto del documento
+            top_n: Número de palabras clave a extraer
+            
+        Returns:
+            Tupla con (categoría_predicha, confianza, probabilidades_todas, palabras_clave)
+        """
+        return self.analyze_documents([text], top_n=top_n)[0]
+    
+    def analyze_documents(
+        self, texts: List[str], top_n: int = 10
+    ) -> List[Tuple[str, float, Dict[str, float], List[str]]]:
+        """
+        Ruta de inferencia fusionada: vectoriza una sola vez por lote, deriva
+        la categoría del argmax de ``predict_proba`` (sin llamar a ``predict``)
+        y toma las palabras clave de la misma fila dispersa TF-IDF.
+        
+        Args:
+            texts: Lista de textos de documentos
+            top_n: Número de palabras clave por documento (0 para omitirlas)
+            
+        Returns:
+            Lista de tuplas (categoría_predicha, confianza, probabilidades_todas,
+            palabras_clave) en el mismo orden que ``texts``
+        """
+        # Se toma el estado una sola vez: un cambio de modelo concurrente no
+        # mezcla versiones dentro de la misma petición
+        state = self._state
+        if not state:
             raise Exception("Modelo no inicializado")
         
-        # Preprocesar texto
-        processed_text = self.preprocess_text(text)
+        with metrics.stage("preprocess"):
+            processed_texts = [self.preprocess_text(text) for text in texts]
+        
+        # Los textos vacíos no pasan por el modelo
+        results = [
+            ('Otro', 0.5, {cat: 0.0 for cat in self.categories}, [])
+            for _ in processed_texts
+        ]
+        
+        # Buscar en la caché; solo los textos no vistos pasan por el modelo
+        keys = {}
+        indices = []
+        with self._cache_lock:
+            for i, text in enumerate(processed_texts):
+                if not text:
+                    continue
+                key = self._cache_key(text, top_n, state.version)
+                cached = self._cache.get(key) if CLASSIFIER_CACHE_ITEMS > 0 else None
+                if cached is not None:
+                    self._cache.move_to_end(key)
+                    self.cache_hits += 1
+                    results[i] = self._copy_result(cached)
+                else:
+                    self.cache_misses += 1
+                    keys[i] = key
+                    indices.append(i)
         
-        if not processed_text:
-            return ('Otro', 0.5, {cat: 0.0 for cat in self.categories})
+        if not indices:
+            return results
         
-        # Predecir
-        prediction = self.model.predict([processed_text])[0]
+        vectorizer = state.model.steps[0][1]
+        clf = state.model.steps[-1][1]
+        engine = state.engine
         
-        # Obtener probabilidades
-        probabilities = self.model.predict_proba([processed_text])[0]
+        if engine is not None:
+            # Modelo compilado: mismos resultados sin la maquinaria de sklearn
+            classes = engine.classes
+            with metrics.stage("tfidf"):
+                rows = [engine.transform(processed_texts[i]) for i in indices]
+            with metrics.stage("predict"):
+                probabilities = engine.predict_proba(rows)
+                best = probabilities.argmax(axis=1)
+        else:
+            classes = clf.classes_
+            # Una sola vectorización y una sola predicción para todo el lote
+            with metrics.stage("tfidf"):
+                features = vectorizer.transform([processed_texts[i] for i in indices])
+            with metrics.stage("predict"):
+                probabilities = clf.predict_proba(features)
+                best = probabilities.argmax(axis=1)
         
-        # Crear diccionario de probabilidades por categoría
-        prob_dict = {
-            cat: float(prob) 
-            for cat, prob in zip(self.model.classes_, probabilities)
-        }
+        keyword_seconds = 0.0
+        for row, i in enumerate(indices):
+            prob_dict = {
+                cat: float(prob)
+                for cat, prob in zip(classes, probabilities[row])
+            }
+            start = time.perf_counter()
+            if top_n <= 0:
+                keywords = []
+            elif engine is not None:
+                columns, values = rows[row]
+                keywords = self._top_terms(values, columns, top_n, state.feature_names)
+            elif state.feature_names is not None:
+                keywords = self._top_keywords(features, row, top_n, state.feature_names)
+            else:
+                keywords = self._frequent_terms(vectorizer, processed_texts[i], top_n)
+            keyword_seconds += time.perf_counter() - start
+            results[i] = (
+                str(classes[best[row]]),
+                float(probabilities[row, best[row]]),
+                prob_dict,
+                keywords
+            )
+        if top_n > 0:
+            metrics.record_stage("keywords", keyword_seconds)
         
-        # Obtener confianza de la predicción
-        confidence = float(max(probabilities))
+        if CLASSIFIER_CACHE_ITEMS > 0:
+            with self._cache_lock:
+                for i in indices:
+                    # Una clave de un modelo anterior (reemplazado mientras tanto) no se guarda
+                    if keys[i][0] == self.model_version:
+                        self._cache[keys[i]] = self._copy_result(results[i])
+                while len(self._cache) > CLASSIFIER_CACHE_ITEMS:
+                    self._cache.popitem(last=False)
         
-        return (prediction, confidence, prob_dict)
+        return results
+    
+    @staticmethod
+    def _copy_result(result):
+        """Copia superficial para que quien llama no modifique la caché"""
+        category, confidence, prob_dict, keywords = result
+        return (category, confidence, dict(prob_dict), list(keywords))
     
     def extract_keywords(self, text: str, top_n: int = 10) -> List[str]:
         """
@@ -191,43 +445,269 @@ class DocumentClassifier:
         Returns:
             Lista de palabras clave
         """
-        processed_text = self.preprocess_text(text)
+        if not self._state:
+            return []
         
-        if not processed_text or not self.model:
+        return self.analyze_document(text, top_n=top_n)[3]
+    
+    @staticmethod
+    def _top_keywords(features, row: int, top_n: int, feature_names) -> List[str]:
+        """
+        Devuelve los términos con mayor peso TF-IDF de una fila de la matriz
+        dispersa, sin densificarla (solo se recorren los valores no nulos).
+        """
+        start, end = features.indptr[row], features.indptr[row + 1]
+        return DocumentClassifier._top_terms(
+            features.data[start:end], features.indices[start:end], top_n, feature_names
+        )
+    
+    @staticmethod
+    def _top_terms(values, columns, top_n: int, feature_names) -> List[str]:
+        """Términos de mayor peso dados los valores no nulos de una fila y sus columnas"""
+        if top_n <= 0 or len(values) == 0:
             return []
         
-        # Obtener features TF-IDF
-        tfidf = self.model.named_steps['tfidf']
-        features = tfidf.transform([processed_text])
+        # Orden descendente por peso; los empates se resuelven por índice de término
+        order = np.lexsort((columns, -values))[:top_n]
+        
+        return [str(feature_names[columns[i]]) for i in order if values[i] > 0]
+    
+    def _activate(self, model: "Pipeline", version: str):
+        """
+        Reemplaza el modelo activo con una sola asignación (sin bloquear a los
+        lectores) e invalida los resultados memorizados del modelo anterior
+        """
+        engine = None
+        if CLASSIFIER_ENGINE == "numpy":
+            check_texts = [self.preprocess_text(text) for text in self.basic_training_data()[0]]
+            engine = inference_engine.compile_pipeline(model, check_texts)
+        self._state = ModelState(model, version, engine)
+        with self._cache_lock:
+            self._cache.clear()
+    
+    @staticmethod
+    def _cache_key(processed_text: str, top_n: int, version: str) -> Tuple[str, str, int]:
+        digest = hashlib.sha256(processed_text.encode('utf-8')).hexdigest()
+        return (version, digest, top_n)
+    
+    def cache_stats(self) -> Dict[str, int]:
+        """Contadores de la caché de clasificación"""
+        with self._cache_lock:
+            return {
+                "items": len(self._cache),
+                "hits": self.cache_hits,
+                "misses": self.cache_misses
+            }
+    
+    @staticmethod
+    def _frequent_terms(vectorizer, processed_text: str, top_n: int) -> List[str]:
+        """
+        Palabras clave para el pipeline en línea: el hashing no conserva los
+        términos, así que se usan los n-gramas más frecuentes del documento
+        """
+        analyzer = vectorizer.build_analyzer()
+        counts = Counter(analyzer(processed_text))
+        return [term for term, _ in counts.most_common(top_n)]
+    
+    def read_manifest(self) -> Dict[str, Any]:
+        """Manifiesto de versiones: ``{"active": ..., "versions": [...]}``"""
+        if not os.path.exists(self.manifest_path):
+            return {"active": None, "versions": []}
+        with open(self.manifest_path, 'r', encoding='utf-8') as f:
+            return json.load(f)
+    
+    def _write_manifest(self, manifest: Dict[str, Any]):
+        # Escritura atómica: otros workers nunca leen un manifiesto a medias
+        temp_path = f"{self.manifest_path}.{os.getpid()}.tmp"
+        with open(temp_path, 'w', encoding='utf-8') as f:
+            json.dump(manifest, f, ensure_ascii=False, indent=2)
+        os.replace(temp_path, self.manifest_path)
+    
+    def _publish(self, model: "Pipeline", source: str) -> str:
+        """
+        Guarda el modelo como una versión nueva (pickle más formato compacto),
+        la marca como activa en el manifiesto y la activa en este proceso
+        
+        Returns:
+            Versión publicada
+        """
+        import joblib
+        
+        os.makedirs(self.models_dir, exist_ok=True)
         
-        # Obtener nombres de features
-        feature_names = tfidf.get_feature_names_out()
+        online = self.is_online_model(model)
+        temp_path = os.path.join(self.models_dir, f".{os.getpid()}-{threading.get_ident()}.tmp")
+        # Los conteos del pipeline en línea (2^18 features por clase) son casi
+        # todos cero: comprimido, el pickle ocupa una fracción
+        joblib.dump(model, temp_path, compress=3 if online else 0)
         
-        # Obtener índices de los valores más altos
-        top_indices = features.toarray()[0].argsort()[-top_n:][::-1]
+        digest = hashlib.sha256()
+        with open(temp_path, 'rb') as f:
+            for chunk in iter(lambda: f.read(1024 * 1024), b""):
+                digest.update(chunk)
+        version = f"{time.strftime('%Y%m%d-%H%M%S')}-{digest.hexdigest()[:8]}"
+        os.replace(temp_path, os.path.join(self.models_dir, f"{version}.pkl"))
+        compact_model.export_compact(model, os.path.join(self.models_dir, version))
+        
+        manifest = self.read_manifest()
+        manifest["versions"] = [v for v in manifest["versions"] if v["version"] != version]
+        manifest["versions"].append({
+            "version": version,
+            "file": f"{version}.pkl",
+            "compact": version,
+            "created_at": datetime.now().isoformat(timespec='seconds'),
+            "source": source,
+            "kind": "online" if online else "vocabulary"
+        })
+        manifest["active"] = version
+        if online:
+            self._drop_superseded_pickles(manifest)
+        self._prune_versions(manifest)
+        self._write_manifest(manifest)
+        
+        self._activate(model, version)
+        return version
+    
+    def _drop_superseded_pickles(self, manifest: Dict[str, Any]):
+        """
+        Cada actualización incremental guarda el modelo completo. El pickle
+        solo hace falta para seguir entrenando la versión activa: en las
+        versiones en línea anteriores se borra y queda el formato compacto,
+        que alcanza para servirlas o volver a ellas (rollback)
+        """
+        for entry in manifest["versions"]:
+            if (entry["kind"] == "online" and entry["version"] != manifest["active"]
+                    and entry.get("file") and entry.get("compact")
+                    and os.path.exists(os.path.join(self.models_dir, entry["compact"], "meta.json"))):
+                try:
+                    os.remove(os.path.join(self.models_dir, entry["file"]))
+                except OSError:
+                    pass
+                entry["file"] = None
+    
+    def _prune_versions(self, manifest: Dict[str, Any]):
+        """Borra las versiones más viejas, conservando siempre la activa"""
+        versions = manifest["versions"]
+        keep = versions[-MODEL_KEEP_VERSIONS:] if MODEL_KEEP_VERSIONS > 0 else []
+        keep_names = {v["version"] for v in keep} | {manifest["active"]}
+        
+        for entry in versions:
+            if entry["version"] not in keep_names:
+                if entry.get("file"):
+                    try:
+                        os.remove(os.path.join(self.models_dir, entry["file"]))
+                    except OSError:
+                        pass
+                if entry.get("compact"):
+                    shutil.rmtree(os.path.join(self.models_dir, entry["compact"]), ignore_errors=True)
+        
+        manifest["versions"] = [v for v in versions if v["version"] in keep_names]
+    
+    def load_model(self, version: Optional[str] = None) -> str:
+        """
+        Carga una versión del modelo y la activa sin reiniciar el servicio
+        
+        Args:
+            version: Versión a activar (promoción o rollback). Si es None se
+                usa la versión activa del manifiesto.
+            
+        Returns:
+            Versión activada
+        """
+        manifest = self.read_manifest()
+        version = version or manifest["active"]
+        entry = next((v for v in manifest["versions"] if v["version"] == version), None)
+        
+        if entry is None:
+            raise ValueError(f"Versión de modelo desconocida: {version}")
+        
+        model = self._load_artifact(entry)
+        
+        if manifest["active"] != version:
+            manifest["active"] = version
+            self._write_manifest(manifest)
+        
+        self._activate(model, version)
+        return version
+    
+    def refresh_active(self) -> Optional[str]:
+        """
+        Activa la versión activa del manifiesto si otro proceso la cambió
+        (``/train`` o ``/model/reload`` atendidos por otro worker)
+        
+        Returns:
+            Versión cargada, o None si no cambió o este proceso está publicando
+            una versión propia
+        """
+        # Mientras este proceso entrena, el manifiesto ya apunta a la versión
+        # nueva pero todavía no está activa aquí: no se carga dos veces
+        if not self._train_lock.acquire(blocking=False):
+            return None
+        try:
+            active = self.read_manifest()["active"]
+            if active and active != self.model_version:
+                return self.load_model(active)
+            return None
+        finally:
+            self._train_lock.release()
+    
+    def _load_artifact(self, entry: Dict[str, Any], editable: bool = False) -> "Pipeline":
+        """
+        Carga una versión desde disco. Para servir se prefiere el formato
+        compacto (sin pickle, arreglos mapeados en memoria); para seguir
+        entrenando hace falta el pickle completo (conteos de partial_fit).
+        """
+        compact_dir = os.path.join(self.models_dir, entry.get("compact") or "")
+        if (not editable and (MODEL_FORMAT == "compact" or not entry.get("file")) and entry.get("compact")
+                and os.path.exists(os.path.join(compact_dir, "meta.json"))):
+            return compact_model.load_pipeline(compact_dir)
         
-        # Obtener palabras clave
-        keywords = [feature_names[i] for i in top_indices if features.toarray()[0][i] > 0]
+        if not entry.get("file"):
+            raise ValueError(f"La versión {entry['version']} no tiene pickle para seguir entrenando")
         
-        return keywords
+        import joblib
+        return joblib.load(os.path.join(self.models_dir, entry["file"]))
     
-    def save_model(self):
-        """Guarda el modelo entrenado"""
-        if self.model:
-            joblib.dump(self.model, self.model_path)
+    def _load_active_for_training(self) -> "Pipeline":
+        """
+        Copia editable del modelo activo, leída de su pickle. Si es una
+        versión en línea anterior cuyo pickle ya se borró (tras un rollback),
+        se reconstruye con los ejemplos base y el corpus persistido.
+        """
+        manifest = self.read_manifest()
+        entry = next(v for v in manifest["versions"] if v["version"] == self.model_version)
+        if not entry.get("file"):
+            return self._build_online_model()
+        return self._load_artifact(entry, editable=True)
     
-    def load_model(self):
-        """Carga el modelo entrenado"""
-        if os.path.exists(self.model_path):
-            self.model = joblib.load(self.model_path)
+    @staticmethod
+    def is_online_model(model: Optional["Pipeline"]) -> bool:
+        """True si el modelo admite actualizaciones con ``partial_fit``"""
+        if model is None:
+            return False
+        from sklearn.feature_extraction.text import HashingVectorizer
+        return isinstance(model.steps[0][1], HashingVectorizer)
     
-    def train_with_new_data(self, texts: List[str], labels: List[str]):
+    def train_with_new_data(self, texts: List[str], labels: List[str]) -> str:
         """
-        Entrena el modelo con nuevos datos (actualización incremental)
+        Entrena el modelo con nuevos datos sin perder lo aprendido
+        
+        En modo "incremental" el pipeline en línea se actualiza solo con los
+        ejemplos nuevos; en modo "full" se re-entrena con los ejemplos base,
+        todo el corpus y los nuevos. Los ejemplos se agregan al corpus
+        persistido recién cuando el modelo se publicó: si el entrenamiento
+        falla, el corpus queda como estaba.
+        
+        El modelo nuevo se entrena aparte y se publica como una versión nueva;
+        las peticiones de clasificación siguen usando el anterior hasta el
+        reemplazo.
         
         Args:
             texts: Lista de textos de documentos
             labels: Lista de etiquetas correspondientes
+            
+        Returns:
+            Versión del modelo publicado
         """
         if len(texts) != len(labels):
             raise ValueError("El número de textos y etiquetas debe ser igual")
@@ -235,24 +715,169 @@ class DocumentClassifier:
         if len(texts) == 0:
             raise ValueError("Debe proporcionar al menos un texto para entrenar")
         
+        if TRAINING_MODE == "incremental":
+            self._check_labels(labels)
+        
         # Preprocesar textos
         processed_texts = [self.preprocess_text(text) for text in texts]
         
-        # Entrenar modelo
-        if not self.model:
-            self.create_basic_model()
+        with self._train_lock:
+            try:
+                if TRAINING_MODE == "incremental":
+                    if self.is_online_model(self.model):
+                        # Se actualiza una copia: el modelo activo no se toca
+                        model = self._load_active_for_training()
+                    else:
+                        # Primera vez: se construye el pipeline en línea a partir
+                        # de los ejemplos base y del corpus
+                        model = self._build_online_model()
+                    self._partial_fit(model, processed_texts, labels)
+                else:
+                    model = self._build_full_model(processed_texts, labels)
+                
+                version = self._publish(model, source="train")
+                self._append_to_corpus(processed_texts, labels)
+                print(f"✓ Modelo actualizado con {len(texts)} nuevos ejemplos (versión {version})")
+                return version
+            except Exception as e:
+                print(f"✗ Error al entrenar modelo: {str(e)}")
+                raise
+    
+    def train_from_corpus(self, corpus_path: str, chunk_size: int = TRAINING_CHUNK_SIZE) -> int:
+        """
+        Entrena de forma incremental con un corpus etiquetado (JSON Lines con
+        "text" y "label"), leyéndolo por bloques con memoria acotada. Los
+        ejemplos se agregan al corpus persistido recién cuando el modelo se
+        publicó; mientras tanto se acumulan en un archivo temporal.
         
-        # Re-entrenar el modelo con los nuevos datos
-        # Nota: Esto actualiza el modelo existente con los nuevos ejemplos
-        try:
-            # Obtener datos de entrenamiento actuales (si existen)
-            # y combinarlos con los nuevos
-            self.model.fit(processed_texts, labels)
-            self.save_model()
-            print(f"✓ Modelo actualizado con {len(texts)} nuevos ejemplos")
-        except Exception as e:
-            print(f"✗ Error al entrenar modelo: {str(e)}")
-            raise
+        Args:
+            corpus_path: Ruta al corpus
+            chunk_size: Ejemplos por bloque
+            
+        Returns:
+            Cantidad de ejemplos procesados
+        """
+        # Re-entrenar con el propio corpus persistido no debe duplicarlo
+        persist = os.path.abspath(corpus_path) != os.path.abspath(self.corpus_path)
+        pending_path = f"{self.corpus_path}.{os.getpid()}.tmp"
+        
+        with self._train_lock:
+            try:
+                if not persist:
+                    # El modelo activo ya aprendió el corpus persistido: aplicarlo
+                    # otra vez duplicaría sus conteos, así que se parte de cero
+                    model = self.create_online_pipeline()
+                    self._partial_fit(model, *self.basic_training_data())
+                elif self.is_online_model(self.model):
+                    model = self._load_active_for_training()
+                else:
+                    model = self._build_online_model()
+                total = 0
+                
+                for texts, labels in self._iter_corpus(corpus_path, chunk_size):
+                    self._check_labels(labels)
+                    texts = [self.preprocess_text(text) for text in texts]
+                    self._partial_fit(model, texts, labels)
+                    if persist:
+                        self._append_to_corpus(texts, labels, pending_path)
+                    total += len(texts)
+                
+                version = self._publish(model, source="corpus")
+                if persist and os.path.exists(pending_path):
+                    with open(pending_path, 'rb') as src, open(self.corpus_path, 'ab') as dst:
+                        shutil.copyfileobj(src, dst)
+            finally:
+                if os.path.exists(pending_path):
+                    os.remove(pending_path)
+            
+            print(f"✓ Modelo actualizado con {total} ejemplos del corpus {corpus_path} (versión {version})")
+            return total
+    
+    def _check_labels(self, labels: List[str]):
+        # El pipeline en línea tiene un conjunto fijo de clases
+        unknown = sorted(set(labels) - set(self.categories))
+        if unknown:
+            raise ValueError(f"Categorías desconocidas: {', '.join(unknown)}")
+    
+    def _partial_fit(self, model: "Pipeline", texts: List[str], labels: List[str]):
+        features = model.steps[0][1].transform(texts)
+        model.steps[-1][1].partial_fit(features, labels, classes=self.categories)
+    
+    def _build_online_model(self) -> "Pipeline":
+        """Crea el pipeline en línea con los ejemplos base y el corpus persistido"""
+        model = self.create_online_pipeline()
+        self._partial_fit(model, *self.basic_training_data())
+        
+        for texts, labels in self._iter_corpus(self.corpus_path, TRAINING_CHUNK_SIZE):
+            self._partial_fit(model, texts, labels)
+        
+        return model
+    
+    def _build_full_model(self, new_texts: List[str], new_labels: List[str]) -> "Pipeline":
+        """
+        Re-entrena el pipeline TF-IDF con los ejemplos base, todo el corpus y
+        los ejemplos nuevos (que todavía no están en el corpus)
+        """
+        training_texts, training_labels = self.basic_training_data()
+        
+        for texts, labels in self._iter_corpus(self.corpus_path, TRAINING_CHUNK_SIZE):
+            training_texts.extend(texts)
+            training_labels.extend(labels)
+        training_texts.extend(new_texts)
+        training_labels.extend(new_labels)
+        
+        model = self.create_vocabulary_pipeline()
+        model.fit(training_texts, training_labels)
+        return model
+    
+    def _append_to_corpus(self, texts: List[str], labels: List[str], path: Optional[str] = None):
+        with open(path or self.corpus_path, 'a', encoding='utf-8') as f:
+            for text, label in zip(texts, labels):
+                f.write(json.dumps({"text": text, "label": label}, ensure_ascii=False) + "\n")
+    
+    @staticmethod
+    def _iter_corpus(corpus_path: str, chunk_size: int) -> Iterator[Tuple[List[str], List[str]]]:
+        """Recorre un corpus JSON Lines devolviendo bloques de (textos, etiquetas)"""
+        if not os.path.exists(corpus_path):
+            return
+        
+        texts, labels = [], []
+        with open(corpus_path, 'r', encoding='utf-8') as f:
+            for line in f:
+                if not line.strip():
+                    continue
+                example = json.loads(line)
+                texts.append(example["text"])
+                labels.append(example["label"])
+                if len(texts) >= chunk_size:
+                    yield texts, labels
+                    texts, labels = [], []
+        
+        if texts:
+            yield texts, labels
+
+# Singleton, creado en el primer uso (importar el módulo no carga sklearn ni el modelo)
+_classifier: Optional[DocumentClassifier] = None
+_classifier_lock = threading.Lock()
+
+
+def get_classifier() -> DocumentClassifier:
+    """Devuelve el clasificador compartido, creándolo la primera vez"""
+    global _classifier
+    if _classifier is None:
+        with _classifier_lock:
+            if _classifier is None:
+                _classifier = DocumentClassifier()
+    return _classifier
+
+
+def classifier_loaded() -> bool:
+    """True si el clasificador ya fue creado (get_classifier no va a bloquear)"""
+    return _classifier is not None
+
 
-# Singleton
-classifier = DocumentClassifier()
+def __getattr__(name: str):
+    # Compatibilidad con ``from classifier_service import classifier``
+    if name == "classifier":
+        return get_classifier()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
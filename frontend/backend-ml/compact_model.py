@@ -0,0 +1,129 @@
+"""
+Formato compacto del modelo de clasificación
+
+Guarda un pipeline entrenado como arreglos numpy sueltos (vocabulario, idf,
+log-probabilidades de clase) más un ``meta.json``, en lugar de un pickle.
+Los arreglos se abren con ``mmap_mode='r'``: cargar el modelo no copia los
+datos a memoria y varios procesos comparten las mismas páginas.
+
+Estructura de ``models/<versión>/``:
+    meta.json              tipo de vectorizador, parámetros y clases
+    terms.npy              términos del vocabulario, en orden de índice (solo TF-IDF)
+    idf.npy                vector idf (solo TF-IDF)
+    feature_log_prob.npy   log P(término | clase), forma (clases, features)
+    class_log_prior.npy    log P(clase)
+"""
+import json
+import os
+from typing import Any, Dict, Tuple
+
+import numpy as np
+
+# Se incrementa si cambia la estructura de los archivos
+COMPACT_FORMAT = 1
+
+# Parámetros del vectorizador que se guardan (el resto queda con su valor por defecto)
+_VECTORIZER_PARAMS = (
+    "analyzer", "binary", "decode_error", "encoding", "input", "lowercase",
+    "max_features", "ngram_range", "norm", "smooth_idf", "strip_accents",
+    "sublinear_tf", "token_pattern", "use_idf", "n_features", "alternate_sign",
+)
+
+
+def export_compact(model, directory: str):
+    """
+    Guarda un pipeline (vectorizador + MultinomialNB) en formato compacto
+
+    Args:
+        model: Pipeline entrenado
+        directory: Directorio destino (se crea si no existe)
+    """
+    vectorizer = model.steps[0][1]
+    clf = model.steps[-1][1]
+    has_vocabulary = hasattr(vectorizer, 'vocabulary_')
+
+    params = vectorizer.get_params()
+    meta = {
+        "format": COMPACT_FORMAT,
+        "kind": "vocabulary" if has_vocabulary else "online",
+        "vectorizer_step": model.steps[0][0],
+        "vectorizer": {
+            key: (list(value) if isinstance(value, tuple) else value)
+            for key, value in params.items()
+            if key in _VECTORIZER_PARAMS
+        },
+        "classes": [str(cls) for cls in clf.classes_],
+    }
+
+    os.makedirs(directory, exist_ok=True)
+
+    if has_vocabulary:
+        terms = vectorizer.get_feature_names_out()
+        np.save(os.path.join(directory, "terms.npy"), np.asarray(terms, dtype=str))
+        np.save(os.path.join(directory, "idf.npy"), np.asarray(vectorizer.idf_))
+
+    np.save(os.path.join(directory, "feature_log_prob.npy"), np.asarray(clf.feature_log_prob_))
+    np.save(os.path.join(directory, "class_log_prior.npy"), np.asarray(clf.class_log_prior_))
+
+    # meta.json se escribe al final: su presencia indica que el directorio está completo
+    with open(os.path.join(directory, "meta.json"), 'w', encoding='utf-8') as f:
+        json.dump(meta, f, ensure_ascii=False, indent=2)
+
+
+def load_arrays(directory: str) -> Tuple[Dict[str, Any], Dict[str, np.ndarray]]:
+    """
+    Abre los arreglos de un modelo compacto mapeados en memoria (solo lectura)
+
+    Returns:
+        Tupla con (meta, arreglos)
+    """
+    with open(os.path.join(directory, "meta.json"), 'r', encoding='utf-8') as f:
+        meta = json.load(f)
+
+    if meta.get("format") != COMPACT_FORMAT:
+        raise ValueError(f"Formato de modelo compacto no soportado: {meta.get('format')}")
+
+    names = ["feature_log_prob", "class_log_prior"]
+    if meta["kind"] == "vocabulary":
+        names += ["terms", "idf"]
+
+    arrays = {
+        name: np.load(os.path.join(directory, f"{name}.npy"), mmap_mode='r')
+        for name in names
+    }
+    return meta, arrays
+
+
+def load_pipeline(directory: str):
+    """
+    Reconstruye un pipeline de sklearn listo para predecir a partir del
+    formato compacto, sin deserializar pickles
+
+    Args:
+        directory: Directorio del modelo compacto
+
+    Returns:
+        Pipeline con el vectorizador y el MultinomialNB
+    """
+    from sklearn.feature_extraction.text import TfidfVectorizer, HashingVectorizer
+    from sklearn.naive_bayes import MultinomialNB
+    from sklearn.pipeline import Pipeline
+
+    meta, arrays = load_arrays(directory)
+    params = dict(meta["vectorizer"])
+    params["ngram_range"] = tuple(params["ngram_range"])
+
+    if meta["kind"] == "vocabulary":
+        vectorizer = TfidfVectorizer(**params)
+        vectorizer.vocabulary_ = {str(term): i for i, term in enumerate(arrays["terms"])}
+        vectorizer.idf_ = arrays["idf"]
+    else:
+        vectorizer = HashingVectorizer(**params)
+
+    clf = MultinomialNB()
+    clf.classes_ = np.asarray(meta["classes"])
+    clf.feature_log_prob_ = arrays["feature_log_prob"]
+    clf.class_log_prior_ = arrays["class_log_prior"]
+    clf.n_features_in_ = arrays["feature_log_prob"].shape[1]
+
+    return Pipeline([(meta["vectorizer_step"], vectorizer), ('clf', clf)])
@@ -0,0 +1,292 @@
+"""
+Evaluación y selección del pipeline de clasificación
+
+Compara pipelines candidatos sobre un corpus etiquetado y genera un ranking
+con exactitud, tiempo de entrenamiento, latencia de inferencia y tamaño del
+modelo. Candidatos: cada representación de features (vocabulario TF-IDF con
+distintos rangos de n-gramas, hashing con y sin TF-IDF) combinada con cada
+clasificador (MultinomialNB, SVM lineal, regresión logística).
+
+El corpus puede ser:
+- un directorio con una carpeta por categoría y un archivo de texto por
+  documento: ``corpus/Factura/0001.txt``
+- un archivo JSON Lines como el corpus de entrenamiento (``text`` y ``label``)
+
+Cómo se mide:
+- exactitud y F1 macro: validación cruzada estratificada; los folds corren en
+  paralelo (``--jobs``) y dentro de cada fold cada representación se vectoriza
+  una sola vez y la usan todos los clasificadores
+- entrenamiento: vectorizar el fold de entrenamiento más ajustar el
+  clasificador (promedio de los folds)
+- latencia: el pipeline entrenado con todo el corpus clasifica documentos de a
+  uno con ``predict_proba`` (o ``decision_function`` si no tiene
+  probabilidades, como el SVM lineal), igual que una petición a ``/classify``
+- tamaño: bytes del pickle en disco y memoria asignada al cargarlo
+
+Uso:
+    python evaluate_models.py corpus/ [--folds 5] [--jobs -1]
+                              [--only tfidf_12+nb,hashing_12+nb]
+                              [--output evaluacion.json]
+"""
+import argparse
+import json
+import os
+import pickle
+import statistics
+import sys
+import time
+import tracemalloc
+from typing import Callable, Dict, List, Tuple
+
+import numpy as np
+
+script_dir = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, script_dir)
+
+from classifier_service import DocumentClassifier, HASHING_FEATURES  # noqa: E402
+
+# Candidato que usa hoy create_vocabulary_pipeline
+CURRENT_CANDIDATE = "tfidf_12+nb"
+
+# Documentos clasificados de a uno para medir la latencia
+LATENCY_SAMPLES = 200
+
+
+def _tfidf(ngram_range: Tuple[int, int], max_features=1000):
+    from sklearn.feature_extraction.text import TfidfVectorizer
+    return lambda: TfidfVectorizer(max_features=max_features, ngram_range=ngram_range)
+
+
+def _hashing(ngram_range: Tuple[int, int], tfidf: bool = False):
+    def build():
+        from sklearn.feature_extraction.text import HashingVectorizer, TfidfTransformer
+        from sklearn.pipeline import Pipeline
+
+        hashing = HashingVectorizer(n_features=HASHING_FEATURES, ngram_range=ngram_range,
+                                    alternate_sign=False)
+        if not tfidf:
+            return hashing
+        return Pipeline([('hashing', hashing), ('tfidf', TfidfTransformer())])
+    return build
+
+
+def _classifier(name: str):
+    def build():
+        if name == "nb":
+            from sklearn.naive_bayes import MultinomialNB
+            return MultinomialNB()
+        if name == "svm":
+            from sklearn.svm import LinearSVC
+            return LinearSVC()
+        from sklearn.linear_model import LogisticRegression
+        return LogisticRegression(max_iter=1000)
+    return build
+
+
+# Representaciones de features: nombre -> fábrica del vectorizador sin entrenar
+FEATURES: Dict[str, Callable] = {
+    "tfidf_1": _tfidf((1, 1)),
+    "tfidf_12": _tfidf((1, 2)),
+    "tfidf_13": _tfidf((1, 3)),
+    "tfidf_12_full": _tfidf((1, 2), max_features=None),
+    "hashing_12": _hashing((1, 2)),
+    "hashing_tfidf_12": _hashing((1, 2), tfidf=True),
+}
+
+CLASSIFIERS: Dict[str, Callable] = {
+    "nb": _classifier("nb"),
+    "svm": _classifier("svm"),
+    "logreg": _classifier("logreg"),
+}
+
+
+def candidate_names() -> List[str]:
+    return [f"{features}+{clf}" for features in FEATURES for clf in CLASSIFIERS]
+
+
+def load_corpus(path: str) -> Tuple[List[str], List[str]]:
+    """Lee el corpus (directorio por categoría o JSON Lines) ya preprocesado"""
+    texts, labels = [], []
+    if os.path.isdir(path):
+        for label in sorted(os.listdir(path)):
+            label_dir = os.path.join(path, label)
+            if not os.path.isdir(label_dir):
+                continue
+            for name in sorted(os.listdir(label_dir)):
+                with open(os.path.join(label_dir, name), 'r', encoding='utf-8', errors='ignore') as f:
+                    texts.append(f.read())
+                labels.append(label)
+    else:
+        for chunk_texts, chunk_labels in DocumentClassifier._iter_corpus(path, 10000):
+            texts.extend(chunk_texts)
+            labels.extend(chunk_labels)
+
+    texts = [DocumentClassifier.preprocess_text(text) for text in texts]
+    return texts, labels
+
+
+def _evaluate_fold(texts: List[str], labels: np.ndarray, train_index: np.ndarray,
+                   test_index: np.ndarray, candidates: List[str]) -> Dict[str, Dict[str, float]]:
+    """
+    Entrena y evalúa todos los candidatos en un fold. Cada representación se
+    vectoriza una sola vez y se reutiliza con cada clasificador.
+    """
+    from sklearn.metrics import accuracy_score, f1_score
+
+    train_texts = [texts[i] for i in train_index]
+    test_texts = [texts[i] for i in test_index]
+    results = {}
+
+    for features_name in FEATURES:
+        classifiers = [c.split("+")[1] for c in candidates if c.split("+")[0] == features_name]
+        if not classifiers:
+            continue
+
+        start = time.perf_counter()
+        vectorizer = FEATURES[features_name]()
+        train_features = vectorizer.fit_transform(train_texts)
+        vectorize_seconds = time.perf_counter() - start
+        test_features = vectorizer.transform(test_texts)
+
+        for clf_name in classifiers:
+            start = time.perf_counter()
+            clf = CLASSIFIERS[clf_name]().fit(train_features, labels[train_index])
+            fit_seconds = time.perf_counter() - start
+            predicted = clf.predict(test_features)
+            results[f"{features_name}+{clf_name}"] = {
+                "accuracy": accuracy_score(labels[test_index], predicted),
+                "f1_macro": f1_score(labels[test_index], predicted, average="macro", zero_division=0),
+                "train_s": vectorize_seconds + fit_seconds,
+            }
+
+    return results
+
+
+def build_pipeline(candidate: str):
+    """Pipeline sin entrenar de un candidato (``tfidf_12+nb``...)"""
+    from sklearn.pipeline import Pipeline
+
+    features_name, clf_name = candidate.split("+")
+    return Pipeline([('features', FEATURES[features_name]()), ('clf', CLASSIFIERS[clf_name]())])
+
+
+def measure_model(candidate: str, texts: List[str], labels: List[str]) -> Dict[str, float]:
+    """Entrena con todo el corpus y mide latencia y tamaño del pipeline"""
+    model = build_pipeline(candidate).fit(texts, labels)
+    score = model.predict_proba if hasattr(model, "predict_proba") else model.decision_function
+
+    samples = texts[:LATENCY_SAMPLES]
+    score(samples[:1])
+    latencies = []
+    for text in samples:
+        start = time.perf_counter()
+        score([text])
+        latencies.append(time.perf_counter() - start)
+    latencies.sort()
+
+    payload = pickle.dumps(model, protocol=pickle.HIGHEST_PROTOCOL)
+    tracemalloc.start()
+    loaded = pickle.loads(payload)
+    memory_bytes, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del loaded
+
+    return {
+        "latency_p50_ms": round(latencies[len(latencies) // 2] * 1000, 3),
+        "latency_p95_ms": round(latencies[min(len(latencies) - 1, int(len(latencies) * 0.95))] * 1000, 3),
+        "probabilities": hasattr(model, "predict_proba"),
+        "disk_bytes": len(payload),
+        "memory_bytes": memory_bytes,
+    }
+
+
+def fold_count(labels: List[str], folds: int) -> int:
+    """Folds efectivos: no puede haber más que documentos de la categoría más chica"""
+    smallest_class = min(np.unique(np.asarray(labels), return_counts=True)[1])
+    folds = min(folds, int(smallest_class))
+    if folds < 2:
+        raise ValueError("Cada categoría necesita al menos 2 documentos para la validación cruzada")
+    return folds
+
+
+def evaluate(texts: List[str], labels: List[str], candidates: List[str],
+             folds: int = 5, jobs: int = -1) -> List[Dict]:
+    """
+    Evalúa los candidatos y los devuelve ordenados: mayor exactitud primero,
+    a igual exactitud menor latencia
+    """
+    from joblib import Parallel, delayed
+    from sklearn.model_selection import StratifiedKFold
+
+    label_array = np.asarray(labels)
+    folds = fold_count(labels, folds)
+    splitter = StratifiedKFold(n_splits=folds, shuffle=True, random_state=0)
+    fold_results = Parallel(n_jobs=jobs)(
+        delayed(_evaluate_fold)(texts, label_array, train_index, test_index, candidates)
+        for train_index, test_index in splitter.split(texts, label_array)
+    )
+
+    report = []
+    for candidate in candidates:
+        per_fold = [result[candidate] for result in fold_results]
+        accuracies = [fold["accuracy"] for fold in per_fold]
+        entry = {
+            "candidate": candidate,
+            "current": candidate == CURRENT_CANDIDATE,
+            "accuracy": round(statistics.mean(accuracies), 4),
+            "accuracy_std": round(statistics.pstdev(accuracies), 4),
+            "f1_macro": round(statistics.mean(fold["f1_macro"] for fold in per_fold), 4),
+            "train_s": round(statistics.mean(fold["train_s"] for fold in per_fold), 4),
+        }
+        entry.update(measure_model(candidate, texts, labels))
+        report.append(entry)
+
+    report.sort(key=lambda entry: (-entry["accuracy"], entry["latency_p50_ms"]))
+    for rank, entry in enumerate(report, 1):
+        entry["rank"] = rank
+    return report
+
+
+def print_table(report: List[Dict]):
+    print(f"{'#':>2}  {'candidato':<24} {'exactitud':>9} {'F1':>6} {'entren. s':>9} "
+          f"{'p50 ms':>7} {'p95 ms':>7} {'disco KB':>9} {'mem KB':>8}")
+    for entry in report:
+        marker = " *" if entry["current"] else ""
+        print(f"{entry['rank']:>2}  {entry['candidate'] + marker:<24} {entry['accuracy']:>9.4f} "
+              f"{entry['f1_macro']:>6.3f} {entry['train_s']:>9.3f} {entry['latency_p50_ms']:>7.3f} "
+              f"{entry['latency_p95_ms']:>7.3f} {entry['disk_bytes'] / 1024:>9.1f} "
+              f"{entry['memory_bytes'] / 1024:>8.1f}")
+    print(f"\n* pipeline actual ({CURRENT_CANDIDATE})")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("corpus", help="Directorio con una carpeta por categoría o archivo JSON Lines")
+    parser.add_argument("--folds", type=int, default=5, help="Folds de la validación cruzada")
+    parser.add_argument("--jobs", type=int, default=-1, help="Folds en paralelo (-1 = uno por núcleo)")
+    parser.add_argument("--only", help="Candidatos separados por comas (por defecto, todos)")
+    parser.add_argument("--output", help="Archivo donde guardar el ranking en JSON")
+    args = parser.parse_args()
+
+    candidates = args.only.split(",") if args.only else candidate_names()
+    unknown = set(candidates) - set(candidate_names())
+    if unknown:
+        parser.error(f"Candidatos desconocidos: {', '.join(sorted(unknown))}")
+
+    texts, labels = load_corpus(args.corpus)
+    if not texts:
+        parser.error(f"Corpus vacío: {args.corpus}")
+
+    print(f"Corpus: {len(texts)} documentos, {len(set(labels))} categorías", file=sys.stderr)
+    report = evaluate(texts, labels, candidates, folds=args.folds, jobs=args.jobs)
+    print_table(report)
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump({"corpus": args.corpus, "documents": len(texts), "folds": fold_count(labels, args.folds),
+                       "ranking": report}, f, ensure_ascii=False, indent=2)
+            f.write("\n")
+
+
+if __name__ == "__main__":
+    main()
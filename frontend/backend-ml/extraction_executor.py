@@ -0,0 +1,213 @@
+"""
+Ejecución de la extracción de texto (OCR / PDF) fuera del event loop
+
+Los handlers de FastAPI son ``async def``; si llaman a pytesseract o a
+pdf2image directamente, un solo PDF escaneado bloquea todo el worker de
+uvicorn. Este módulo despacha la extracción a un pool de procesos y limita
+la cantidad de extracciones en curso.
+"""
+import asyncio
+import logging
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Optional, Dict, Any, Tuple
+
+import metrics
+from ocr_service import OCR_CACHE_ENABLED, Source
+
+logger = logging.getLogger(__name__)
+
+# Modo de ejecución: "process" (pool de procesos), "thread" (pool de hilos)
+# o "inline" (en el mismo hilo del event loop, comportamiento original)
+EXECUTOR_MODE = os.getenv("OCR_EXECUTOR_MODE", "process").lower()
+
+# Cantidad de procesos del pool (0 = uno por núcleo)
+EXECUTOR_WORKERS = int(os.getenv("OCR_WORKERS", "0")) or (os.cpu_count() or 1)
+
+# Máximo de extracciones en curso; las demás esperan turno (0 = 2 por worker)
+MAX_INFLIGHT = int(os.getenv("OCR_MAX_INFLIGHT", "0")) or EXECUTOR_WORKERS * 2
+
+
+class ExtractionUnavailable(Exception):
+    """
+    Un proceso del pool murió (p. ej. por memoria) y el pool se está
+    recreando; la extracción se puede reintentar. La API responde 503.
+    """
+
+
+def _init_worker():
+    """Inicializa cada proceso del pool: precarga el motor de OCR"""
+    import ocr_service as ocr_module
+    from ocr_service import ocr_service
+    # Los documentos ya se reparten entre los workers: sus páginas van de a una
+    ocr_module.set_page_workers_default(1)
+    try:
+        ocr_service.warm_up()
+    except Exception as e:
+        # Un fallo aquí no debe impedir extraer PDFs con texto o archivos de texto
+        logger.warning(f"No se pudo precargar el motor de OCR: {str(e)}")
+
+
+def _extract_document_worker(file_path: Source, mime_type: str, first_page: int = 1,
+                             last_page: Optional[int] = None) -> Dict[str, Any]:
+    """
+    Punto de entrada dentro del proceso worker. Devuelve también las etapas
+    medidas (``stages``), que se registran en el proceso de la API.
+    """
+    from ocr_service import ocr_service
+    with metrics.collect_stages() as stages:
+        with metrics.stage("extract"):
+            result = ocr_service.extract_document(file_path, mime_type, first_page, last_page)
+    return {**result, "stages": stages}
+
+
+def _source_size(file_path: Source) -> int:
+    if isinstance(file_path, (bytes, bytearray)):
+        return len(file_path)
+    try:
+        return os.path.getsize(file_path)
+    except OSError:
+        return 0
+
+
+def _is_cacheable(mime_type: str) -> bool:
+    """Solo vale la pena cachear lo que pasa por OCR o por el lector de PDF"""
+    return mime_type == 'application/pdf' or mime_type.startswith('image/')
+
+
+def _cache_lookup(file_path: Source, mime_type: str, first_page: int = 1,
+                  last_page: Optional[int] = None) -> Tuple[str, Optional[Dict[str, Any]]]:
+    """Calcula la clave del archivo y busca un resultado previo"""
+    from ocr_service import ocr_service, ocr_cache
+    key = ocr_service.cache_key(file_path, mime_type, first_page, last_page)
+    return key, ocr_cache.get(key)
+
+
+def _cache_store(key: str, result: Dict[str, Any]):
+    from ocr_service import ocr_cache
+    ocr_cache.put(key, result)
+
+
+class ExtractionExecutor:
+    def __init__(self, mode: str = EXECUTOR_MODE, max_workers: int = EXECUTOR_WORKERS,
+                 max_inflight: int = MAX_INFLIGHT):
+        if mode not in ("process", "thread", "inline"):
+            raise ValueError(f"Modo de ejecución no soportado: {mode}")
+
+        self.mode = mode
+        self.max_workers = max_workers
+        self.max_inflight = max_inflight
+        self._pool = None
+        self._semaphore: Optional[asyncio.Semaphore] = None
+
+    def _get_pool(self):
+        """Crea el pool en el primer uso para no pagar el arranque al importar"""
+        if self._pool is None:
+            if self.mode == "process":
+                self._pool = ProcessPoolExecutor(
+                    max_workers=self.max_workers,
+                    initializer=_init_worker
+                )
+            else:
+                # Los hilos ya extraen documentos en paralelo: páginas de a una
+                import ocr_service
+                ocr_service.set_page_workers_default(1)
+                self._pool = ThreadPoolExecutor(
+                    max_workers=self.max_workers,
+                    thread_name_prefix="ocr"
+                )
+            logger.info(
+                f"Pool de extracción iniciado: modo={self.mode}, "
+                f"workers={self.max_workers}, en_curso_max={self.max_inflight}"
+            )
+        return self._pool
+
+    def _get_semaphore(self) -> asyncio.Semaphore:
+        # Se crea dentro del event loop en ejecución
+        if self._semaphore is None:
+            self._semaphore = asyncio.Semaphore(self.max_inflight)
+        return self._semaphore
+
+    async def extract(self, file_path: Source, mime_type: str, first_page: int = 1,
+                      last_page: Optional[int] = None) -> Dict[str, Any]:
+        """
+        Extrae texto de un archivo sin bloquear el event loop
+
+        Args:
+            file_path: Ruta al archivo o su contenido en bytes (los archivos
+                chicos se procesan sin pasar por disco, ver uploads.py)
+            mime_type: Tipo MIME del archivo
+            first_page: Primera página a extraer (solo PDFs)
+            last_page: Última página a extraer (solo PDFs; por defecto la última)
+
+        Returns:
+            Diccionario con ``text``, ``pages`` (detalle y tiempos por página),
+            ``ocr_confidence``, ``page_count`` y ``cached`` (True si el
+            resultado vino de la caché de OCR)
+        """
+        loop = asyncio.get_running_loop()
+        cache_key = None
+
+        # La caché se consulta en este proceso: así el nivel en memoria es
+        # común a todos los workers del pool
+        if OCR_CACHE_ENABLED and _is_cacheable(mime_type):
+            with metrics.stage("ocr_cache_lookup"):
+                cache_key, cached = await loop.run_in_executor(
+                    None, _cache_lookup, file_path, mime_type, first_page, last_page
+                )
+            if cached is not None:
+                return {**cached, "cached": True}
+
+        result = await self._run(file_path, mime_type, first_page, last_page)
+        metrics.merge_stages(result.pop("stages"))
+        metrics.bytes_extracted.inc(_source_size(file_path), kind=metrics.document_kind(mime_type))
+        for page in result["pages"]:
+            metrics.pages_processed.inc(method=page["method"])
+
+        if cache_key is not None:
+            await loop.run_in_executor(None, _cache_store, cache_key, result)
+
+        return {**result, "cached": False}
+
+    async def _run(self, file_path: Source, mime_type: str, first_page: int = 1,
+                   last_page: Optional[int] = None) -> Dict[str, Any]:
+        if self.mode == "inline":
+            with metrics.extractions_in_flight.track():
+                return _extract_document_worker(file_path, mime_type, first_page, last_page)
+
+        waiting_since = time.perf_counter()
+        async with self._get_semaphore():
+            metrics.record_stage("extraction_wait", time.perf_counter() - waiting_since)
+            loop = asyncio.get_running_loop()
+            pool = self._get_pool()
+            try:
+                with metrics.extractions_in_flight.track():
+                    return await loop.run_in_executor(
+                        pool, _extract_document_worker,
+                        file_path, mime_type, first_page, last_page
+                    )
+            except BrokenProcessPool:
+                # Un worker murió (p. ej. por memoria); el próximo uso crea un
+                # pool nuevo. El roto se cierra sin esperar para no dejar su
+                # hilo de gestión ni los procesos que sigan vivos
+                if self._pool is pool:
+                    logger.error("El pool de extracción se rompió; se reiniciará")
+                    self._pool = None
+                    pool.shutdown(wait=False, cancel_futures=True)
+                raise ExtractionUnavailable("El proceso de extracción terminó inesperadamente") from None
+
+    async def extract_text(self, file_path: Source, mime_type: str) -> str:
+        """Como ``extract`` pero devuelve solo el texto"""
+        return (await self.extract(file_path, mime_type))["text"]
+
+    def shutdown(self):
+        """Detiene el pool esperando a que terminen las tareas en curso"""
+        if self._pool is not None:
+            self._pool.shutdown(wait=True)
+            self._pool = None
+
+
+# Singleton
+extraction_executor = ExtractionExecutor()
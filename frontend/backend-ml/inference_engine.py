@@ -0,0 +1,258 @@
+"""
+Motor de inferencia en NumPy puro para el pipeline TF-IDF + MultinomialNB
+
+Con un documento por llamada, el costo de ``Pipeline.predict_proba`` no está
+en la aritmética sino en las validaciones y conversiones de sklearn (armar la
+matriz CSR, ``check_array``, ``safe_sparse_dot``...). Este módulo compila el
+modelo entrenado a arreglos planos y un diccionario término → índice:
+
+- vectorizar: analizador de palabras equivalente al de ``TfidfVectorizer``
+  (minúsculas, acentos, ``token_pattern``, n-gramas) y conteo con un dict
+- TF-IDF: tf sublineal, idf y normalización, en el mismo orden que sklearn
+- predecir: un solo producto disperso contra ``log P(término | clase)``
+
+Las operaciones de punto flotante se hacen en el mismo orden que sklearn
+(sumas secuenciales por índice de término, el mismo ``logsumexp``), así que
+las categorías y probabilidades son idénticas bit a bit. Como ese orden es un
+detalle de implementación de sklearn/scipy, ``compile_pipeline`` compara el
+motor contra el pipeline antes de usarlo y, ante cualquier diferencia, lo
+descarta y se sigue usando sklearn.
+
+Solo aplica al modelo de vocabulario; el pipeline en línea (hashing) sigue
+pasando por sklearn.
+"""
+import logging
+import math
+import re
+import unicodedata
+from typing import Any, Dict, Iterable, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+import compact_model
+
+logger = logging.getLogger(__name__)
+
+# Fila TF-IDF de un documento: (índices de término ordenados, pesos)
+Row = Tuple[np.ndarray, np.ndarray]
+
+_EMPTY_COLUMNS = np.empty(0, dtype=np.intp)
+_EMPTY_VALUES = np.empty(0, dtype=np.float64)
+
+
+def _strip_accents_ascii(text: str) -> str:
+    return unicodedata.normalize('NFKD', text).encode('ASCII', errors='ignore').decode('ASCII')
+
+
+def _strip_accents_unicode(text: str) -> str:
+    try:
+        text.encode('ASCII', errors='strict')
+        return text
+    except UnicodeEncodeError:
+        normalized = unicodedata.normalize('NFKD', text)
+        return ''.join(c for c in normalized if not unicodedata.combining(c))
+
+
+_ACCENT_FUNCTIONS = {
+    None: None,
+    'ascii': _strip_accents_ascii,
+    'unicode': _strip_accents_unicode,
+}
+
+
+class InferenceEngine:
+    """
+    Modelo compilado: vocabulario, idf y parámetros de MultinomialNB como
+    arreglos numpy. No depende de sklearn.
+    """
+
+    def __init__(self, vocabulary: Dict[str, int], idf: Optional[np.ndarray],
+                 feature_log_prob: np.ndarray, class_log_prior: np.ndarray,
+                 classes: Sequence[str], params: Dict[str, Any]):
+        accents = params.get('strip_accents')
+        if (params.get('analyzer', 'word') != 'word' or accents not in _ACCENT_FUNCTIONS
+                or params.get('norm', 'l2') not in ('l1', 'l2', None)):
+            raise ValueError("Configuración del vectorizador no soportada por el motor")
+
+        self.vocabulary = vocabulary
+        self.classes = np.asarray(classes)
+        self.idf = np.array(idf, dtype=np.float64) if params.get('use_idf', True) else None
+        # Una fila por término: el producto disperso toma solo las filas del documento
+        self.weights = np.ascontiguousarray(np.asarray(feature_log_prob, dtype=np.float64).T)
+        self.class_log_prior = np.array(class_log_prior, dtype=np.float64)
+        # Copias propias y de solo lectura: con varios workers (prefork.py)
+        # sus páginas quedan compartidas con el proceso padre
+        for array in (self.idf, self.weights, self.class_log_prior):
+            if array is not None:
+                array.flags.writeable = False
+
+        self.lowercase = params.get('lowercase', True)
+        self.strip_accents = _ACCENT_FUNCTIONS[accents]
+        self.tokenize = re.compile(params.get('token_pattern') or r"(?u)\b\w\w+\b").findall
+        self.ngram_range = tuple(params.get('ngram_range', (1, 1)))
+        self.binary = params.get('binary', False)
+        self.sublinear_tf = params.get('sublinear_tf', False)
+        self.norm = params.get('norm', 'l2')
+
+    @classmethod
+    def from_pipeline(cls, model) -> "InferenceEngine":
+        """Compila un pipeline entrenado (TfidfVectorizer + MultinomialNB)"""
+        from sklearn.feature_extraction.text import TfidfVectorizer
+        from sklearn.naive_bayes import MultinomialNB
+
+        vectorizer = model.steps[0][1]
+        clf = model.steps[-1][1]
+        if type(vectorizer) is not TfidfVectorizer or type(clf) is not MultinomialNB:
+            raise ValueError("El motor solo compila pipelines TfidfVectorizer + MultinomialNB")
+
+        params = vectorizer.get_params()
+        if (params['preprocessor'] is not None or params['tokenizer'] is not None
+                or params['stop_words'] is not None or params['dtype'] is not np.float64):
+            raise ValueError("Configuración del vectorizador no soportada por el motor")
+
+        return cls(
+            {str(term): int(i) for term, i in vectorizer.vocabulary_.items()},
+            vectorizer.idf_ if params['use_idf'] else None,
+            clf.feature_log_prob_,
+            clf.class_log_prior_,
+            clf.classes_,
+            params,
+        )
+
+    @classmethod
+    def from_compact(cls, directory: str) -> "InferenceEngine":
+        """Compila un modelo en formato compacto sin importar sklearn"""
+        meta, arrays = compact_model.load_arrays(directory)
+        if meta["kind"] != "vocabulary":
+            raise ValueError("El motor solo compila modelos de vocabulario")
+
+        return cls(
+            {str(term): i for i, term in enumerate(arrays["terms"])},
+            arrays["idf"],
+            arrays["feature_log_prob"],
+            arrays["class_log_prior"],
+            meta["classes"],
+            meta["vectorizer"],
+        )
+
+    def analyze(self, text: str) -> List[str]:
+        """Términos del documento, igual que ``build_analyzer()`` de sklearn"""
+        if self.lowercase:
+            text = text.lower()
+        if self.strip_accents is not None:
+            text = self.strip_accents(text)
+
+        tokens = self.tokenize(text)
+        min_n, max_n = self.ngram_range
+        if max_n == 1:
+            return tokens
+
+        terms = list(tokens) if min_n == 1 else []
+        for n in range(max(min_n, 2), min(max_n, len(tokens)) + 1):
+            for i in range(len(tokens) - n + 1):
+                terms.append(" ".join(tokens[i:i + n]))
+        return terms
+
+    def transform(self, text: str) -> Row:
+        """Fila TF-IDF del documento, con los índices ordenados como en la CSR de sklearn"""
+        vocabulary = self.vocabulary
+        counts: Dict[int, int] = {}
+        for term in self.analyze(text):
+            index = vocabulary.get(term)
+            if index is not None:
+                counts[index] = counts.get(index, 0) + 1
+
+        if not counts:
+            return _EMPTY_COLUMNS, _EMPTY_VALUES
+
+        columns = np.fromiter(sorted(counts), dtype=np.intp, count=len(counts))
+        if self.binary:
+            values = np.ones(len(columns), dtype=np.float64)
+        else:
+            values = np.fromiter((counts[i] for i in columns.tolist()), dtype=np.float64, count=len(columns))
+
+        if self.sublinear_tf:
+            values = np.log(values)
+            values += 1
+        if self.idf is not None:
+            values *= self.idf[columns]
+
+        # Suma secuencial en orden de índice, como sparsefuncs_fast
+        if self.norm == 'l2':
+            total = float(np.cumsum(values * values)[-1])
+            if total != 0.0:
+                values /= math.sqrt(total)
+        elif self.norm == 'l1':
+            total = float(np.cumsum(np.abs(values))[-1])
+            if total != 0.0:
+                values /= total
+
+        return columns, values
+
+    def predict_log_proba(self, rows: Iterable[Row]) -> np.ndarray:
+        """Log-probabilidades por clase, forma (documentos, clases)"""
+        rows = list(rows)
+        jll = np.zeros((len(rows), len(self.class_log_prior)), dtype=np.float64)
+        for r, (columns, values) in enumerate(rows):
+            if len(columns):
+                # El producto de scipy acumula término por término: cumsum
+                # reproduce ese orden (np.sum suma por pares y redondea distinto)
+                jll[r] = np.cumsum(values[:, None] * self.weights[columns], axis=0)[-1]
+        jll += self.class_log_prior
+        return jll - self._logsumexp(jll)[:, None]
+
+    def predict_proba(self, rows: Iterable[Row]) -> np.ndarray:
+        """Probabilidades por clase, forma (documentos, clases)"""
+        return np.exp(self.predict_log_proba(rows))
+
+    @staticmethod
+    def _logsumexp(array: np.ndarray) -> np.ndarray:
+        """``sklearn.utils._array_api._logsumexp`` por filas, operación por operación"""
+        array_max = np.max(array, axis=1, keepdims=True)
+        index_max = array == array_max
+
+        array = array.copy()
+        array[index_max] = -np.inf
+        m = np.sum(index_max.astype(array.dtype), axis=1, keepdims=True, dtype=array.dtype)
+        shift = np.where(np.isfinite(array_max), array_max, 0)
+        exp = np.exp(array - shift)
+        s = np.sum(exp, axis=1, keepdims=True, dtype=exp.dtype)
+        s = np.where(s == 0, s, s / m)
+        out = np.log1p(s) + np.log(m) + array_max
+        return np.squeeze(out, axis=1)
+
+    def matches(self, model, texts: Sequence[str]) -> bool:
+        """True si el motor reproduce exactamente la salida del pipeline"""
+        vectorizer = model.steps[0][1]
+        clf = model.steps[-1][1]
+
+        features = vectorizer.transform(texts)
+        rows = [self.transform(text) for text in texts]
+        for r, (columns, values) in enumerate(rows):
+            start, end = features.indptr[r], features.indptr[r + 1]
+            if (not np.array_equal(features.indices[start:end], columns)
+                    or not np.array_equal(features.data[start:end], values)):
+                return False
+
+        expected = clf.predict_proba(features)
+        return (np.array_equal(expected, self.predict_proba(rows))
+                and np.array_equal(clf.classes_, self.classes))
+
+
+def compile_pipeline(model, check_texts: Sequence[str]) -> Optional[InferenceEngine]:
+    """
+    Compila el pipeline y lo verifica contra sklearn con ``check_texts``
+
+    Returns:
+        El motor, o None si el modelo no se puede compilar (p. ej. el pipeline
+        en línea) o si no reproduce exactamente los resultados de sklearn
+    """
+    try:
+        engine = InferenceEngine.from_pipeline(model)
+    except ValueError:
+        return None
+
+    if not engine.matches(model, list(check_texts)):
+        logger.warning("El motor NumPy no reproduce exactamente a sklearn; se usará el pipeline")
+        return None
+    return engine
@@ -0,0 +1,433 @@
+"""
+Trabajos de procesamiento masivo en segundo plano
+
+``POST /bulk-process`` procesa todo el lote dentro de una sola petición HTTP:
+si el cliente se desconecta o el proxy corta por timeout, se pierde el
+trabajo. Aquí el lote se guarda en disco, se registra en una base SQLite y
+lo procesan tareas worker del propio servidor; el cliente consulta el
+progreso con el id del trabajo. Los trabajos que quedaron a medias al
+detener el servidor se retoman al iniciar.
+"""
+import asyncio
+import json
+import logging
+import os
+import shutil
+import sqlite3
+import threading
+import uuid
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+# Base de datos de trabajos
+JOBS_DB_PATH = os.getenv("JOBS_DB_PATH", "jobs.db")
+
+# Directorio donde se guardan los archivos de cada trabajo hasta procesarlos
+JOBS_DIR = Path(os.getenv("JOBS_DIR", "temp_uploads/jobs"))
+
+# Archivos que se procesan a la vez entre todos los trabajos
+JOB_WORKERS = int(os.getenv("JOB_WORKERS", "0")) or (os.cpu_count() or 1)
+
+# Días que se conservan los trabajos terminados (0 = para siempre)
+JOB_RETENTION_DAYS = int(os.getenv("JOB_RETENTION_DAYS", "7"))
+
+# Firma del procesador: (ruta, nombre original, tipo MIME, opciones) -> resultado serializable
+Processor = Callable[[str, str, str, Dict[str, Any]], Awaitable[Dict[str, Any]]]
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    id TEXT PRIMARY KEY,
+    status TEXT NOT NULL,
+    total INTEGER NOT NULL,
+    processed INTEGER NOT NULL DEFAULT 0,
+    failed INTEGER NOT NULL DEFAULT 0,
+    created_at TEXT NOT NULL,
+    updated_at TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS job_files (
+    job_id TEXT NOT NULL REFERENCES jobs(id) ON DELETE CASCADE,
+    idx INTEGER NOT NULL,
+    filename TEXT NOT NULL,
+    mime_type TEXT NOT NULL,
+    path TEXT NOT NULL,
+    status TEXT NOT NULL,
+    result TEXT,
+    options TEXT,
+    worker INTEGER,
+    PRIMARY KEY (job_id, idx)
+);
+CREATE INDEX IF NOT EXISTS job_files_status ON job_files(status);
+"""
+
+
+def _now() -> str:
+    return datetime.now().isoformat(timespec="seconds")
+
+
+class JobStore:
+    """
+    Persistencia de trabajos en SQLite
+
+    Estados del trabajo: ``queued``, ``running``, ``completed``.
+    Estados de cada archivo: ``pending``, ``running``, ``done``, ``failed``.
+    """
+
+    def __init__(self, db_path: str = JOBS_DB_PATH):
+        self.db_path = db_path
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(db_path, check_same_thread=False)
+        self._conn.row_factory = sqlite3.Row
+        with self._lock, self._conn:
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute("PRAGMA foreign_keys=ON")
+            self._conn.executescript(_SCHEMA)
+            # Bases creadas antes de que existieran las opciones y el worker por archivo
+            columns = [row["name"] for row in self._conn.execute("PRAGMA table_info(job_files)")]
+            if "options" not in columns:
+                self._conn.execute("ALTER TABLE job_files ADD COLUMN options TEXT")
+            if "worker" not in columns:
+                self._conn.execute("ALTER TABLE job_files ADD COLUMN worker INTEGER")
+
+    def create_job(self, job_id: str, files: List[Tuple[str, str, str]],
+                   options: Optional[List[Dict[str, Any]]] = None, worker: Optional[int] = None):
+        """
+        Registra un trabajo nuevo
+
+        Args:
+            job_id: Identificador del trabajo
+            files: Lista de (nombre original, tipo MIME, ruta guardada)
+            options: Opciones del procesador para cada archivo (opcional)
+            worker: PID del proceso que tiene los archivos en su cola (opcional)
+        """
+        options = options or [{}] * len(files)
+        now = _now()
+        with self._lock, self._conn:
+            self._conn.execute(
+                "INSERT INTO jobs (id, status, total, created_at, updated_at) "
+                "VALUES (?, 'queued', ?, ?, ?)",
+                (job_id, len(files), now, now)
+            )
+            self._conn.executemany(
+                "INSERT INTO job_files (job_id, idx, filename, mime_type, path, status, options, worker) "
+                "VALUES (?, ?, ?, ?, ?, 'pending', ?, ?)",
+                [
+                    (job_id, idx, filename, mime_type, path,
+                     json.dumps(file_options, ensure_ascii=False) if file_options else None, worker)
+                    for idx, ((filename, mime_type, path), file_options)
+                    in enumerate(zip(files, options))
+                ]
+            )
+
+    def get_job(self, job_id: str, include_results: bool = True) -> Optional[Dict[str, Any]]:
+        """Devuelve el trabajo con el estado de sus archivos, o None si no existe"""
+        with self._lock:
+            job = self._conn.execute(
+                "SELECT * FROM jobs WHERE id = ?", (job_id,)
+            ).fetchone()
+            if job is None:
+                return None
+            files = self._conn.execute(
+                "SELECT idx, filename, status, result FROM job_files "
+                "WHERE job_id = ? ORDER BY idx",
+                (job_id,)
+            ).fetchall()
+
+        return {
+            "job_id": job["id"],
+            "status": job["status"],
+            "total": job["total"],
+            "processed": job["processed"],
+            "failed": job["failed"],
+            "created_at": job["created_at"],
+            "updated_at": job["updated_at"],
+            "files": [
+                {
+                    "index": row["idx"],
+                    "filename": row["filename"],
+                    "status": row["status"],
+                    "result": (
+                        json.loads(row["result"])
+                        if include_results and row["result"] else None
+                    ),
+                }
+                for row in files
+            ],
+        }
+
+    def get_results(self, job_id: str, indices: List[int]) -> Dict[int, Dict[str, Any]]:
+        """Resultados de los archivos indicados que ya terminaron"""
+        if not indices:
+            return {}
+        placeholders = ",".join("?" * len(indices))
+        with self._lock:
+            rows = self._conn.execute(
+                f"SELECT idx, result FROM job_files WHERE job_id = ? "
+                f"AND idx IN ({placeholders}) AND result IS NOT NULL",
+                (job_id, *indices)
+            ).fetchall()
+        return {row["idx"]: json.loads(row["result"]) for row in rows}
+
+    def start_file(self, job_id: str, idx: int):
+        now = _now()
+        with self._lock, self._conn:
+            self._conn.execute(
+                "UPDATE job_files SET status = 'running' WHERE job_id = ? AND idx = ?",
+                (job_id, idx)
+            )
+            self._conn.execute(
+                "UPDATE jobs SET status = 'running', updated_at = ? "
+                "WHERE id = ? AND status = 'queued'",
+                (now, job_id)
+            )
+
+    def finish_file(self, job_id: str, idx: int, success: bool, result: Dict[str, Any]) -> str:
+        """
+        Guarda el resultado de un archivo y cierra el trabajo si era el último
+
+        Returns:
+            Estado del trabajo después de la actualización
+        """
+        now = _now()
+        column = "processed" if success else "failed"
+        with self._lock, self._conn:
+            self._conn.execute(
+                "UPDATE job_files SET status = ?, result = ? WHERE job_id = ? AND idx = ?",
+                ("done" if success else "failed", json.dumps(result, ensure_ascii=False),
+                 job_id, idx)
+            )
+            self._conn.execute(
+                f"UPDATE jobs SET {column} = {column} + 1, updated_at = ?, "
+                "status = CASE WHEN processed + failed + 1 >= total "
+                "THEN 'completed' ELSE status END "
+                "WHERE id = ?",
+                (now, job_id)
+            )
+            return self._conn.execute(
+                "SELECT status FROM jobs WHERE id = ?", (job_id,)
+            ).fetchone()["status"]
+
+    def pending_files(self, worker: Optional[int] = None) -> List[Tuple[str, int, str, str, str, Dict[str, Any]]]:
+        """
+        Archivos sin terminar, en orden de llegada. Los que estaban ``running``
+        al detenerse el servidor vuelven a ``pending``.
+
+        Args:
+            worker: Solo los archivos en la cola de ese proceso (None = todos)
+        """
+        by_worker = worker is not None
+        params = (worker,) if by_worker else ()
+        with self._lock, self._conn:
+            self._conn.execute(
+                "UPDATE job_files SET status = 'pending' WHERE status = 'running'"
+                + (" AND worker = ?" if by_worker else ""),
+                params
+            )
+            rows = self._conn.execute(
+                "SELECT f.job_id, f.idx, f.path, f.filename, f.mime_type, f.options "
+                "FROM job_files f JOIN jobs j ON j.id = f.job_id "
+                "WHERE f.status = 'pending'" + (" AND f.worker = ?" if by_worker else "")
+                + " ORDER BY j.created_at, f.job_id, f.idx",
+                params
+            ).fetchall()
+        return [
+            (*tuple(row)[:5], json.loads(row["options"]) if row["options"] else {})
+            for row in rows
+        ]
+
+    def assign_files(self, files: List[Tuple[str, int]], worker: int):
+        """Registra que los archivos ``(job_id, idx)`` están en la cola de ``worker``"""
+        with self._lock, self._conn:
+            self._conn.executemany(
+                "UPDATE job_files SET worker = ? WHERE job_id = ? AND idx = ?",
+                [(worker, job_id, idx) for job_id, idx in files]
+            )
+
+    def purge_finished(self, older_than_days: int) -> List[str]:
+        """Borra los trabajos terminados hace más de ``older_than_days`` días"""
+        cutoff = datetime.fromtimestamp(
+            datetime.now().timestamp() - older_than_days * 86400
+        ).isoformat(timespec="seconds")
+        with self._lock, self._conn:
+            ids = [
+                row["id"] for row in self._conn.execute(
+                    "SELECT id FROM jobs WHERE status = 'completed' AND updated_at < ?",
+                    (cutoff,)
+                )
+            ]
+            self._conn.executemany("DELETE FROM jobs WHERE id = ?", [(i,) for i in ids])
+        return ids
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+
+class JobManager:
+    """
+    Cola de trabajos atendida por ``JOB_WORKERS`` tareas del event loop
+
+    Cada tarea toma un archivo, llama al procesador (que a su vez despacha la
+    extracción al pool de ``extraction_executor``) y guarda el resultado.
+    """
+
+    def __init__(self, store: Optional[JobStore] = None, workers: int = JOB_WORKERS,
+                 jobs_dir: Path = JOBS_DIR):
+        self._store = store
+        self.workers = workers
+        self.jobs_dir = jobs_dir
+        self._queue: Optional[asyncio.Queue] = None
+        self._tasks: List[asyncio.Task] = []
+        self._processor: Optional[Processor] = None
+        self._changed: Optional[asyncio.Condition] = None
+        self._active = 0
+        # Archivos a retomar ya recuperados por otro proceso (ver prefork.py);
+        # None = recuperarlos al iniciar
+        self.recovered: Optional[List[Tuple[str, int, str, str, str, Dict[str, Any]]]] = None
+
+    @property
+    def store(self) -> JobStore:
+        # La base se abre en el primer uso para no crearla al importar
+        if self._store is None:
+            self._store = JobStore()
+        return self._store
+
+    async def start(self, processor: Processor):
+        """
+        Arranca los workers y vuelve a encolar los archivos pendientes
+
+        Args:
+            processor: Corrutina que recibe (ruta, nombre, tipo MIME, opciones),
+                procesa el archivo y devuelve un diccionario con al menos la
+                clave ``success``
+        """
+        self._processor = processor
+        self._queue = asyncio.Queue()
+        self._changed = asyncio.Condition()
+        self.jobs_dir.mkdir(parents=True, exist_ok=True)
+
+        if self.recovered is None:
+            pending = await asyncio.to_thread(self.recover)
+        else:
+            pending, self.recovered = self.recovered, []
+        for item in pending:
+            self._queue.put_nowait(item)
+        if pending:
+            await asyncio.to_thread(
+                self.store.assign_files, [(job_id, idx) for job_id, idx, *_ in pending], os.getpid()
+            )
+            logger.info(f"Se retoman {len(pending)} archivos de trabajos sin terminar")
+
+        self._tasks = [
+            asyncio.create_task(self._worker(), name=f"job-worker-{i}")
+            for i in range(self.workers)
+        ]
+
+    def recover(self) -> List[Tuple[str, int, str, str, str, Dict[str, Any]]]:
+        """
+        Borra los trabajos vencidos y devuelve los archivos sin terminar. Con
+        varios workers lo llama una sola vez el proceso padre: si cada worker
+        lo hiciera al iniciar, devolvería a ``pending`` lo que otro tiene en curso.
+        """
+        if JOB_RETENTION_DAYS > 0:
+            for job_id in self.store.purge_finished(JOB_RETENTION_DAYS):
+                shutil.rmtree(self.jobs_dir / job_id, ignore_errors=True)
+        return self.store.pending_files()
+
+    def recover_worker(self, pid: int) -> List[Tuple[str, int, str, str, str, Dict[str, Any]]]:
+        """
+        Archivos sin terminar que estaban en la cola del worker ``pid``. El
+        proceso padre lo llama cuando un worker termina con error: su cola en
+        memoria se perdió, pero los demás workers siguen con la suya.
+        """
+        return self.store.pending_files(worker=pid)
+
+    def idle(self) -> bool:
+        """True si no hay archivos encolados ni en proceso"""
+        return self._queue is None or (self._queue.empty() and self._active == 0)
+
+    def close_store(self):
+        """Cierra la conexión a la base; se vuelve a abrir en el próximo uso"""
+        if self._store is not None:
+            self._store.close()
+            self._store = None
+
+    async def stop(self):
+        """Cancela los workers; lo que estaba en curso se retoma al reiniciar"""
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+    def job_dir(self, job_id: str) -> Path:
+        return self.jobs_dir / job_id
+
+    def new_job_id(self) -> str:
+        job_id = uuid.uuid4().hex
+        self.job_dir(job_id).mkdir(parents=True, exist_ok=True)
+        return job_id
+
+    async def submit(self, job_id: str, files: List[Tuple[str, str, str]],
+                     options: Optional[List[Dict[str, Any]]] = None):
+        """
+        Registra un trabajo cuyos archivos ya están en ``job_dir(job_id)`` y
+        los encola
+
+        Args:
+            job_id: Id obtenido con ``new_job_id``
+            files: Lista de (nombre original, tipo MIME, ruta guardada)
+            options: Opciones que recibe el procesador para cada archivo
+        """
+        if self._queue is None:
+            raise RuntimeError("El gestor de trabajos no está iniciado")
+
+        options = options or [{}] * len(files)
+        await asyncio.to_thread(self.store.create_job, job_id, files, options, os.getpid())
+        for idx, ((filename, mime_type, path), file_options) in enumerate(zip(files, options)):
+            self._queue.put_nowait((job_id, idx, path, filename, mime_type, file_options))
+
+    async def get(self, job_id: str, include_results: bool = True) -> Optional[Dict[str, Any]]:
+        return await asyncio.to_thread(self.store.get_job, job_id, include_results)
+
+    async def results(self, job_id: str, indices: List[int]) -> Dict[int, Dict[str, Any]]:
+        return await asyncio.to_thread(self.store.get_results, job_id, indices)
+
+    async def wait_for_change(self, timeout: float):
+        """Espera a que termine algún archivo (o a que venza ``timeout``)"""
+        async with self._changed:
+            try:
+                await asyncio.wait_for(self._changed.wait(), timeout)
+            except asyncio.TimeoutError:
+                pass
+
+    async def _worker(self):
+        while True:
+            job_id, idx, path, filename, mime_type, options = await self._queue.get()
+            self._active += 1
+            try:
+                await asyncio.to_thread(self.store.start_file, job_id, idx)
+                try:
+                    result = await self._processor(path, filename, mime_type, options)
+                except Exception as e:
+                    logger.exception(f"Error procesando {filename} del trabajo {job_id}")
+                    result = {"filename": filename, "success": False, "error": str(e)}
+
+                status = await asyncio.to_thread(
+                    self.store.finish_file, job_id, idx, bool(result.get("success")), result
+                )
+                if os.path.exists(path):
+                    os.remove(path)
+                if status == "completed":
+                    shutil.rmtree(self.job_dir(job_id), ignore_errors=True)
+
+                async with self._changed:
+                    self._changed.notify_all()
+            finally:
+                self._active -= 1
+                self._queue.task_done()
+
+
+# Singleton
+job_manager = JobManager()
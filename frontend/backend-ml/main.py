@@ -2,17 +2,27 @@
 API FastAPI para procesamiento de documentos con OCR y clasificación ML
 Versión Completa: Con OCR de imágenes usando Tesseract
 """
-from fastapi import FastAPI, UploadFile, File, HTTPException
+from fastapi import FastAPI, UploadFile, File, HTTPException, Query, Request
+from fastapi.concurrency import run_in_threadpool
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import JSONResponse, Response, StreamingResponse
 from pydantic import BaseModel
-from typing import List, Optional, Dict
+from typing import AsyncIterator, List, Optional, Dict, Tuple
+import asyncio
+import json
 import os
+import threading
 import shutil
-from pathlib import Path
-import uuid
 
-from ocr_service import ocr_service
-from classifier_service import classifier
+import admission
+import archives
+import metrics
+import profiling
+from extraction_executor import MAX_INFLIGHT, ExtractionUnavailable, extraction_executor
+from ocr_service import Source, document_confidence, ocr_cache, ocr_service
+from uploads import UploadLimitMiddleware, save_upload, upload_source, upload_stats
+from classifier_service import DocumentClassifier, get_classifier, classifier_loaded
+from jobs import job_manager
 
 app = FastAPI(
     title="EDMS ML API",
@@ -20,6 +30,19 @@ app = FastAPI(
     version="1.0.0"
 )
 
+# Control de admisión de los endpoints con OCR (ver admission.py); se agrega
+# antes que CORS para quedar dentro y que los 429/503 lleven sus cabeceras
+if admission.ADMISSION_ENABLED:
+    app.add_middleware(admission.AdmissionMiddleware)
+
+# Rechazo por Content-Length de /ocr, /process y /bulk-process-archive antes
+# de leer el cuerpo; va fuera de la admisión para que un archivo demasiado
+# grande no ocupe lugar en la cola
+app.add_middleware(UploadLimitMiddleware)
+app.add_middleware(
+    UploadLimitMiddleware, paths=("/bulk-process-archive",), max_bytes=archives.ARCHIVE_MAX_BYTES
+)
+
 # Configurar CORS
 app.add_middleware(
     CORSMiddleware,
@@ -29,14 +52,90 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
-# Directorio temporal para archivos
-UPLOAD_DIR = Path("temp_uploads")
-UPLOAD_DIR.mkdir(exist_ok=True)
+# Perfilado bajo demanda de peticiones (ver profiling.py); desactivado no se
+# instala y no agrega costo
+if profiling.PROFILING_ENABLED:
+    app.add_middleware(profiling.ProfilingMiddleware)
+    app.include_router(profiling.router)
+
+# Métricas por endpoint y cabecera Server-Timing (ver metrics.py); se agrega
+# último para que sea el middleware externo y mida la petición completa
+app.add_middleware(metrics.MetricsMiddleware)
+
+
+@app.exception_handler(ExtractionUnavailable)
+async def extraction_unavailable(request: Request, exc: ExtractionUnavailable):
+    """El pool de extracción se está recreando: el cliente puede reintentar"""
+    return JSONResponse(status_code=503, content={"detail": str(exc)}, headers={"Retry-After": "1"})
+
+
+# Máximo de textos aceptados por llamada a /classify-batch
+MAX_CLASSIFY_BATCH = int(os.getenv("MAX_CLASSIFY_BATCH", "10000"))
+
+# Archivos de /bulk-process en proceso a la vez (0 = OCR_MAX_INFLIGHT). Acota la
+# memoria: el siguiente archivo no se lee hasta que haya lugar
+BULK_CONCURRENCY = int(os.getenv("BULK_CONCURRENCY", "0")) or MAX_INFLIGHT
+
+
+# Páginas con las que /process clasifica un PDF antes de extraer el resto
+# (0 = siempre el documento completo; se puede pedir por llamada con first_pages)
+PROCESS_FIRST_PAGES = int(os.getenv("PROCESS_FIRST_PAGES", "0"))
+
+
+# Cargar el modelo en segundo plano al iniciar; el servidor acepta peticiones
+# (por ejemplo /ocr) sin esperar a sklearn
+PRELOAD_MODEL = os.getenv("PRELOAD_MODEL", "true").lower() in ("1", "true", "yes")
+
+
+async def load_classifier() -> DocumentClassifier:
+    """
+    Devuelve el clasificador. La primera carga (importar sklearn y abrir el
+    modelo) corre en un hilo para no bloquear el event loop.
+    """
+    if classifier_loaded():
+        return get_classifier()
+    with metrics.stage("model_wait"):
+        return await run_in_threadpool(get_classifier)
+
+
+@app.on_event("startup")
+def preload_classifier():
+    """Empieza a cargar el clasificador sin demorar el arranque"""
+    if PRELOAD_MODEL:
+        threading.Thread(target=get_classifier, name="preload-model", daemon=True).start()
+
+
+@app.on_event("startup")
+async def start_jobs():
+    """Arranca los workers de trabajos y retoma los que quedaron a medias"""
+    await job_manager.start(_process_job_file)
+
+
+@app.on_event("shutdown")
+async def stop_jobs():
+    await job_manager.stop()
+
+
+@app.on_event("shutdown")
+def shutdown_executor():
+    """Libera el pool de extracción al detener el servidor"""
+    extraction_executor.shutdown()
 
 
 # Modelos Pydantic
+class PageInfo(BaseModel):
+    page: int
+    method: str
+    seconds: float
+    confidence: Optional[float] = None
+    dpi: Optional[int] = None
+
+
 class OCRResponse(BaseModel):
     text: str
+    pages: List[PageInfo] = []
+    ocr_confidence: Optional[int] = None
+    cached: bool = False
     success: bool = True
     message: str = "Texto extraído exitosamente"
 
@@ -54,6 +153,23 @@ class ClassificationResponse(BaseModel):
     message: str = "Documento clasificado exitosamente"
 
 
+class BatchClassificationRequest(BaseModel):
+    texts: List[str]
+
+
+class BatchClassificationItem(BaseModel):
+    category: str
+    confidence: float
+    all_probabilities: Dict[str, float]
+
+
+class BatchClassificationResponse(BaseModel):
+    total: int
+    results: List[BatchClassificationItem]
+    success: bool = True
+    message: str = "Lote clasificado exitosamente"
+
+
 class ProcessedDocument(BaseModel):
     filename: str
     text: Optional[str] = None
@@ -63,6 +179,12 @@ class ProcessedDocument(BaseModel):
     confidence: Optional[float] = None
     all_probabilities: Optional[Dict[str, float]] = None
     keywords: Optional[List[str]] = None
+    pages: Optional[List[PageInfo]] = None
+    page_count: Optional[int] = None
+    ocr_confidence: Optional[int] = None
+    cached: bool = False
+    partial: bool = False
+    remaining_job_id: Optional[str] = None
     success: bool = True
     error: Optional[str] = None
 
@@ -74,6 +196,30 @@ class BulkProcessResult(BaseModel):
     results: List[ProcessedDocument]
 
 
+class JobSubmitResponse(BaseModel):
+    job_id: str
+    status: str
+    total: int
+
+
+class JobFile(BaseModel):
+    index: int
+    filename: str
+    status: str
+    result: Optional[ProcessedDocument] = None
+
+
+class JobStatusResponse(BaseModel):
+    job_id: str
+    status: str
+    total: int
+    processed: int
+    failed: int
+    created_at: str
+    updated_at: str
+    files: List[JobFile]
+
+
 class TrainingRequest(BaseModel):
     texts: List[str]
     labels: List[str]
@@ -83,6 +229,31 @@ class TrainingResponse(BaseModel):
     success: bool
     message: str
     trained_samples: int
+    model_version: Optional[str] = None
+
+
+class ModelVersion(BaseModel):
+    version: str
+    file: Optional[str]
+    created_at: str
+    source: str
+    kind: str
+
+
+class ModelInfoResponse(BaseModel):
+    active: Optional[str]
+    loaded: Optional[str]
+    versions: List[ModelVersion]
+
+
+class ModelReloadRequest(BaseModel):
+    version: Optional[str] = None
+
+
+class ModelReloadResponse(BaseModel):
+    success: bool
+    message: str
+    model_version: str
 
 
 # Rutas
@@ -99,9 +270,19 @@ async def root():
             "GET /": "Esta información",
             "POST /ocr": "Extraer texto de archivo (solo TXT y PDF)",
             "POST /classify": "Clasificar texto en categorías",
+            "POST /classify-batch": "Clasificar un lote de textos en una sola pasada",
             "POST /process": "Procesar archivo completo (extracción + clasificación)",
             "POST /bulk-process": "Procesar múltiples archivos",
-            "POST /train": "Entrenar el clasificador con nuevos datos"
+            "POST /bulk-process-archive": "Procesar un lote enviado como ZIP o tar",
+            "POST /jobs": "Encolar un procesamiento masivo en segundo plano",
+            "GET /jobs/{job_id}": "Progreso y resultados de un trabajo",
+            "GET /jobs/{job_id}/events": "Progreso de un trabajo en streaming (NDJSON)",
+            "POST /train": "Entrenar el clasificador con nuevos datos",
+            "GET /model": "Versiones del modelo disponibles y activa",
+            "POST /model/reload": "Activar una versión del modelo sin reiniciar",
+            "GET /stats": "Contadores de uploads y cachés",
+            "GET /metrics": "Métricas en formato de Prometheus",
+            "GET /profiles": "Perfiles de peticiones guardados (con PROFILING_ENABLED)"
         },
         "docs": "/docs"
     }
@@ -117,37 +298,30 @@ async def extract_text(file: UploadFile = File(...)):
     - PDFs (con o sin texto)
     - Archivos de texto
     """
-    temp_path = None
-    try:
-        # Guardar archivo temporal
-        file_ext = os.path.splitext(file.filename)[1]
-        temp_path = UPLOAD_DIR / f"{uuid.uuid4()}{file_ext}"
-        
-        with open(temp_path, "wb") as buffer:
-            shutil.copyfileobj(file.file, buffer)
-        
-        # Determinar tipo MIME
-        mime_type = file.content_type or "application/octet-stream"
-        
+    # Determinar tipo MIME
+    mime_type = file.content_type or "application/octet-stream"
+    
+    async with upload_source(file) as source:
         # Extraer texto
         try:
-            text = ocr_service.extract_text_from_file(str(temp_path), mime_type)
+            extraction = await extraction_executor.extract(source, mime_type)
+            text = extraction["text"]
             
             return OCRResponse(
                 text=text,
+                pages=extraction["pages"],
+                ocr_confidence=extraction["ocr_confidence"],
+                cached=extraction["cached"],
                 success=True,
                 message=f"Texto extraído exitosamente de {file.filename}"
             )
+        except ExtractionUnavailable:
+            raise
         except Exception as e:
             raise HTTPException(
                 status_code=400,
                 detail=f"Error al extraer texto: {str(e)}"
             )
-    
-    finally:
-        # Limpiar archivo temporal
-        if temp_path and os.path.exists(temp_path):
-            os.remove(temp_path)
 
 
 @app.post("/classify", response_model=ClassificationResponse)
@@ -164,8 +338,8 @@ async def classify_text(request: ClassificationRequest):
     - Otro
     """
     try:
-        category, confidence, all_probs = classifier.classify_document(request.text)
-        keywords = classifier.extract_keywords(request.text)
+        classifier = await load_classifier()
+        category, confidence, all_probs, keywords = classifier.analyze_document(request.text)
         
         return ClassificationResponse(
             category=category,
@@ -183,167 +357,516 @@ async def classify_text(request: ClassificationRequest):
         )
 
 
+@app.post("/classify-batch", response_model=BatchClassificationResponse)
+async def classify_batch(request: BatchClassificationRequest):
+    """
+    Clasifica un lote de textos en una sola pasada.
+    
+    Todo el lote se vectoriza y se predice de una vez, por lo que el costo
+    por documento baja a medida que crece el tamaño del lote.
+    """
+    if len(request.texts) > MAX_CLASSIFY_BATCH:
+        raise HTTPException(
+            status_code=400,
+            detail=f"El lote excede el máximo de {MAX_CLASSIFY_BATCH} textos"
+        )
+    
+    try:
+        classifier = await load_classifier()
+        # Un lote grande tarda lo suficiente como para bloquear el event loop
+        predictions = await run_in_threadpool(classifier.classify_documents, request.texts)
+        
+        return BatchClassificationResponse(
+            total=len(predictions),
+            results=[
+                BatchClassificationItem(
+                    category=category,
+                    confidence=confidence,
+                    all_probabilities=all_probs
+                )
+                for category, confidence, all_probs in predictions
+            ],
+            success=True,
+            message=f"{len(predictions)} documentos clasificados exitosamente"
+        )
+    
+    except Exception as e:
+        raise HTTPException(
+            status_code=500,
+            detail=f"Error al clasificar lote: {str(e)}"
+        )
+
+
+async def process_source(source: Source, filename: str, mime_type: str,
+                         include_text: bool = True, first_page: int = 1,
+                         last_page: Optional[int] = None,
+                         prefix: Optional[Dict] = None) -> ProcessedDocument:
+    """
+    Extrae y clasifica un archivo. Los errores se devuelven en el resultado
+    (``success=False``) en lugar de lanzarse, salvo ``ExtractionUnavailable``
+    (pool de extracción caído), que la API responde con 503.
+    
+    Args:
+        source: Ruta al archivo o su contenido en bytes
+        filename: Nombre original del archivo
+        mime_type: Tipo MIME del archivo
+        include_text: Incluir el texto completo en la respuesta
+        first_page: Primera página a extraer (solo PDFs)
+        last_page: Última página a extraer (solo PDFs; por defecto la última)
+        prefix: Texto (``text``) y páginas (``pages``) ya extraídos de las
+            páginas anteriores a ``first_page``; se anteponen antes de clasificar
+    """
+    # Extraer texto
+    try:
+        extraction = await extraction_executor.extract(source, mime_type, first_page, last_page)
+        text = extraction["text"]
+        pages = extraction["pages"]
+        ocr_confidence = extraction["ocr_confidence"]
+        if prefix:
+            text = "\n".join(part for part in (prefix["text"], text) if part)
+            pages = prefix["pages"] + pages
+            ocr_confidence = document_confidence(pages)
+    except ExtractionUnavailable:
+        raise
+    except Exception as e:
+        return ProcessedDocument(
+            filename=filename,
+            success=False,
+            error=f"Error al extraer texto: {str(e)}"
+        )
+    
+    if not text.strip():
+        return ProcessedDocument(
+            filename=filename,
+            text="",
+            full_text_length=0,
+            success=False,
+            error="No se pudo extraer texto del archivo"
+        )
+    
+    # Clasificar
+    try:
+        classifier = await load_classifier()
+        category, confidence, all_probs, keywords = classifier.analyze_document(text)
+        
+        # Crear preview del texto (primeros 200 caracteres)
+        text_preview = text[:200] + "..." if len(text) > 200 else text
+        
+        return ProcessedDocument(
+            filename=filename,
+            text=text if include_text else None,
+            text_preview=text_preview,
+            full_text_length=len(text),
+            category=category,
+            confidence=confidence,
+            all_probabilities=all_probs,
+            keywords=keywords,
+            pages=pages,
+            page_count=extraction.get("page_count"),
+            ocr_confidence=ocr_confidence,
+            cached=extraction["cached"],
+            success=True
+        )
+    
+    except Exception as e:
+        return ProcessedDocument(
+            filename=filename,
+            text=text if include_text else None,
+            text_preview=text[:200],
+            full_text_length=len(text),
+            success=False,
+            error=f"Error al clasificar: {str(e)}"
+        )
+
+
 @app.post("/process", response_model=ProcessedDocument)
-async def process_document(file: UploadFile = File(...)):
+async def process_document(
+    file: UploadFile = File(...),
+    first_pages: int = Query(PROCESS_FIRST_PAGES, ge=0)
+):
     """
     Procesa un documento completo: extrae texto y lo clasifica.
     
     Este endpoint combina OCR + Clasificación en una sola llamada.
+    
+    Con `first_pages=N` (PDFs de más de N páginas) clasifica con las
+    primeras N páginas y responde de inmediato con `partial=true`. El resto
+    se extrae en segundo plano como un trabajo: el documento completo,
+    reclasificado con todo el texto, se obtiene con
+    `GET /jobs/{remaining_job_id}`.
     """
-    temp_path = None
+    # Determinar tipo MIME
+    mime_type = file.content_type or "application/octet-stream"
+    
+    if first_pages > 0 and mime_type == 'application/pdf':
+        return await _process_first_pages(file, mime_type, first_pages)
+    
+    async with upload_source(file) as source:
+        return await process_source(source, file.filename, mime_type)
+
+
+async def _process_first_pages(file: UploadFile, mime_type: str,
+                               first_pages: int) -> ProcessedDocument:
+    """
+    Clasifica con las primeras páginas y encola la extracción del resto. El
+    archivo se guarda en el directorio del trabajo porque el resto de las
+    páginas se lee de ahí, incluso si el servidor se reinicia.
+    """
+    job_id = job_manager.new_job_id()
+    path = job_manager.job_dir(job_id) / f"0{os.path.splitext(file.filename)[1]}"
+    
     try:
-        # Guardar archivo temporal
-        file_ext = os.path.splitext(file.filename)[1]
-        temp_path = UPLOAD_DIR / f"{uuid.uuid4()}{file_ext}"
-        
-        with open(temp_path, "wb") as buffer:
-            shutil.copyfileobj(file.file, buffer)
+        await save_upload(file, path)
+    except HTTPException:
+        shutil.rmtree(job_manager.job_dir(job_id), ignore_errors=True)
+        raise
+    
+    try:
+        result = await process_source(str(path), file.filename, mime_type, last_page=first_pages)
         
-        # Determinar tipo MIME
-        mime_type = file.content_type or "application/octet-stream"
+        if not result.success or (result.page_count or 0) <= first_pages:
+            # El documento entra completo en las primeras páginas, o estas no
+            # tenían texto: se procesa (o se devuelve) en esta misma llamada
+            if not result.success:
+                result = await process_source(str(path), file.filename, mime_type)
+            shutil.rmtree(job_manager.job_dir(job_id), ignore_errors=True)
+            return result
+    except ExtractionUnavailable:
+        shutil.rmtree(job_manager.job_dir(job_id), ignore_errors=True)
+        raise
+    
+    await job_manager.submit(
+        job_id,
+        [(file.filename, mime_type, str(path))],
+        [{
+            "first_page": first_pages + 1,
+            "prefix": {
+                "text": result.text,
+                "pages": [page.model_dump() for page in result.pages]
+            }
+        }]
+    )
+    
+    result.partial = True
+    result.remaining_job_id = job_id
+    return result
+
+
+async def _bulk_process_file(file: UploadFile) -> ProcessedDocument:
+    """Procesa un archivo del lote; los errores se devuelven en el resultado"""
+    # Determinar tipo MIME
+    mime_type = file.content_type or "application/octet-stream"
+    
+    try:
+        async with upload_source(file) as source:
+            return await process_source(source, file.filename, mime_type, include_text=False)
+    except HTTPException as e:
+        # Archivo demasiado grande o de otro tipo: falla solo ese archivo
+        return ProcessedDocument(filename=file.filename, success=False, error=e.detail)
+    except ExtractionUnavailable as e:
+        return ProcessedDocument(filename=file.filename, success=False, error=str(e))
+
+
+@app.post("/bulk-process", response_model=BulkProcessResult)
+async def bulk_process_documents(
+    request: Request,
+    files: List[UploadFile] = File(...),
+    stream: bool = Query(False)
+):
+    """
+    Procesa múltiples documentos en lote.
+    
+    Las extracciones se ejecutan en paralelo en el pool de extracción, con a
+    lo sumo BULK_CONCURRENCY archivos en curso. Retorna resultados para cada
+    archivo, incluyendo éxitos y fallos, en el mismo orden en que se enviaron.
+    
+    Con `stream=true` (o `Accept: application/x-ndjson`) responde JSON por
+    líneas: un resultado por archivo apenas termina, en orden de llegada, y
+    una línea de resumen al final.
+    """
+    if stream or "application/x-ndjson" in request.headers.get("accept", ""):
+        return StreamingResponse(
+            _ndjson_lines(_bulk_process_stream(files)),
+            media_type="application/x-ndjson"
+        )
+    
+    results: List[Optional[ProcessedDocument]] = [None] * len(files)
+    async for index, result in _bulk_process_stream(files):
+        results[index] = result
+    processed_count = sum(1 for result in results if result.success)
+    
+    return BulkProcessResult(
+        total_files=len(files),
+        processed=processed_count,
+        failed=len(results) - processed_count,
+        results=results
+    )
+
+
+async def _bulk_process_stream(files: List[UploadFile]):
+    """
+    Procesa los archivos con a lo sumo BULK_CONCURRENCY en curso y los
+    entrega como (índice, resultado) a medida que terminan. Un archivo no se
+    lee hasta que haya lugar: el semáforo de OCR limita la CPU, pero no lo que
+    cada archivo ya cargó en memoria mientras espera
+    """
+    async def process_indexed(index: int, file: UploadFile):
+        return index, await _bulk_process_file(file)
+    
+    pending = set()
+    try:
+        for index, file in enumerate(files):
+            while len(pending) >= BULK_CONCURRENCY:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    yield task.result()
+            pending.add(asyncio.ensure_future(process_indexed(index, file)))
         
-        # Extraer texto
+        for next_done in asyncio.as_completed(pending):
+            yield await next_done
+    finally:
+        # Si el cliente se desconecta, no seguir procesando el resto del lote
+        for task in pending:
+            task.cancel()
+
+
+async def _ndjson_lines(results: AsyncIterator[Tuple[int, ProcessedDocument]]):
+    """
+    Genera una línea JSON por resultado y una línea de resumen al final. Los
+    resultados no se acumulan: solo se cuentan para el resumen.
+    """
+    total = processed_count = 0
+    try:
+        async for index, result in results:
+            total += 1
+            processed_count += result.success
+            line = {"type": "file", "index": index, **result.model_dump()}
+            yield json.dumps(line, ensure_ascii=False) + "\n"
+    except ValueError as e:
+        # Por ejemplo, un archivo comprimido con demasiadas entradas: el
+        # estado HTTP ya se envió, así que el error va en el stream
+        yield json.dumps({"type": "error", "detail": str(e)}, ensure_ascii=False) + "\n"
+    finally:
+        await results.aclose()
+    
+    summary = {
+        "type": "summary",
+        "total_files": total,
+        "processed": processed_count,
+        "failed": total - processed_count,
+    }
+    yield json.dumps(summary) + "\n"
+
+
+async def _archive_process_stream(archive: UploadFile):
+    """
+    Lee las entradas del archivo comprimido de a una y las procesa con a lo
+    sumo ARCHIVE_CONCURRENCY en curso; entrega (índice, resultado) a medida
+    que terminan
+    """
+    entries = archives.iter_entries(archive.file)
+    
+    async def process_entry(index: int, entry: archives.ArchiveEntry):
         try:
-            text = ocr_service.extract_text_from_file(str(temp_path), mime_type)
-        except Exception as e:
-            return ProcessedDocument(
-                filename=file.filename,
-                success=False,
-                error=f"Error al extraer texto: {str(e)}"
+            if entry.error:
+                return index, ProcessedDocument(filename=entry.name, success=False, error=entry.error)
+            return index, await process_source(
+                entry.source, entry.name, entry.mime_type, include_text=False
             )
+        except ExtractionUnavailable as e:
+            return index, ProcessedDocument(filename=entry.name, success=False, error=str(e))
+        finally:
+            entry.cleanup()
+    
+    pending = set()
+    index = 0
+    try:
+        while True:
+            # No se lee la siguiente entrada hasta que haya lugar
+            while len(pending) >= archives.ARCHIVE_CONCURRENCY:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    yield task.result()
+            
+            entry = await run_in_threadpool(next, entries, None)
+            if entry is None:
+                break
+            pending.add(asyncio.ensure_future(process_entry(index, entry)))
+            index += 1
         
-        if not text.strip():
-            return ProcessedDocument(
-                filename=file.filename,
-                text="",
-                full_text_length=0,
-                success=False,
-                error="No se pudo extraer texto del archivo"
-            )
+        for next_done in asyncio.as_completed(pending):
+            yield await next_done
+    finally:
+        for task in pending:
+            task.cancel()
+        try:
+            entries.close()
+        except ValueError:
+            # La lectura de una entrada sigue en curso en el threadpool
+            # (cliente desconectado); el generador se libera al terminar
+            pass
+
+
+@app.post("/bulk-process-archive", response_model=BulkProcessResult)
+async def bulk_process_archive(
+    request: Request,
+    file: UploadFile = File(...),
+    stream: bool = Query(False)
+):
+    """
+    Procesa un lote enviado como un único archivo ZIP o tar (.tar, .tar.gz,
+    .tar.bz2, .tar.xz).
+    
+    Las entradas se leen de a una y pasan directo a extracción y
+    clasificación, con a lo sumo ARCHIVE_CONCURRENCY en curso. El tipo de cada
+    documento se deduce de la extensión. Acepta `stream=true` igual que
+    `/bulk-process`; sin streaming los resultados vuelven en el orden del
+    archivo.
+    """
+    try:
+        await run_in_threadpool(archives.detect_format, file.file)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    
+    if stream or "application/x-ndjson" in request.headers.get("accept", ""):
+        return StreamingResponse(
+            _ndjson_lines(_archive_process_stream(file)),
+            media_type="application/x-ndjson"
+        )
+    
+    try:
+        indexed = [item async for item in _archive_process_stream(file)]
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    
+    results = [result for _, result in sorted(indexed, key=lambda item: item[0])]
+    processed_count = sum(1 for result in results if result.success)
+    
+    return BulkProcessResult(
+        total_files=len(results),
+        processed=processed_count,
+        failed=len(results) - processed_count,
+        results=results
+    )
+
+
+async def _process_job_file(file_path: str, filename: str, mime_type: str,
+                            options: Dict) -> Dict:
+    """
+    Procesador de los workers de trabajos (ver jobs.py). Con ``first_page``
+    completa un documento que `/process` clasificó por sus primeras páginas.
+    """
+    if options.get("first_page"):
+        result = await process_source(
+            file_path, filename, mime_type,
+            first_page=options["first_page"],
+            prefix=options["prefix"]
+        )
+    else:
+        result = await process_source(file_path, filename, mime_type, include_text=False)
+    return result.model_dump()
+
+
+@app.post("/jobs", response_model=JobSubmitResponse, status_code=202)
+async def submit_job(files: List[UploadFile] = File(...)):
+    """
+    Encola un procesamiento masivo y responde de inmediato con el id del trabajo.
+    
+    Los archivos se guardan en disco y se procesan en segundo plano aunque el
+    cliente se desconecte. El progreso se consulta con `GET /jobs/{job_id}` o
+    en streaming con `GET /jobs/{job_id}/events`.
+    """
+    job_id = job_manager.new_job_id()
+    job_dir = job_manager.job_dir(job_id)
+    
+    saved = []
+    for idx, file in enumerate(files):
+        file_ext = os.path.splitext(file.filename)[1]
+        path = job_dir / f"{idx}{file_ext}"
         
-        # Clasificar
         try:
-            category, confidence, all_probs = classifier.classify_document(text)
-            keywords = classifier.extract_keywords(text)
-            
-            # Crear preview del texto (primeros 200 caracteres)
-            text_preview = text[:200] + "..." if len(text) > 200 else text
-            
-            return ProcessedDocument(
-                filename=file.filename,
-                text=text,
-                text_preview=text_preview,
-                full_text_length=len(text),
-                category=category,
-                confidence=confidence,
-                all_probabilities=all_probs,
-                keywords=keywords,
-                success=True
-            )
+            await save_upload(file, path)
+        except HTTPException as e:
+            shutil.rmtree(job_dir, ignore_errors=True)
+            raise HTTPException(status_code=e.status_code, detail=f"{file.filename}: {e.detail}")
         
-        except Exception as e:
-            return ProcessedDocument(
-                filename=file.filename,
-                text=text,
-                text_preview=text[:200],
-                full_text_length=len(text),
-                success=False,
-                error=f"Error al clasificar: {str(e)}"
-            )
+        mime_type = file.content_type or "application/octet-stream"
+        saved.append((file.filename, mime_type, str(path)))
     
-    finally:
-        # Limpiar archivo temporal
-        if temp_path and os.path.exists(temp_path):
-            os.remove(temp_path)
+    await job_manager.submit(job_id, saved)
+    
+    return JobSubmitResponse(job_id=job_id, status="queued", total=len(saved))
 
 
-@app.post("/bulk-process", response_model=BulkProcessResult)
-async def bulk_process_documents(files: List[UploadFile] = File(...)):
+@app.get("/jobs/{job_id}", response_model=JobStatusResponse)
+async def get_job(job_id: str, include_results: bool = Query(True)):
     """
-    Procesa múltiples documentos en lote.
+    Estado de un trabajo: contadores globales y estado de cada archivo.
     
-    Retorna resultados para cada archivo, incluyendo éxitos y fallos.
+    Con `include_results=false` se omiten los resultados, útil para consultar
+    el progreso de lotes grandes con frecuencia.
+    """
+    job = await job_manager.get(job_id, include_results)
+    if job is None:
+        raise HTTPException(status_code=404, detail=f"Trabajo no encontrado: {job_id}")
+    return job
+
+
+@app.get("/jobs/{job_id}/events")
+async def job_events(job_id: str):
     """
-    results = []
-    processed_count = 0
-    failed_count = 0
+    Progreso de un trabajo en streaming, una línea JSON por evento:
     
-    for file in files:
-        temp_path = None
-        try:
-            # Guardar archivo temporal
-            file_ext = os.path.splitext(file.filename)[1]
-            temp_path = UPLOAD_DIR / f"{uuid.uuid4()}{file_ext}"
-            
-            with open(temp_path, "wb") as buffer:
-                shutil.copyfileobj(file.file, buffer)
-            
-            # Determinar tipo MIME
-            mime_type = file.content_type or "application/octet-stream"
+    - `{"type": "file", ...}` con el resultado de cada archivo que termina
+    - `{"type": "progress", ...}` con los contadores después de cada cambio
+    - `{"type": "error", "detail": ...}` si el trabajo se borra (vencido)
+      mientras se sigue su progreso; es la última línea
+    
+    El stream se cierra cuando el trabajo termina. Si el cliente se
+    desconecta, el trabajo sigue y se puede volver a conectar.
+    """
+    if await job_manager.get(job_id, include_results=False) is None:
+        raise HTTPException(status_code=404, detail=f"Trabajo no encontrado: {job_id}")
+    
+    async def events():
+        reported = set()
+        while True:
+            job = await job_manager.get(job_id, include_results=False)
+            if job is None:
+                # El estado HTTP ya se envió: el error va en el stream
+                error = {"type": "error", "detail": f"Trabajo no encontrado: {job_id}"}
+                yield json.dumps(error, ensure_ascii=False) + "\n"
+                break
             
-            # Extraer texto
-            try:
-                text = ocr_service.extract_text_from_file(str(temp_path), mime_type)
-            except Exception as e:
-                results.append(ProcessedDocument(
-                    filename=file.filename,
-                    success=False,
-                    error=f"Error al extraer texto: {str(e)}"
-                ))
-                failed_count += 1
-                continue
+            # Solo se leen los resultados de los archivos terminados desde el
+            # último evento
+            finished = [
+                file["index"] for file in job["files"]
+                if file["status"] in ("done", "failed") and file["index"] not in reported
+            ]
+            results = await job_manager.results(job_id, finished)
+            for index in finished:
+                if index not in results:
+                    # Borrado entre las dos consultas; se reporta en la próxima vuelta
+                    continue
+                reported.add(index)
+                event = {"type": "file", "index": index, **results[index]}
+                yield json.dumps(event, ensure_ascii=False) + "\n"
             
-            if not text.strip():
-                results.append(ProcessedDocument(
-                    filename=file.filename,
-                    text="",
-                    full_text_length=0,
-                    success=False,
-                    error="No se pudo extraer texto del archivo"
-                ))
-                failed_count += 1
-                continue
+            progress = {
+                "type": "progress",
+                "status": job["status"],
+                "total": job["total"],
+                "processed": job["processed"],
+                "failed": job["failed"],
+            }
+            yield json.dumps(progress) + "\n"
             
-            # Clasificar
-            try:
-                category, confidence, all_probs = classifier.classify_document(text)
-                keywords = classifier.extract_keywords(text)
-                
-                text_preview = text[:200] + "..." if len(text) > 200 else text
-                
-                results.append(ProcessedDocument(
-                    filename=file.filename,
-                    text_preview=text_preview,
-                    full_text_length=len(text),
-                    category=category,
-                    confidence=confidence,
-                    all_probabilities=all_probs,
-                    keywords=keywords,
-                    success=True
-                ))
-                processed_count += 1
-            
-            except Exception as e:
-                results.append(ProcessedDocument(
-                    filename=file.filename,
-                    text_preview=text[:200],
-                    full_text_length=len(text),
-                    success=False,
-                    error=f"Error al clasificar: {str(e)}"
-                ))
-                failed_count += 1
-        
-        finally:
-            # Limpiar archivo temporal
-            if temp_path and os.path.exists(temp_path):
-                os.remove(temp_path)
+            if job["status"] == "completed":
+                break
+            await job_manager.wait_for_change(timeout=5.0)
     
-    return BulkProcessResult(
-        total_files=len(files),
-        processed=processed_count,
-        failed=failed_count,
-        results=results
-    )
+    return StreamingResponse(events(), media_type="application/x-ndjson")
 
 
 @app.post("/train", response_model=TrainingResponse)
@@ -367,17 +890,24 @@ async def train_classifier(request: TrainingRequest):
                 detail="Debe proporcionar al menos un ejemplo de entrenamiento"
             )
         
-        # Entrenar
-        classifier.train_with_new_data(request.texts, request.labels)
+        # Entrenar fuera del event loop; las clasificaciones en curso siguen
+        # usando el modelo anterior hasta que se publica la versión nueva
+        classifier = await load_classifier()
+        version = await run_in_threadpool(
+            classifier.train_with_new_data, request.texts, request.labels
+        )
         
         return TrainingResponse(
             success=True,
             message="Modelo entrenado y guardado exitosamente",
-            trained_samples=len(request.texts)
+            trained_samples=len(request.texts),
+            model_version=version
         )
     
     except HTTPException:
         raise
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
         raise HTTPException(
             status_code=500,
@@ -385,6 +915,110 @@ async def train_classifier(request: TrainingRequest):
         )
 
 
+
+@app.get("/model", response_model=ModelInfoResponse)
+async def model_info():
+    """
+    Lista las versiones del modelo guardadas en disco, la activa en el
+    manifiesto y la cargada en este proceso.
+    """
+    classifier = await load_classifier()
+    manifest = classifier.read_manifest()
+    return ModelInfoResponse(
+        active=manifest["active"],
+        loaded=classifier.model_version,
+        versions=manifest["versions"]
+    )
+
+
+@app.post("/model/reload", response_model=ModelReloadResponse)
+async def reload_model(request: ModelReloadRequest):
+    """
+    Activa una versión del modelo sin reiniciar el servidor.
+    
+    Sin `version` recarga la versión activa del manifiesto (por ejemplo,
+    después de entrenar desde otro proceso). Con `version` la promueve o hace
+    rollback a ella. Las peticiones en curso terminan con el modelo anterior.
+    """
+    try:
+        classifier = await load_classifier()
+        version = await run_in_threadpool(classifier.load_model, request.version)
+        
+        return ModelReloadResponse(
+            success=True,
+            message=f"Modelo {version} activado",
+            model_version=version
+        )
+    
+    except ValueError as e:
+        raise HTTPException(status_code=404, detail=str(e))
+    except Exception as e:
+        raise HTTPException(
+            status_code=500,
+            detail=f"Error al recargar modelo: {str(e)}"
+        )
+
+
+@app.get("/stats")
+async def service_stats():
+    """
+    Contadores del proceso: uploads procesados en memoria o en disco (con los
+    bytes de E/S de disco evitados), aciertos de las cachés de OCR y de
+    clasificación, el motor de OCR en uso y la memoria del proceso. Los pools
+    de tesserocr viven en los procesos de extracción: aquí solo aparecen en
+    modo `thread` o `inline`. Con varios workers (`ML_WORKERS`) cada
+    petición la atiende uno solo: `process.pid` indica cuál.
+    """
+    return {
+        "uploads": upload_stats.stats(),
+        "ocr_cache": ocr_cache.stats(),
+        "ocr_engine": ocr_service.engine_stats(),
+        "classifier_cache": get_classifier().cache_stats() if classifier_loaded() else None,
+        "process": {"pid": os.getpid(), **metrics.process_memory()}
+    }
+
+
+@metrics.registry.collector
+def _service_metrics():
+    """Familias calculadas en cada scrape a partir de los contadores de /stats"""
+    uploads = upload_stats.stats()
+    yield (
+        "ml_upload_bytes_total", "counter", "Bytes subidos, extraídos en memoria o volcados a disco",
+        ("storage",), [(("memory",), uploads["memory_bytes"]), (("disk",), uploads["disk_bytes"])]
+    )
+    
+    ocr = ocr_cache.stats()
+    caches = {"ocr": (ocr["memory_hits"] + ocr["disk_hits"], ocr["misses"])}
+    if classifier_loaded():
+        classifier = get_classifier().cache_stats()
+        caches["classifier"] = (classifier["hits"], classifier["misses"])
+    
+    yield (
+        "ml_cache_requests_total", "counter", "Consultas a las cachés por resultado",
+        ("cache", "result"),
+        [((name, result), count)
+         for name, (hits, misses) in caches.items()
+         for result, count in (("hit", hits), ("miss", misses))]
+    )
+    yield (
+        "ml_cache_hit_ratio", "gauge", "Proporción de aciertos de cada caché desde el arranque",
+        ("cache",),
+        [((name,), hits / (hits + misses)) for name, (hits, misses) in caches.items() if hits + misses]
+    )
+
+
+@app.get("/metrics")
+async def prometheus_metrics():
+    """
+    Métricas del proceso en formato de texto de Prometheus: latencia y
+    peticiones en curso por endpoint, duración de cada etapa (lectura del
+    upload, capa de texto del PDF, rasterización, Tesseract, TF-IDF, palabras
+    clave...), extracciones en curso, páginas procesadas por método, bytes
+    extraídos y aciertos de las cachés.
+    """
+    return Response(content=metrics.render(), media_type=metrics.CONTENT_TYPE)
+
+
 if __name__ == "__main__":
     import uvicorn
     print("""
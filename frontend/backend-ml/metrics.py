@@ -0,0 +1,376 @@
+"""
+Métricas del servicio en formato de texto de Prometheus y cabecera Server-Timing
+
+Cada etapa del procesamiento (lectura del upload, escritura a disco, capa de
+texto del PDF, rasterización, Tesseract, TF-IDF, palabras clave...) se mide
+con ``stage(nombre)``. Las duraciones se acumulan en el recolector de la
+petición en curso: al terminar la petición alimentan el histograma
+``ml_stage_duration_seconds`` y van en la cabecera ``Server-Timing``.
+
+La extracción corre en procesos worker, cuyas métricas no ve el proceso que
+atiende ``/metrics``. Por eso los workers no registran nada: abren su propio
+recolector con ``collect_stages()``, devuelven las etapas junto con el
+resultado y quien lo recibe las incorpora con ``merge_stages()``.
+"""
+import os
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Callable, Dict, Iterable, Iterator, List, Optional, Sequence, Tuple
+
+# Agregar la cabecera Server-Timing con la duración de cada etapa
+SERVER_TIMING_ENABLED = os.getenv("SERVER_TIMING_ENABLED", "true").lower() in ("1", "true", "yes")
+
+# Límites (segundos) de los buckets de los histogramas de latencia
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+# Etapas medidas en la petición (o trabajo) en curso: lista de (etapa, segundos)
+Stages = List[Tuple[str, float]]
+_stages: ContextVar[Optional[Stages]] = ContextVar("ml_stages", default=None)
+
+
+def _escape(value: str) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(names: Sequence[str], values: Sequence[str]) -> str:
+    if not names:
+        return ""
+    pairs = ",".join(f'{name}="{_escape(value)}"' for name, value in zip(names, values))
+    return "{" + pairs + "}"
+
+
+def _format_value(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class _Metric:
+    """Base de las métricas con etiquetas"""
+
+    kind = ""
+
+    def __init__(self, name: str, help_text: str, labels: Sequence[str] = ()):
+        self.name = name
+        self.help = help_text
+        self.label_names = tuple(labels)
+        self._lock = threading.Lock()
+
+    def _key(self, labels: Dict[str, str]) -> Tuple[str, ...]:
+        return tuple(str(labels.get(name, "")) for name in self.label_names)
+
+    def header(self) -> List[str]:
+        return [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.kind}"]
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def __init__(self, name: str, help_text: str, labels: Sequence[str] = ()):
+        super().__init__(name, help_text, labels)
+        self._values: Dict[Tuple[str, ...], float] = {}
+
+    def inc(self, amount: float = 1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def render(self) -> List[str]:
+        with self._lock:
+            items = sorted(self._values.items())
+        return self.header() + [
+            f"{self.name}{_format_labels(self.label_names, key)} {_format_value(value)}"
+            for key, value in items
+        ]
+
+
+class Gauge(Counter):
+    kind = "gauge"
+
+    def dec(self, amount: float = 1, **labels):
+        self.inc(-amount, **labels)
+
+    def set(self, value: float, **labels):
+        with self._lock:
+            self._values[self._key(labels)] = value
+
+    @contextmanager
+    def track(self, **labels) -> Iterator[None]:
+        """Suma 1 mientras dura el bloque"""
+        self.inc(**labels)
+        try:
+            yield
+        finally:
+            self.dec(**labels)
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name: str, help_text: str, labels: Sequence[str] = (),
+                 buckets: Sequence[float] = LATENCY_BUCKETS):
+        super().__init__(name, help_text, labels)
+        self.buckets = tuple(sorted(buckets))
+        # Por etiquetas: [conteo por bucket..., suma, conteo total]
+        self._values: Dict[Tuple[str, ...], List[float]] = {}
+
+    def observe(self, value: float, **labels):
+        key = self._key(labels)
+        with self._lock:
+            row = self._values.get(key)
+            if row is None:
+                row = self._values[key] = [0] * len(self.buckets) + [0.0, 0]
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    row[i] += 1
+            row[-2] += value
+            row[-1] += 1
+
+    def render(self) -> List[str]:
+        with self._lock:
+            items = sorted((key, list(row)) for key, row in self._values.items())
+        names = self.label_names + ("le",)
+        lines = self.header()
+        for key, row in items:
+            for i, bound in enumerate(self.buckets):
+                labels = _format_labels(names, key + (_format_value(float(bound)),))
+                lines.append(f"{self.name}_bucket{labels} {row[i]}")
+            lines.append(f"{self.name}_bucket{_format_labels(names, key + ('+Inf',))} {row[-1]}")
+            labels = _format_labels(self.label_names, key)
+            lines.append(f"{self.name}_sum{labels} {_format_value(row[-2])}")
+            lines.append(f"{self.name}_count{labels} {row[-1]}")
+        return lines
+
+
+# Familia calculada al momento del scrape: (nombre, tipo, ayuda, etiquetas, muestras)
+Family = Tuple[str, str, str, Sequence[str], Iterable[Tuple[Sequence[str], float]]]
+
+
+class Registry:
+    """Métricas del proceso más recolectores que se evalúan en cada scrape"""
+
+    def __init__(self):
+        self._metrics: List[_Metric] = []
+        self._collectors: List[Callable[[], Iterable[Family]]] = []
+
+    def register(self, metric: _Metric) -> _Metric:
+        self._metrics.append(metric)
+        return metric
+
+    def collector(self, function: Callable[[], Iterable[Family]]):
+        """Registra una función que devuelve familias calculadas (p. ej. de ``stats()``)"""
+        self._collectors.append(function)
+        return function
+
+    def render(self) -> str:
+        lines = []
+        for metric in self._metrics:
+            lines.extend(metric.render())
+        for function in self._collectors:
+            for name, kind, help_text, label_names, samples in function():
+                lines.append(f"# HELP {name} {help_text}")
+                lines.append(f"# TYPE {name} {kind}")
+                for values, value in samples:
+                    lines.append(f"{name}{_format_labels(label_names, values)} {_format_value(value)}")
+        return "\n".join(lines) + "\n"
+
+
+registry = Registry()
+
+http_requests = registry.register(Counter(
+    "ml_http_requests_total", "Peticiones HTTP atendidas", ("endpoint", "method", "status")
+))
+http_duration = registry.register(Histogram(
+    "ml_http_request_duration_seconds", "Duración de las peticiones HTTP", ("endpoint",)
+))
+http_in_flight = registry.register(Gauge(
+    "ml_http_requests_in_flight", "Peticiones HTTP en curso", ("endpoint",)
+))
+stage_duration = registry.register(Histogram(
+    "ml_stage_duration_seconds", "Duración de cada etapa del procesamiento", ("stage",)
+))
+extractions_in_flight = registry.register(Gauge(
+    "ml_extractions_in_flight", "Extracciones en curso en el pool de extracción"
+))
+pages_processed = registry.register(Counter(
+    "ml_pages_processed_total", "Páginas extraídas por método (text u ocr)", ("method",)
+))
+bytes_extracted = registry.register(Counter(
+    "ml_extracted_bytes_total", "Bytes de documentos extraídos (sin contar aciertos de caché)", ("kind",)
+))
+
+
+# Campos de /proc/<pid>/smaps_rollup que suma process_memory
+_SMAPS_FIELDS = {
+    "Rss": "rss",
+    "Pss": "pss",
+    "Shared_Clean": "shared",
+    "Shared_Dirty": "shared",
+    "Private_Clean": "private",
+    "Private_Dirty": "private",
+}
+
+
+def process_memory(pid="self") -> Dict[str, int]:
+    """
+    Memoria de un proceso en bytes (solo Linux; vacío en otros sistemas):
+    ``rss``, ``pss`` (las páginas compartidas se reparten entre los procesos
+    que las usan, así que la suma de los PSS de los workers es la memoria
+    real), ``shared`` y ``private``
+    """
+    try:
+        with open(f"/proc/{pid}/smaps_rollup", "r") as f:
+            lines = f.readlines()
+    except OSError:
+        return {}
+
+    memory: Dict[str, int] = {}
+    for line in lines:
+        name, _, rest = line.partition(":")
+        kind = _SMAPS_FIELDS.get(name)
+        if kind:
+            memory[kind] = memory.get(kind, 0) + int(rest.split()[0]) * 1024
+    return memory
+
+
+@registry.collector
+def _process_metrics():
+    yield (
+        "ml_process_memory_bytes", "gauge", "Memoria del proceso (rss, pss, shared, private)",
+        ("kind",), [((kind,), value) for kind, value in process_memory().items()]
+    )
+
+
+def record_stage(name: str, seconds: float):
+    """
+    Registra la duración de una etapa en el recolector en curso, o
+    directamente en el histograma si no hay ninguno (p. ej. en un trabajo)
+    """
+    stages = _stages.get()
+    if stages is not None:
+        stages.append((name, seconds))
+    else:
+        stage_duration.observe(seconds, stage=name)
+
+
+def merge_stages(stages: Iterable[Tuple[str, float]]):
+    """Incorpora las etapas que devolvió un worker"""
+    for name, seconds in stages:
+        record_stage(name, seconds)
+
+
+@contextmanager
+def stage(name: str) -> Iterator[None]:
+    """Mide el bloque como la etapa ``name``"""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        record_stage(name, time.perf_counter() - start)
+
+
+@contextmanager
+def collect_stages() -> Iterator[Stages]:
+    """
+    Abre un recolector propio para el bloque. Lo usan los puntos de entrada
+    de los workers: las etapas se devuelven al llamador en lugar de
+    registrarse en un proceso que nadie consulta.
+    """
+    stages: Stages = []
+    token = _stages.set(stages)
+    try:
+        yield stages
+    finally:
+        _stages.reset(token)
+
+
+def document_kind(mime_type: str) -> str:
+    """Etiqueta acotada para el tipo de documento"""
+    if mime_type == "application/pdf":
+        return "pdf"
+    if mime_type.startswith("image/"):
+        return "image"
+    if mime_type.startswith("text/"):
+        return "text"
+    return "other"
+
+
+def server_timing(stages: Stages, total: float) -> str:
+    """
+    Valor de la cabecera Server-Timing: la suma de cada etapa en
+    milisegundos. En lotes las etapas de los distintos archivos se suman, así
+    que pueden superar el total de la petición.
+    """
+    totals: Dict[str, float] = {}
+    for name, seconds in stages:
+        totals[name] = totals.get(name, 0.0) + seconds
+    parts = [f"{name};dur={seconds * 1000:.1f}" for name, seconds in totals.items()]
+    parts.append(f"total;dur={total * 1000:.1f}")
+    return ", ".join(parts)
+
+
+def _endpoint(scope) -> str:
+    """Plantilla de la ruta (``/jobs/{job_id}``) para no crear una serie por id"""
+    from starlette.routing import Match
+
+    app = scope.get("app")
+    for route in getattr(app, "routes", ()):
+        match, _ = route.matches(scope)
+        if match == Match.FULL:
+            return getattr(route, "path", scope["path"])
+    return "unmatched"
+
+
+class MetricsMiddleware:
+    """
+    Middleware ASGI: cuenta y mide las peticiones por endpoint, abre el
+    recolector de etapas de cada petición y agrega ``Server-Timing``.
+
+    En las respuestas en streaming la cabecera sale con las etapas medidas
+    hasta el primer byte; los histogramas sí reciben la petición completa.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        from starlette.datastructures import MutableHeaders
+
+        endpoint = _endpoint(scope)
+        start = time.perf_counter()
+        status = 500
+
+        async def send_with_timing(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+                if SERVER_TIMING_ENABLED:
+                    headers = MutableHeaders(scope=message)
+                    headers.append("Server-Timing", server_timing(stages, time.perf_counter() - start))
+            await send(message)
+
+        http_in_flight.inc(endpoint=endpoint)
+        with collect_stages() as stages:
+            try:
+                await self.app(scope, receive, send_with_timing)
+            finally:
+                http_in_flight.dec(endpoint=endpoint)
+                http_requests.inc(endpoint=endpoint, method=scope["method"], status=status)
+                http_duration.observe(time.perf_counter() - start, endpoint=endpoint)
+                for name, seconds in stages:
+                    stage_duration.observe(seconds, stage=name)
+
+
+def render() -> str:
+    """Todas las métricas en formato de texto de Prometheus"""
+    return registry.render()
+
+
+# Starlette agrega "; charset=utf-8"
+CONTENT_TYPE = "text/plain; version=0.0.4"
@@ -1,13 +1,374 @@
 """
 Servicio de OCR para extracción de texto de documentos
 """
-import pytesseract
-from PIL import Image
-from pdf2image import convert_from_path
-import PyPDF2
 import io
-from typing import Optional
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from pathlib import Path
+from typing import Optional, List, Dict, Any, Tuple, Union
+import hashlib
+import json
+import logging
 import os
+import threading
+import time
+
+import metrics
+
+logger = logging.getLogger(__name__)
+
+# pytesseract, PIL, pdf2image y PyPDF2 se importan dentro de cada método: el
+# proceso de la API solo los carga si realmente extrae texto
+
+# Motor de OCR: "pytesseract" (un proceso tesseract por imagen) o "tesserocr"
+# (instancias residentes con el idioma precargado, ver tesseract_pool.py)
+OCR_ENGINE = os.getenv("OCR_ENGINE", "pytesseract").lower()
+
+# Hilos OpenMP de cada Tesseract. El paralelismo ya viene de los pools de
+# procesos e instancias; más hilos por instancia sobresuscriben los núcleos.
+# Tiene que estar definido antes de cargar libtesseract, y lo heredan los
+# procesos tesseract que lanza pytesseract
+os.environ.setdefault("OMP_THREAD_LIMIT", "1")
+
+# Procesos para OCR de páginas de un PDF escaneado (1 = secuencial). 0 = uno
+# por núcleo si el documento se extrae solo, o 1 dentro del pool de
+# extracción, donde los documentos ya corren en paralelo (ver page_workers)
+OCR_PAGE_WORKERS = int(os.getenv("OCR_PAGE_WORKERS", "0"))
+
+# Caché de resultados de OCR (memoria LRU + disco)
+OCR_CACHE_ENABLED = os.getenv("OCR_CACHE_ENABLED", "true").lower() in ("1", "true", "yes")
+OCR_CACHE_DIR = os.getenv("OCR_CACHE_DIR", "ocr_cache")
+OCR_CACHE_MEMORY_ITEMS = int(os.getenv("OCR_CACHE_MEMORY_ITEMS", "256"))
+OCR_CACHE_DISK_MB = int(os.getenv("OCR_CACHE_DISK_MB", "512"))
+
+# Se incrementa cuando cambia el formato de los resultados cacheados
+OCR_CACHE_FORMAT = 3
+
+# Caracteres visibles mínimos para considerar que una página de un PDF tiene
+# capa de texto; con menos (p. ej. solo un sello o un número de página sobre
+# un escaneo) la página pasa por OCR
+OCR_TEXT_LAYER_MIN_CHARS = int(os.getenv("OCR_TEXT_LAYER_MIN_CHARS", "16"))
+
+# Resolución del OCR de PDFs escaneados. En modo "adaptive" cada página se
+# rasteriza primero a OCR_LOW_DPI y solo se repite a OCR_HIGH_DPI si la
+# confianza media de sus palabras queda por debajo de OCR_MIN_CONFIDENCE;
+# en modo "fixed" se usa siempre OCR_DPI
+OCR_DPI_MODE = os.getenv("OCR_DPI_MODE", "adaptive").lower()
+OCR_DPI = int(os.getenv("OCR_DPI", "200"))
+OCR_LOW_DPI = int(os.getenv("OCR_LOW_DPI", "150"))
+OCR_HIGH_DPI = int(os.getenv("OCR_HIGH_DPI", "300"))
+OCR_MIN_CONFIDENCE = float(os.getenv("OCR_MIN_CONFIDENCE", "75"))
+
+# Un documento llega como ruta en disco o, si es chico, como bytes en memoria
+Source = Union[str, bytes]
+
+
+def _open_binary(source: Source):
+    """Abre el documento para lectura binaria, esté en disco o en memoria"""
+    if isinstance(source, (bytes, bytearray)):
+        return io.BytesIO(source)
+    return open(source, 'rb')
+
+
+def _source_name(source: Source) -> str:
+    if isinstance(source, (bytes, bytearray)):
+        return f"<{len(source)} bytes en memoria>"
+    return os.path.basename(source)
+
+
+_engine: Optional[str] = None
+
+
+def ocr_engine() -> str:
+    """
+    Motor de OCR efectivo. Si se pidió tesserocr pero no está instalado, se
+    usa pytesseract.
+    """
+    global _engine
+    if _engine is None:
+        if OCR_ENGINE == "tesserocr":
+            from tesseract_pool import tesserocr_available
+            if tesserocr_available():
+                _engine = "tesserocr"
+            else:
+                logger.warning("OCR_ENGINE=tesserocr pero tesserocr no está instalado; se usa pytesseract")
+                _engine = "pytesseract"
+        else:
+            _engine = "pytesseract"
+    return _engine
+
+
+_page_workers_default = os.cpu_count() or 1
+_page_pool: Optional[ProcessPoolExecutor] = None
+_page_pool_lock = threading.Lock()
+
+
+def set_page_workers_default(workers: int):
+    """
+    Paralelismo por página cuando OCR_PAGE_WORKERS no está definido. El pool
+    de extracción lo baja a 1: con un pool de páginas por cada uno de sus
+    workers se crearían núcleos × núcleos procesos de OCR
+    """
+    global _page_workers_default
+    _page_workers_default = max(1, workers)
+
+
+def page_workers() -> int:
+    """Procesos efectivos para el OCR de las páginas de un PDF"""
+    return OCR_PAGE_WORKERS or _page_workers_default
+
+
+def _get_page_pool() -> ProcessPoolExecutor:
+    """
+    Pool de procesos de páginas compartido por todos los documentos de este
+    proceso: se crea en el primer PDF escaneado en lugar de uno por llamada
+    """
+    global _page_pool
+    with _page_pool_lock:
+        if _page_pool is None:
+            _page_pool = ProcessPoolExecutor(max_workers=page_workers())
+        return _page_pool
+
+
+def _mean_confidence(confidences: List[float]) -> Optional[float]:
+    return sum(confidences) / len(confidences) if confidences else None
+
+
+def _ocr_image(image, lang: str) -> Tuple[str, Optional[float]]:
+    """
+    Aplica OCR a una imagen obteniendo también la confianza de cada palabra
+    (``image_to_data`` con pytesseract, o una instancia del pool con tesserocr)
+    
+    Returns:
+        Tupla con (texto, confianza media de las palabras de 0 a 100, o None
+        si no se reconoció ninguna palabra)
+    """
+    if ocr_engine() == "tesserocr":
+        from tesseract_pool import get_pool
+        with metrics.stage("tesseract"):
+            text, confidences = get_pool(lang).recognize(image)
+        return text.strip(), _mean_confidence([c for c in confidences if c >= 0])
+    
+    import pytesseract
+    
+    with metrics.stage("tesseract"):
+        data = pytesseract.image_to_data(image, lang=lang, output_type=pytesseract.Output.DICT)
+    
+    # Reconstruir el texto por líneas, con una línea en blanco entre párrafos
+    lines: "OrderedDict[Tuple[int, int, int], List[str]]" = OrderedDict()
+    confidences = []
+    for i, word in enumerate(data["text"]):
+        word = word.strip()
+        if not word:
+            continue
+        key = (data["block_num"][i], data["par_num"][i], data["line_num"][i])
+        lines.setdefault(key, []).append(word)
+        confidence = float(data["conf"][i])
+        if confidence >= 0:
+            confidences.append(confidence)
+    
+    text_lines = []
+    previous_paragraph = None
+    for (block, paragraph, _), words in lines.items():
+        if previous_paragraph is not None and (block, paragraph) != previous_paragraph:
+            text_lines.append("")
+        text_lines.append(" ".join(words))
+        previous_paragraph = (block, paragraph)
+    
+    return "\n".join(text_lines), _mean_confidence(confidences)
+
+
+def _rasterize_pdf_page(pdf_source: Source, page_number: int, dpi: int):
+    from pdf2image import convert_from_bytes, convert_from_path
+    
+    with metrics.stage("rasterize"):
+        if isinstance(pdf_source, (bytes, bytearray)):
+            images = convert_from_bytes(pdf_source, dpi=dpi, first_page=page_number, last_page=page_number)
+        else:
+            images = convert_from_path(pdf_source, dpi=dpi, first_page=page_number, last_page=page_number)
+    return images[0] if images else None
+
+
+def _ocr_pdf_page(pdf_source: Source, page_number: int, lang: str) -> Dict[str, Any]:
+    """
+    Rasteriza y aplica OCR a una sola página del PDF.
+    
+    Está a nivel de módulo para poder ejecutarse en un proceso worker.
+    
+    Returns:
+        Página con ``page``, ``text``, ``method``, ``seconds``, ``confidence``,
+        ``dpi`` (la resolución que dio el resultado final) y ``stages`` (ver
+        metrics.py; ``ocr_pdf_pages`` lo quita)
+    """
+    start = time.perf_counter()
+    dpi = OCR_LOW_DPI if OCR_DPI_MODE == "adaptive" else OCR_DPI
+    
+    with metrics.collect_stages() as stages:
+        image = _rasterize_pdf_page(pdf_source, page_number, dpi)
+        text, confidence = _ocr_image(image, lang) if image is not None else ("", None)
+        
+        # Páginas dudosas (o sin palabras reconocidas): repetir a mayor resolución
+        # y quedarse con el resultado más confiable
+        if (OCR_DPI_MODE == "adaptive" and image is not None
+                and (confidence is None or confidence < OCR_MIN_CONFIDENCE)):
+            retry_text, retry_confidence = _ocr_image(
+                _rasterize_pdf_page(pdf_source, page_number, OCR_HIGH_DPI), lang
+            )
+            if retry_confidence is not None and (confidence is None or retry_confidence >= confidence):
+                text, confidence, dpi = retry_text, retry_confidence, OCR_HIGH_DPI
+    
+    return {
+        "page": page_number,
+        "text": text,
+        "method": "ocr",
+        "seconds": time.perf_counter() - start,
+        "confidence": confidence,
+        "dpi": dpi,
+        "stages": stages
+    }
+
+
+def _has_text_layer(text: str) -> bool:
+    return len("".join(text.split())) >= OCR_TEXT_LAYER_MIN_CHARS
+
+
+def document_confidence(pages: List[Dict[str, Any]]) -> Optional[int]:
+    """
+    Confianza de OCR del documento (0-100): promedio de las páginas que
+    pasaron por OCR, o None si ninguna lo hizo
+    """
+    values = [page["confidence"] for page in pages if page.get("confidence") is not None]
+    if not values:
+        return None
+    return round(sum(values) / len(values))
+
+
+class OCRCache:
+    """
+    Caché de resultados de extracción direccionada por contenido.
+    
+    Tiene dos niveles: un LRU en memoria (por proceso) y un directorio en disco
+    compartido entre procesos, con desalojo de los archivos menos usados
+    cuando se supera el tamaño máximo.
+    """
+    
+    def __init__(self, directory: str = OCR_CACHE_DIR, max_items: int = OCR_CACHE_MEMORY_ITEMS,
+                 max_disk_bytes: int = OCR_CACHE_DISK_MB * 1024 * 1024):
+        self.directory = Path(directory)
+        self.max_items = max_items
+        self.max_disk_bytes = max_disk_bytes
+        self._memory: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._disk_bytes: Optional[int] = None
+        self.memory_hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+    
+    def _disk_path(self, key: str) -> Path:
+        return self.directory / key[:2] / f"{key}.json"
+    
+    def get(self, key: str) -> Optional[Dict[str, Any]]:
+        """Busca un resultado primero en memoria y después en disco"""
+        with self._lock:
+            if key in self._memory:
+                self._memory.move_to_end(key)
+                self.memory_hits += 1
+                return self._memory[key]
+        
+        if self.max_disk_bytes > 0:
+            path = self._disk_path(key)
+            try:
+                with open(path, 'r', encoding='utf-8') as f:
+                    value = json.load(f)
+                # Marcar como usado recientemente para el desalojo
+                os.utime(path)
+            except (OSError, ValueError):
+                value = None
+            
+            if value is not None:
+                self._remember(key, value)
+                with self._lock:
+                    self.disk_hits += 1
+                return value
+        
+        with self._lock:
+            self.misses += 1
+        return None
+    
+    def put(self, key: str, value: Dict[str, Any]):
+        """Guarda un resultado en ambos niveles"""
+        self._remember(key, value)
+        
+        if self.max_disk_bytes <= 0:
+            return
+        
+        path = self._disk_path(key)
+        try:
+            path.parent.mkdir(parents=True, exist_ok=True)
+            # Escritura atómica: otro proceso nunca ve un archivo a medio escribir
+            temp_path = path.with_suffix(f".{os.getpid()}.tmp")
+            with open(temp_path, 'w', encoding='utf-8') as f:
+                json.dump(value, f, ensure_ascii=False)
+            os.replace(temp_path, path)
+        except OSError as e:
+            logger.warning(f"No se pudo escribir la caché de OCR: {str(e)}")
+            return
+        
+        with self._lock:
+            if self._disk_bytes is None:
+                self._disk_bytes = self._scan_disk_bytes()
+            else:
+                self._disk_bytes += path.stat().st_size
+            over_limit = self._disk_bytes > self.max_disk_bytes
+        
+        if over_limit:
+            self._evict_disk()
+    
+    def _remember(self, key: str, value: Dict[str, Any]):
+        with self._lock:
+            self._memory[key] = value
+            self._memory.move_to_end(key)
+            while len(self._memory) > self.max_items:
+                self._memory.popitem(last=False)
+    
+    def _scan_disk_bytes(self) -> int:
+        return sum(path.stat().st_size for path in self.directory.glob("*/*.json"))
+    
+    def _evict_disk(self):
+        """Borra los archivos menos usados hasta quedar al 90% del límite"""
+        entries = []
+        for path in self.directory.glob("*/*.json"):
+            try:
+                stat = path.stat()
+            except OSError:
+                continue
+            entries.append((stat.st_mtime, stat.st_size, path))
+        
+        total = sum(size for _, size, _ in entries)
+        target = int(self.max_disk_bytes * 0.9)
+        
+        for _, size, path in sorted(entries, key=lambda entry: entry[0]):
+            if total <= target:
+                break
+            try:
+                path.unlink()
+                total -= size
+            except OSError:
+                continue
+        
+        with self._lock:
+            self._disk_bytes = total
+    
+    def stats(self) -> Dict[str, int]:
+        """Contadores de aciertos y fallos"""
+        with self._lock:
+            return {
+                "memory_items": len(self._memory),
+                "memory_hits": self.memory_hits,
+                "disk_hits": self.disk_hits,
+                "misses": self.misses
+            }
+
 
 class OCRService:
     def __init__(self):
@@ -15,64 +376,279 @@ class OCRService:
         # pytesseract.pytesseract.tesseract_cmd = r'C:\Program Files\Tesseract-OCR\tesseract.exe'
         pass
     
-    def extract_text_from_image(self, image_path: str, lang: str = 'spa+eng') -> str:
+    def extract_text_from_image(self, image_path: Source, lang: str = 'spa+eng') -> str:
         """
         Extrae texto de una imagen usando Tesseract OCR
         
         Args:
-            image_path: Ruta a la imagen
+            image_path: Ruta a la imagen o su contenido en bytes
             lang: Idioma para OCR (por defecto español + inglés)
             
         Returns:
             Texto extraído
         """
+        return self.ocr_image(image_path, lang)[0]
+    
+    def ocr_image(self, image_path: Source, lang: str = 'spa+eng') -> Tuple[str, Optional[float]]:
+        """
+        Como ``extract_text_from_image`` pero devuelve también la confianza
+        media de las palabras (0-100)
+        """
+        from PIL import Image
+        
         try:
-            image = Image.open(image_path)
-            text = pytesseract.image_to_string(image, lang=lang)
-            return text.strip()
+            with _open_binary(image_path) as f:
+                image = Image.open(f)
+                text, confidence = _ocr_image(image, lang)
+            return text.strip(), confidence
         except Exception as e:
             raise Exception(f"Error al procesar imagen: {str(e)}")
     
-    def extract_text_from_pdf(self, pdf_path: str, use_ocr: bool = True) -> str:
+    def extract_text_from_pdf(self, pdf_path: Source, use_ocr: bool = True) -> str:
         """
-        Extrae texto de un PDF. Intenta primero con extracción directa,
-        si no funciona, usa OCR.
+        Extrae texto de un PDF. Usa la capa de texto de cada página y OCR
+        solo en las páginas que no la tienen.
         
         Args:
-            pdf_path: Ruta al archivo PDF
+            pdf_path: Ruta al archivo PDF o su contenido en bytes
             use_ocr: Si es True, usa OCR cuando no hay texto directo
             
         Returns:
             Texto extraído
         """
-        text = ""
+        return self.join_pages(self.extract_pdf_pages(pdf_path, use_ocr=use_ocr))
+    
+    def extract_pdf_pages(self, pdf_path: Source, use_ocr: bool = True,
+                          first_page: int = 1, last_page: Optional[int] = None) -> List[Dict[str, Any]]:
+        """
+        Extrae el texto de un PDF página por página
+        
+        Cada página usa su capa de texto si la tiene; solo las que no la
+        tienen (escaneadas) se rasterizan una por una y pasan por OCR, así que
+        un PDF mixto paga exactamente el OCR que necesita.
+        
+        Args:
+            pdf_path: Ruta al archivo PDF o su contenido en bytes
+            use_ocr: Si es True, usa OCR en las páginas sin texto directo
+            first_page: Primera página a extraer (desde 1)
+            last_page: Última página a extraer (por defecto la última del PDF)
+            
+        Returns:
+            Lista ordenada de páginas con ``page``, ``text``, ``method``
+            ("text" u "ocr") y ``seconds``
+        """
+        return self._extract_pdf_range(pdf_path, use_ocr, first_page, last_page)[0]
+    
+    def _extract_pdf_range(self, pdf_path: Source, use_ocr: bool, first_page: int,
+                           last_page: Optional[int]) -> Tuple[List[Dict[str, Any]], int]:
+        """Como ``extract_pdf_pages``, devolviendo también el total de páginas del PDF"""
+        import PyPDF2
+        
+        pages = []
         
         try:
             # Intentar extracción directa de texto
-            with open(pdf_path, 'rb') as file:
+            with metrics.stage("pdf_text"), _open_binary(pdf_path) as file:
                 pdf_reader = PyPDF2.PdfReader(file)
-                for page in pdf_reader.pages:
-                    page_text = page.extract_text()
-                    if page_text:
-                        text += page_text + "\n"
+                page_count = len(pdf_reader.pages)
+                last = min(last_page or page_count, page_count)
+                for number in range(first_page, last + 1):
+                    start = time.perf_counter()
+                    page_text = pdf_reader.pages[number - 1].extract_text() or ""
+                    pages.append({
+                        "page": number,
+                        "text": page_text,
+                        "method": "text",
+                        "seconds": time.perf_counter() - start
+                    })
             
-            # Si no se extrajo texto y use_ocr es True, usar OCR
-            if not text.strip() and use_ocr:
-                images = convert_from_path(pdf_path)
-                for i, image in enumerate(images):
-                    page_text = pytesseract.image_to_string(image, lang='spa+eng')
-                    text += f"--- Página {i+1} ---\n{page_text}\n"
+            # OCR solo de las páginas sin capa de texto
+            missing = [page["page"] for page in pages if not _has_text_layer(page["text"])]
+            if missing and use_ocr:
+                by_number = {page["page"]: page for page in pages}
+                for ocr_page in self.ocr_pdf_pages(pdf_path, page_count, pages=missing):
+                    original = by_number[ocr_page["page"]]
+                    # Si el OCR no reconoce nada, queda lo poco que tenía la capa de texto
+                    if ocr_page["text"].strip() or not original["text"].strip():
+                        ocr_page["seconds"] += original["seconds"]
+                        by_number[ocr_page["page"]] = ocr_page
+                pages = [by_number[page["page"]] for page in pages]
             
-            return text.strip()
+            return pages, page_count
         except Exception as e:
             raise Exception(f"Error al procesar PDF: {str(e)}")
     
-    def extract_text_from_file(self, file_path: str, mime_type: str) -> str:
+    def ocr_pdf_pages(self, pdf_path: Source, page_count: int, lang: str = 'spa+eng',
+                      workers: Optional[int] = None,
+                      pages: Optional[List[int]] = None) -> List[Dict[str, Any]]:
+        """
+        Aplica OCR a las páginas de un PDF, rasterizando y reconociendo
+        cada página en paralelo en el pool de procesos de páginas
+        
+        Args:
+            pdf_path: Ruta al archivo PDF o su contenido en bytes
+            page_count: Cantidad de páginas del PDF
+            lang: Idioma para OCR
+            workers: Páginas en paralelo (por defecto ``page_workers()``); el
+                pool compartido tiene ``page_workers()`` procesos
+            pages: Números de página a procesar (por defecto todas)
+            
+        Returns:
+            Lista de páginas en orden, con el tiempo de cada una en ``seconds``
+        """
+        page_numbers = list(pages) if pages is not None else list(range(1, page_count + 1))
+        if not page_numbers:
+            return []
+        workers = min(workers or page_workers(), len(page_numbers))
+        
+        if workers <= 1:
+            results = [_ocr_pdf_page(pdf_path, number, lang) for number in page_numbers]
+        elif ocr_engine() == "tesserocr":
+            # Las páginas se reparten en hilos que comparten las instancias ya
+            # cargadas de este proceso (tesserocr libera el GIL al reconocer)
+            with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="ocr-page") as pool:
+                results = list(pool.map(
+                    _ocr_pdf_page,
+                    [pdf_path] * len(page_numbers),
+                    page_numbers,
+                    [lang] * len(page_numbers)
+                ))
+        else:
+            # map conserva el orden de las páginas
+            results = list(_get_page_pool().map(
+                _ocr_pdf_page,
+                [pdf_path] * len(page_numbers),
+                page_numbers,
+                [lang] * len(page_numbers)
+            ))
+        
+        for page in results:
+            # Las etapas medidas en el proceso o hilo de cada página
+            metrics.merge_stages(page.pop("stages"))
+            logger.info(
+                f"OCR página {page['page']}/{page_count} de {_source_name(pdf_path)}: "
+                f"{page['seconds']:.2f}s, {page['dpi']} dpi, confianza {page['confidence']}"
+            )
+        
+        return results
+    
+    @staticmethod
+    def join_pages(pages: List[Dict[str, Any]]) -> str:
+        """Reensambla el texto de las páginas en orden"""
+        text = ""
+        for page in pages:
+            if page["method"] == "ocr":
+                text += f"--- Página {page['page']} ---\n{page['text']}\n"
+            elif page["text"]:
+                text += page["text"] + "\n"
+        return text.strip()
+    
+    def extract_document(self, file_path: Source, mime_type: str, first_page: int = 1,
+                         last_page: Optional[int] = None) -> Dict[str, Any]:
+        """
+        Extrae texto de un archivo junto con el detalle por página
+        
+        Args:
+            file_path: Ruta al archivo o su contenido en bytes
+            mime_type: Tipo MIME del archivo
+            first_page: Primera página a extraer (solo PDFs)
+            last_page: Última página a extraer (solo PDFs; por defecto la última)
+            
+        Returns:
+            Diccionario con ``text``, ``pages`` (tiempos y confianza por
+            página; vacío para archivos de texto), ``ocr_confidence`` (0-100,
+            None si no hubo OCR) y ``page_count`` (total del documento, None
+            si no es un PDF)
+        """
+        if mime_type == 'application/pdf':
+            pages, page_count = self._extract_pdf_range(file_path, True, first_page, last_page)
+            return {
+                "text": self.join_pages(pages),
+                "pages": [
+                    {key: value for key, value in page.items() if key != "text"}
+                    for page in pages
+                ],
+                "ocr_confidence": document_confidence(pages),
+                "page_count": page_count
+            }
+        
+        if mime_type.startswith('image/'):
+            start = time.perf_counter()
+            text, confidence = self.ocr_image(file_path)
+            page = {
+                "page": 1,
+                "method": "ocr",
+                "seconds": time.perf_counter() - start,
+                "confidence": confidence
+            }
+            return {
+                "text": text,
+                "pages": [page],
+                "ocr_confidence": document_confidence([page]),
+                "page_count": None
+            }
+        
+        return {
+            "text": self.extract_text_from_file(file_path, mime_type),
+            "pages": [],
+            "ocr_confidence": None,
+            "page_count": None
+        }
+    
+    def warm_up(self, lang: str = 'spa+eng'):
+        """
+        Precarga el motor de OCR en este proceso. Con tesserocr crea las
+        instancias del pool (y carga el idioma) antes de la primera página.
+        """
+        if ocr_engine() == "tesserocr":
+            from tesseract_pool import get_pool
+            get_pool(lang).warm_up()
+    
+    def engine_stats(self) -> Dict[str, Any]:
+        """Motor efectivo y contadores de los pools de tesserocr de este proceso"""
+        from tesseract_pool import pool_stats
+        return {"engine": ocr_engine(), "pools": pool_stats()}
+    
+    def settings(self) -> Dict[str, Any]:
+        """Parámetros que afectan el resultado de la extracción (parte de la clave de caché)"""
+        return {
+            "format": OCR_CACHE_FORMAT,
+            "lang": 'spa+eng',
+            "use_ocr": True,
+            "engine": ocr_engine(),
+            "text_layer_min_chars": OCR_TEXT_LAYER_MIN_CHARS,
+            "dpi_mode": OCR_DPI_MODE,
+            "dpi": [OCR_LOW_DPI, OCR_HIGH_DPI] if OCR_DPI_MODE == "adaptive" else [OCR_DPI],
+            "min_confidence": OCR_MIN_CONFIDENCE if OCR_DPI_MODE == "adaptive" else None
+        }
+    
+    def cache_key(self, file_path: Source, mime_type: str, first_page: int = 1,
+                  last_page: Optional[int] = None) -> str:
+        """
+        Clave de caché: SHA-256 del contenido del archivo más el tipo MIME,
+        el rango de páginas, el idioma y la configuración de OCR
+        """
+        digest = hashlib.sha256()
+        if isinstance(file_path, (bytes, bytearray)):
+            digest.update(file_path)
+        else:
+            with open(file_path, 'rb') as f:
+                for chunk in iter(lambda: f.read(1024 * 1024), b""):
+                    digest.update(chunk)
+        
+        digest.update(b"\0")
+        params = {"mime_type": mime_type, "settings": self.settings()}
+        if (first_page, last_page) != (1, None):
+            params["pages"] = [first_page, last_page]
+        digest.update(json.dumps(params, sort_keys=True).encode('utf-8'))
+        return digest.hexdigest()
+    
+    def extract_text_from_file(self, file_path: Source, mime_type: str) -> str:
         """
         Extrae texto de un archivo según su tipo MIME
         
         Args:
-            file_path: Ruta al archivo
+            file_path: Ruta al archivo o su contenido en bytes
             mime_type: Tipo MIME del archivo
             
         Returns:
@@ -83,10 +659,13 @@ class OCRService:
         elif mime_type == 'application/pdf':
             return self.extract_text_from_pdf(file_path)
         elif mime_type.startswith('text/'):
+            if isinstance(file_path, (bytes, bytearray)):
+                return bytes(file_path).decode('utf-8')
             with open(file_path, 'r', encoding='utf-8') as f:
                 return f.read()
         else:
             raise Exception(f"Tipo de archivo no soportado para OCR: {mime_type}")
 
-# Singleton
+# Singletons
 ocr_service = OCRService()
+ocr_cache = OCRCache()
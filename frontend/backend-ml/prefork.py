@@ -0,0 +1,251 @@
+"""
+Servidor con varios procesos worker que comparten el modelo cargado
+
+Con un solo proceso de uvicorn toda la clasificación corre en un núcleo. Aquí
+el proceso padre importa la app, carga el clasificador (y compila el motor de
+inferencia) y abre el socket; después crea los workers con ``fork``. Cada
+worker hereda el modelo ya cargado: mientras nadie escriba esas páginas, el
+sistema operativo las comparte (copy-on-write) y la memoria no crece
+linealmente con la cantidad de workers.
+
+Para que las páginas sigan compartidas:
+- el formato compacto abre los arreglos con ``mmap`` de solo lectura y el
+  motor de inferencia marca los suyos como no escribibles
+- antes del fork se ejecuta ``gc.freeze()``: el recolector de basura no vuelve
+  a recorrer (y por lo tanto a escribir) los objetos del modelo
+
+Cada worker se recicla después de ``WORKER_MAX_REQUESTS`` peticiones (para
+acotar lo que crecen PIL y pdf2image) y el padre crea uno nuevo a partir del
+mismo estado precargado. Un worker que tiene archivos de ``/jobs`` en curso
+espera a terminarlos antes de salir; si un worker termina con error, el padre
+devuelve a la cola sus archivos sin terminar y se los pasa al reemplazo.
+
+``/train`` y ``/model/reload`` cambian el modelo del worker que atiende la
+petición y el manifiesto; los demás revisan el manifiesto cada
+``MODEL_CHECK_INTERVAL`` segundos y cargan la versión activa si cambió.
+
+Sin ``os.fork`` (Windows) se inicia un solo proceso, como ``run_server.py``.
+"""
+import asyncio
+import gc
+import logging
+import os
+import random
+import signal
+import socket
+import sys
+import time
+from typing import Dict, List, Optional
+
+import uvicorn
+
+logger = logging.getLogger(__name__)
+
+# Procesos worker que atienden peticiones (1 = un solo proceso, sin fork)
+WORKERS = int(os.getenv("ML_WORKERS", "1"))
+
+# Peticiones tras las que un worker se recicla (0 = nunca)
+WORKER_MAX_REQUESTS = int(os.getenv("WORKER_MAX_REQUESTS", "0"))
+
+# Variación aleatoria del límite para que los workers no se reciclen a la vez
+WORKER_MAX_REQUESTS_JITTER = int(os.getenv("WORKER_MAX_REQUESTS_JITTER", "0"))
+
+# Segundos entre revisiones del manifiesto de modelos en cada worker (0 = no revisar)
+MODEL_CHECK_INTERVAL = float(os.getenv("MODEL_CHECK_INTERVAL", "1"))
+
+# uvicorn llama a on_tick cada 0.1 segundos
+_TICK_SECONDS = 0.1
+
+# Un worker que termina antes de este tiempo se considera un fallo de arranque
+# y se espera un segundo antes de reemplazarlo
+_MIN_WORKER_SECONDS = 1.0
+
+
+class RecyclingServer(uvicorn.Server):
+    """
+    Servidor de un worker que termina al atender ``max_requests`` peticiones,
+    pero solo cuando no le quedan trabajos de ``/jobs`` encolados o en curso.
+    Entre peticiones sigue la versión activa del manifiesto de modelos.
+    """
+
+    def __init__(self, config: uvicorn.Config, max_requests: int = 0):
+        super().__init__(config)
+        self.max_requests = max_requests
+        self._check_ticks = max(1, round(MODEL_CHECK_INTERVAL / _TICK_SECONDS))
+        self._manifest_mtime: Optional[float] = None
+
+    async def on_tick(self, counter: int) -> bool:
+        if await super().on_tick(counter):
+            return True
+        if MODEL_CHECK_INTERVAL > 0 and counter % self._check_ticks == 0:
+            await self._check_model()
+        if self.max_requests and self.server_state.total_requests >= self.max_requests:
+            from jobs import job_manager
+            return job_manager.idle()
+        return False
+
+    async def _check_model(self):
+        """Carga la versión activa si el manifiesto cambió desde la última revisión"""
+        from classifier_service import get_classifier
+
+        classifier = get_classifier()
+        try:
+            mtime = os.stat(classifier.manifest_path).st_mtime
+        except OSError:
+            return
+        if mtime == self._manifest_mtime:
+            return
+        try:
+            # La carga lee el modelo de disco: fuera del event loop
+            version = await asyncio.to_thread(classifier.refresh_active)
+        except Exception:
+            logger.exception(f"El worker {os.getpid()} no pudo cargar la versión activa del modelo")
+            return
+        if version is not None:
+            logger.info(f"Worker {os.getpid()}: modelo {version} activado desde el manifiesto")
+        if classifier.model_version == classifier.read_manifest()["active"]:
+            self._manifest_mtime = mtime
+
+
+def preload():
+    """
+    Carga en el proceso padre lo que los workers van a compartir y congela
+    los objetos existentes para el recolector de basura
+    """
+    from classifier_service import get_classifier
+
+    get_classifier()
+    gc.collect()
+    gc.freeze()
+
+
+def _refresh_model():
+    """
+    Un worker nuevo hereda el modelo que cargó el padre al iniciar; si desde
+    entonces se activó otra versión (``/train``, ``/model/reload``), la carga
+    """
+    from classifier_service import get_classifier
+
+    get_classifier().refresh_active()
+
+
+def _configure_worker(workers: int, recovered: Optional[list]):
+    """Ajustes dentro del worker recién creado, antes de atender peticiones"""
+    from extraction_executor import extraction_executor
+    from jobs import job_manager
+
+    random.seed()
+    # Los procesos de OCR se reparten entre los workers en lugar de crear
+    # un pool de un proceso por núcleo en cada uno
+    if not os.getenv("OCR_WORKERS"):
+        extraction_executor.max_workers = max(1, (os.cpu_count() or 1) // workers)
+        if not os.getenv("OCR_MAX_INFLIGHT"):
+            extraction_executor.max_inflight = extraction_executor.max_workers * 2
+    job_manager.recovered = recovered or []
+    _refresh_model()
+
+
+def _run_worker(app, sock: socket.socket, workers: int, max_requests: int,
+                recovered: Optional[list], log_level: str):
+    signal.signal(signal.SIGINT, signal.SIG_DFL)
+    signal.signal(signal.SIGTERM, signal.SIG_DFL)
+    try:
+        _configure_worker(workers, recovered)
+        if max_requests and WORKER_MAX_REQUESTS_JITTER:
+            max_requests += random.randint(0, WORKER_MAX_REQUESTS_JITTER)
+        server = RecyclingServer(uvicorn.Config(app, log_level=log_level), max_requests)
+        server.run(sockets=[sock])
+    except BaseException:
+        logger.exception(f"El worker {os.getpid()} terminó con error")
+        code = 1
+    else:
+        code = 0
+    sys.stdout.flush()
+    sys.stderr.flush()
+    os._exit(code)
+
+
+def _bind(host: str, port: int) -> socket.socket:
+    sock = socket.socket(socket.AF_INET6 if ":" in host else socket.AF_INET)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    sock.bind((host, port))
+    sock.listen(2048)
+    sock.set_inheritable(True)
+    return sock
+
+
+def serve(app, host: str = "0.0.0.0", port: int = 8002, workers: int = WORKERS,
+          max_requests: int = WORKER_MAX_REQUESTS, log_level: str = "info"):
+    """
+    Atiende ``app`` con ``workers`` procesos creados con fork. Bloquea hasta
+    recibir SIGINT o SIGTERM.
+    """
+    if workers <= 1 or not hasattr(os, "fork"):
+        if workers > 1:
+            logger.warning("os.fork no está disponible en este sistema; se inicia un solo proceso")
+        # Sin padre que lo reemplace, un solo proceso no se recicla
+        uvicorn.run(app, host=host, port=port, log_level=log_level)
+        return
+
+    logging.basicConfig(level=log_level.upper(), format="%(levelname)s:     %(message)s")
+
+    preload()
+    sock = _bind(host, port)
+
+    # Los archivos de /jobs sin terminar se recuperan una sola vez y los retoma
+    # el primer worker; la conexión a SQLite no debe cruzar el fork
+    from jobs import job_manager
+    recovered = job_manager.recover()
+    job_manager.close_store()
+
+    children: Dict[int, float] = {}
+    stopping: List[int] = []
+
+    def spawn(recovered_files: Optional[list] = None):
+        pid = os.fork()
+        if pid == 0:
+            _run_worker(app, sock, workers, max_requests, recovered_files, log_level)
+        children[pid] = time.monotonic()
+
+    def stop(signum, frame):
+        stopping.append(signum)
+        for pid in list(children):
+            try:
+                os.kill(pid, signal.SIGTERM)
+            except ProcessLookupError:
+                pass
+
+    signal.signal(signal.SIGINT, stop)
+    signal.signal(signal.SIGTERM, stop)
+
+    logger.info(f"Iniciando {workers} workers en http://{host}:{port} (padre {os.getpid()})")
+    spawn(recovered)
+    for _ in range(workers - 1):
+        spawn()
+
+    while children:
+        try:
+            pid, status = os.wait()
+        except ChildProcessError:
+            break
+        started = children.pop(pid, None)
+        if started is None or stopping:
+            continue
+
+        code = os.waitstatus_to_exitcode(status)
+        lost = None
+        if code == 0:
+            logger.info(f"Worker {pid} reciclado")
+        else:
+            logger.warning(f"Worker {pid} terminó con código {code}; se reemplaza")
+            # Su cola de /jobs vivía en memoria: los archivos que tenía sin
+            # terminar vuelven a pending y los retoma el reemplazo
+            lost = job_manager.recover_worker(pid)
+            job_manager.close_store()
+            if lost:
+                logger.info(f"Se pasan {len(lost)} archivos de /jobs del worker {pid} a su reemplazo")
+            if time.monotonic() - started < _MIN_WORKER_SECONDS:
+                time.sleep(_MIN_WORKER_SECONDS)
+        spawn(lost)
+
+    sock.close()
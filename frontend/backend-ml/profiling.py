@@ -0,0 +1,224 @@
+"""
+Perfilado bajo demanda de peticiones individuales
+
+Con ``PROFILING_ENABLED=true`` se perfila una petición si trae la cabecera
+``X-Profile-Token`` con el valor de ``PROFILE_TOKEN``, o al azar con
+probabilidad ``PROFILE_SAMPLE_RATE``. El resultado se guarda en
+``PROFILE_DIR``:
+
+- ``PROFILE_MODE=cprofile``: archivo ``.prof`` de pstats
+  (``python -m pstats archivo.prof`` o snakeviz)
+- ``PROFILE_MODE=sampling``: muestreo de la pila cada ``PROFILE_INTERVAL_MS``
+  en formato "collapsed stacks" (``.collapsed``, para flamegraph.pl o speedscope)
+
+Se perfila el hilo del event loop, así que se ve la parte async de la
+petición (y lo que otras peticiones hagan en ese hilo mientras tanto), pero no
+el OCR en los procesos de extracción: para eso están las etapas de
+``/metrics``. Se perfila una petición a la vez; las demás pasan sin perfilar.
+
+Con el perfilado desactivado el middleware ni siquiera se instala.
+"""
+import cProfile
+import os
+import random
+import re
+import sys
+import threading
+from collections import Counter
+from datetime import datetime
+from pathlib import Path
+from typing import Dict, List, Optional
+
+from fastapi import APIRouter, Header, HTTPException
+from fastapi.responses import FileResponse
+
+# Activar el perfilado (instala el middleware y los endpoints /profiles)
+PROFILING_ENABLED = os.getenv("PROFILING_ENABLED", "false").lower() in ("1", "true", "yes")
+
+# Directorio donde se guardan los perfiles
+PROFILE_DIR = Path(os.getenv("PROFILE_DIR", "profiles"))
+
+# "cprofile" (pstats, costo alto pero exacto) o "sampling" (pila muestreada)
+PROFILE_MODE = os.getenv("PROFILE_MODE", "cprofile").lower()
+
+# Fracción de peticiones que se perfilan al azar (0 = solo con la cabecera)
+PROFILE_SAMPLE_RATE = float(os.getenv("PROFILE_SAMPLE_RATE", "0"))
+
+# Valor de X-Profile-Token que pide perfilar una petición y da acceso a
+# /profiles (vacío = la cabecera no dispara perfiles y /profiles queda abierto)
+PROFILE_TOKEN = os.getenv("PROFILE_TOKEN", "")
+
+# Intervalo de muestreo en modo "sampling"
+PROFILE_INTERVAL_MS = float(os.getenv("PROFILE_INTERVAL_MS", "5"))
+
+# Perfiles que se conservan; al superarlos se borran los más viejos
+PROFILE_KEEP = int(os.getenv("PROFILE_KEEP", "100"))
+
+_TOKEN_HEADER = b"x-profile-token"
+
+# Un solo perfil a la vez: cProfile no admite dos activos en el mismo hilo
+_busy = threading.Lock()
+
+
+class StackSampler:
+    """Muestrea la pila de un hilo desde un hilo aparte"""
+
+    def __init__(self, thread_id: int, interval: float):
+        self.thread_id = thread_id
+        self.interval = interval
+        self.stacks: Counter = Counter()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="profile-sampler", daemon=True)
+
+    @staticmethod
+    def _frame_label(frame) -> str:
+        code = frame.f_code
+        return f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})"
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            stack = []
+            while frame is not None:
+                stack.append(self._frame_label(frame))
+                frame = frame.f_back
+            if stack:
+                self.stacks[";".join(reversed(stack))] += 1
+
+    def start(self):
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join()
+
+    def dump(self, path: Path):
+        with open(path, "w", encoding="utf-8") as f:
+            for stack, count in self.stacks.most_common():
+                f.write(f"{stack} {count}\n")
+
+
+class _Capture:
+    """Perfil de una petición con el modo configurado"""
+
+    def __init__(self, mode: str):
+        self.mode = mode
+        if mode == "sampling":
+            self._profiler = StackSampler(threading.get_ident(), PROFILE_INTERVAL_MS / 1000)
+        else:
+            self._profiler = cProfile.Profile()
+
+    @property
+    def extension(self) -> str:
+        return "collapsed" if self.mode == "sampling" else "prof"
+
+    def start(self):
+        if self.mode == "sampling":
+            self._profiler.start()
+        else:
+            self._profiler.enable()
+
+    def stop(self):
+        if self.mode == "sampling":
+            self._profiler.stop()
+        else:
+            self._profiler.disable()
+
+    def dump(self, path: Path):
+        if self.mode == "sampling":
+            self._profiler.dump(path)
+        else:
+            self._profiler.dump_stats(str(path))
+
+
+def _requested(scope) -> bool:
+    if PROFILE_TOKEN:
+        for name, value in scope.get("headers", ()):
+            if name == _TOKEN_HEADER:
+                return value.decode("latin-1") == PROFILE_TOKEN
+    return PROFILE_SAMPLE_RATE > 0 and random.random() < PROFILE_SAMPLE_RATE
+
+
+def _file_stem(scope) -> str:
+    slug = re.sub(r"[^A-Za-z0-9_-]+", "_", scope["path"]).strip("_")[:60] or "root"
+    timestamp = datetime.now().strftime("%Y%m%d-%H%M%S-%f")
+    return f"{timestamp}_{scope['method']}_{slug}"
+
+
+def _prune():
+    """Deja solo los PROFILE_KEEP perfiles más recientes"""
+    files = sorted(PROFILE_DIR.glob("*.*"), key=lambda path: path.stat().st_mtime, reverse=True)
+    for path in files[PROFILE_KEEP:]:
+        try:
+            path.unlink()
+        except OSError:
+            pass
+
+
+class ProfilingMiddleware:
+    """
+    Middleware ASGI que perfila las peticiones elegidas y agrega la cabecera
+    ``X-Profile-File`` con el nombre del perfil generado
+    """
+
+    def __init__(self, app):
+        self.app = app
+        PROFILE_DIR.mkdir(parents=True, exist_ok=True)
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not _requested(scope) or not _busy.acquire(blocking=False):
+            await self.app(scope, receive, send)
+            return
+
+        capture = _Capture(PROFILE_MODE)
+        filename = f"{_file_stem(scope)}.{capture.extension}"
+
+        async def send_with_profile(message):
+            if message["type"] == "http.response.start":
+                message["headers"] = list(message.get("headers", [])) + [
+                    (b"x-profile-file", filename.encode("latin-1"))
+                ]
+            await send(message)
+
+        capture.start()
+        try:
+            await self.app(scope, receive, send_with_profile)
+        finally:
+            capture.stop()
+            _busy.release()
+            capture.dump(PROFILE_DIR / filename)
+            _prune()
+
+
+def _check_token(token: Optional[str]):
+    if PROFILE_TOKEN and token != PROFILE_TOKEN:
+        raise HTTPException(status_code=403, detail="X-Profile-Token inválido")
+
+
+router = APIRouter()
+
+
+@router.get("/profiles")
+async def list_profiles(x_profile_token: Optional[str] = Header(None)) -> List[Dict]:
+    """Perfiles guardados, del más reciente al más viejo"""
+    _check_token(x_profile_token)
+    profiles = []
+    for path in PROFILE_DIR.glob("*.*"):
+        stat = path.stat()
+        profiles.append({
+            "name": path.name,
+            "format": "pstats" if path.suffix == ".prof" else "collapsed",
+            "size": stat.st_size,
+            "created_at": datetime.fromtimestamp(stat.st_mtime).isoformat(),
+        })
+    return sorted(profiles, key=lambda profile: profile["created_at"], reverse=True)
+
+
+@router.get("/profiles/{name}")
+async def download_profile(name: str, x_profile_token: Optional[str] = Header(None)):
+    """Descarga un perfil por nombre"""
+    _check_token(x_profile_token)
+    path = PROFILE_DIR / name
+    if os.path.basename(name) != name or not path.is_file():
+        raise HTTPException(status_code=404, detail=f"Perfil no encontrado: {name}")
+    return FileResponse(path, filename=name, media_type="application/octet-stream")
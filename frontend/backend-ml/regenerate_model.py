@@ -16,11 +16,12 @@ print("Regenerando modelo de clasificación...")
 print("=" * 60)
 print()
 
-# Crear instancia del clasificador
-# Esto automáticamente creará un nuevo modelo si no existe
+# Crear instancia del clasificador y publicar un modelo básico nuevo
+# como versión activa (las versiones anteriores quedan en models/)
 classifier = DocumentClassifier()
+classifier.create_basic_model()
 
-print("✅ Modelo regenerado exitosamente")
+print(f"✅ Modelo regenerado exitosamente (versión {classifier.model_version})")
 print()
 print("Categorías disponibles:")
 for i, category in enumerate(classifier.categories, 1):
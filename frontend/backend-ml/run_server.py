@@ -1,17 +1,5 @@
 """
-Scriptprint("=" * 60)
-print("EDMS ML API - Iniciando...")
-print("=" * 60)
-print()
-print("Directorio de trabajo:", os.getcwd())
-print()
-print("OCR completo disponible con Tesseract.")
-print("Soporta imágenes, PDFs y archivos de texto.")
-print()
-print("Servidor: http://localhost:8001")
-print("Documentación: http://localhost:8001/docs")
-print("=" * 60)
-print()el servidor ML Backend
+Script para iniciar el servidor ML Backend
 """
 import sys
 import os
@@ -21,6 +9,9 @@ script_dir = os.path.dirname(os.path.abspath(__file__))
 os.chdir(script_dir)
 sys.path.insert(0, script_dir)
 
+# Puerto configurable (lo usa benchmarks/startup.py para no chocar con un servidor en uso)
+PORT = int(os.getenv("ML_PORT", "8002"))
+
 print("=" * 60)
 print("EDMS ML API (Lite) - Iniciando...")
 print("=" * 60)
@@ -33,18 +24,21 @@ print()
 print("Para OCR de imágenes, instala Tesseract OCR:")
 print("https://github.com/UB-Mannheim/tesseract/wiki")
 print()
-print("Servidor: http://localhost:8002")
-print("Documentación: http://localhost:8002/docs")
+print(f"Servidor: http://localhost:{PORT}")
+print(f"Workers: {os.getenv('ML_WORKERS', '1')}")
+print(f"Documentación: http://localhost:{PORT}/docs")
 print("=" * 60)
 print()
 
 if __name__ == "__main__":
-    import uvicorn
+    import prefork
     from main import app
     
-    uvicorn.run(
+    # Con ML_WORKERS > 1 el modelo se carga una vez y se comparte entre los
+    # workers (ver prefork.py); con 1 es un solo proceso de uvicorn
+    prefork.serve(
         app,
         host="0.0.0.0",
-        port=8002,
+        port=PORT,
         log_level="info"
     )
@@ -0,0 +1,200 @@
+"""
+Pool de instancias de Tesseract residentes en memoria (vía tesserocr)
+
+``pytesseract`` lanza un proceso ``tesseract`` por imagen y le pasa la imagen
+por un archivo temporal; en páginas cortas la mayor parte del tiempo se va en
+cargar los datos de idioma. Con ``OCR_ENGINE=tesserocr`` cada proceso mantiene
+``TESSERACT_POOL_SIZE`` instancias de la API de Tesseract con el idioma ya
+cargado, y las imágenes se les pasan en memoria.
+
+tesserocr es una dependencia opcional (requiere libtesseract); si no está
+instalada, ``ocr_service`` sigue usando pytesseract.
+"""
+import logging
+import os
+import queue
+import threading
+from contextlib import contextmanager
+from typing import Dict, Iterator, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+# Instancias de Tesseract por proceso (cada una es una página en curso a la vez)
+TESSERACT_POOL_SIZE = int(os.getenv("TESSERACT_POOL_SIZE", "2"))
+
+# Páginas tras las que una instancia se recrea, para acotar la memoria que
+# Tesseract va acumulando (0 = nunca)
+TESSERACT_MAX_USES = int(os.getenv("TESSERACT_MAX_USES", "1000"))
+
+# Directorio de tessdata (vacío = el que detecte tesserocr)
+TESSDATA_PREFIX = os.getenv("TESSDATA_PREFIX", "")
+
+
+def tesserocr_available() -> bool:
+    try:
+        import tesserocr  # noqa: F401
+        return True
+    except ImportError:
+        return False
+
+
+class TesseractWorker:
+    """Una instancia de la API de Tesseract con el idioma cargado"""
+
+    def __init__(self, lang: str):
+        import tesserocr
+
+        self.lang = lang
+        self.uses = 0
+        kwargs = {"lang": lang}
+        if TESSDATA_PREFIX:
+            kwargs["path"] = TESSDATA_PREFIX
+        self._api = tesserocr.PyTessBaseAPI(**kwargs)
+
+    def recognize(self, image) -> Tuple[str, List[int]]:
+        """
+        Reconoce una imagen PIL
+
+        Returns:
+            Tupla con (texto, confianza de cada palabra de 0 a 100)
+        """
+        self.uses += 1
+        try:
+            self._api.SetImage(image)
+            return self._api.GetUTF8Text(), list(self._api.AllWordConfidences())
+        finally:
+            # Libera la imagen y los resultados, pero no el idioma cargado
+            self._api.Clear()
+
+    def healthy(self) -> bool:
+        """La instancia sigue inicializada con el idioma esperado"""
+        try:
+            return self._api.GetInitLanguagesAsString() == self.lang
+        except Exception:
+            return False
+
+    def close(self):
+        try:
+            self._api.End()
+        except Exception:
+            pass
+
+
+class TesseractPool:
+    """
+    Pool de ``TesseractWorker`` para un idioma
+
+    Las instancias se crean a demanda hasta ``size``. Al devolver una
+    instancia se verifica su estado: si falló, perdió la inicialización o
+    alcanzó ``max_uses``, se descarta y la próxima petición crea otra.
+    """
+
+    def __init__(self, lang: str, size: int = TESSERACT_POOL_SIZE,
+                 max_uses: int = TESSERACT_MAX_USES):
+        self.lang = lang
+        self.size = max(1, size)
+        self.max_uses = max_uses
+        self._idle: "queue.LifoQueue[TesseractWorker]" = queue.LifoQueue()
+        self._lock = threading.Lock()
+        self._created = 0
+        self._slots = threading.BoundedSemaphore(self.size)
+        self.pages = 0
+        self.recycled = 0
+        self.failures = 0
+
+    def _checkout(self) -> TesseractWorker:
+        self._slots.acquire()
+        try:
+            return self._idle.get_nowait()
+        except queue.Empty:
+            pass
+
+        try:
+            worker = TesseractWorker(self.lang)
+        except Exception:
+            self._slots.release()
+            raise
+        with self._lock:
+            self._created += 1
+        logger.info(f"Instancia de Tesseract creada (lang={self.lang}, pid={os.getpid()})")
+        return worker
+
+    def _checkin(self, worker: TesseractWorker, failed: bool):
+        discard = failed or not worker.healthy() or (
+            self.max_uses > 0 and worker.uses >= self.max_uses
+        )
+        if discard:
+            worker.close()
+            with self._lock:
+                self.recycled += 1
+        else:
+            self._idle.put(worker)
+        self._slots.release()
+
+    @contextmanager
+    def worker(self) -> Iterator[TesseractWorker]:
+        """Presta una instancia por la duración del bloque"""
+        worker = self._checkout()
+        failed = False
+        try:
+            yield worker
+        except Exception:
+            failed = True
+            with self._lock:
+                self.failures += 1
+            raise
+        finally:
+            self._checkin(worker, failed)
+
+    def recognize(self, image) -> Tuple[str, List[int]]:
+        with self.worker() as worker:
+            result = worker.recognize(image)
+        with self._lock:
+            self.pages += 1
+        return result
+
+    def warm_up(self):
+        """Crea todas las instancias por adelantado (carga de idioma incluida)"""
+        workers = [self._checkout() for _ in range(self.size)]
+        for worker in workers:
+            self._checkin(worker, failed=False)
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {
+                "size": self.size,
+                "idle": self._idle.qsize(),
+                "created": self._created,
+                "pages": self.pages,
+                "recycled": self.recycled,
+                "failures": self.failures,
+            }
+
+    def close(self):
+        while True:
+            try:
+                self._idle.get_nowait().close()
+            except queue.Empty:
+                break
+
+
+_pools: Dict[str, TesseractPool] = {}
+_pools_lock = threading.Lock()
+
+
+def get_pool(lang: str) -> TesseractPool:
+    """Pool del proceso actual para ``lang`` (se crea en el primer uso)"""
+    pool = _pools.get(lang)
+    if pool is None:
+        with _pools_lock:
+            pool = _pools.get(lang)
+            if pool is None:
+                pool = _pools[lang] = TesseractPool(lang)
+    return pool
+
+
+def pool_stats() -> Optional[Dict[str, Dict[str, int]]]:
+    """Contadores de los pools de este proceso, o None si no se creó ninguno"""
+    if not _pools:
+        return None
+    return {lang: pool.stats() for lang, pool in _pools.items()}
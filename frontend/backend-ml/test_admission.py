@@ -0,0 +1,166 @@
+"""
+Tests del control de admisión: límite en curso, cola FIFO y rechazos
+"""
+import asyncio
+import json
+
+import pytest
+
+from admission import AdmissionMiddleware, Gate, Rejected, parse_limits
+
+
+def test_gate_admits_up_to_limit_then_queues_and_rejects():
+    async def scenario():
+        gate = Gate("/ocr", limit=2, queue_size=1)
+        await gate.acquire(1)
+        await gate.acquire(1)
+        assert gate.active == 2
+
+        queued = asyncio.create_task(gate.acquire(1))
+        await asyncio.sleep(0)
+        assert not queued.done()
+
+        # Cola llena: 429 inmediato
+        with pytest.raises(Rejected) as rejected:
+            await gate.acquire(1)
+        assert rejected.value.status == 429
+        assert rejected.value.retry_after >= 1
+
+        # Al liberar, el lugar pasa al de la cola sin bajar active
+        gate.release(0.5)
+        await queued
+        assert gate.active == 2
+
+        gate.release()
+        gate.release()
+        assert gate.active == 0
+
+    asyncio.run(scenario())
+
+
+def test_gate_hands_off_in_fifo_order():
+    async def scenario():
+        gate = Gate("/ocr", limit=1, queue_size=3)
+        await gate.acquire(1)
+        order = []
+
+        async def wait(name):
+            await gate.acquire(1)
+            order.append(name)
+
+        tasks = [asyncio.create_task(wait(name)) for name in "abc"]
+        await asyncio.sleep(0)
+        for _ in tasks:
+            gate.release()
+            await asyncio.sleep(0)
+        await asyncio.gather(*tasks)
+        assert order == ["a", "b", "c"]
+
+    asyncio.run(scenario())
+
+
+def test_gate_times_out_with_503():
+    async def scenario():
+        gate = Gate("/ocr", limit=1, queue_size=1)
+        await gate.acquire(1)
+        with pytest.raises(Rejected) as rejected:
+            await gate.acquire(0.01)
+        assert rejected.value.status == 503
+        # El que venció no queda en la cola
+        assert not gate._waiters
+
+    asyncio.run(scenario())
+
+
+def test_gate_drops_cancelled_waiter():
+    async def scenario():
+        gate = Gate("/ocr", limit=1, queue_size=1)
+        await gate.acquire(1)
+        queued = asyncio.create_task(gate.acquire(1))
+        await asyncio.sleep(0)
+        queued.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await queued
+
+        # El lugar liberado no se pierde en el cancelado
+        assert not gate._waiters
+        gate.release()
+        assert gate.active == 0
+        await gate.acquire(1)
+
+    asyncio.run(scenario())
+
+
+def test_retry_after_grows_with_duration_and_queue():
+    gate = Gate("/ocr", limit=2, queue_size=4)
+    assert gate.retry_after() == 1
+
+    gate.active = 1
+    gate.release(10)
+    assert gate.retry_after() == 5
+
+
+def test_parse_limits():
+    assert parse_limits("/ocr=4:16, /bulk-process=1,") == {
+        "/ocr": (4, 16),
+        "/bulk-process": (1, 4),
+    }
+    assert parse_limits("") == {}
+
+
+async def _ok_app(scope, receive, send):
+    await send({"type": "http.response.start", "status": 200, "headers": []})
+    await send({"type": "http.response.body", "body": b"ok"})
+
+
+async def _call(app, method, path):
+    messages = []
+
+    async def receive():
+        return {"type": "http.request", "body": b"", "more_body": False}
+
+    async def send(message):
+        messages.append(message)
+
+    await app({"type": "http", "method": method, "path": path, "headers": []}, receive, send)
+    return messages
+
+
+def test_middleware_rejects_with_retry_after():
+    async def scenario():
+        started = asyncio.Event()
+        finish = asyncio.Event()
+
+        async def slow_app(scope, receive, send):
+            started.set()
+            await finish.wait()
+            await _ok_app(scope, receive, send)
+
+        app = AdmissionMiddleware(slow_app, limits={"/ocr": (1, 0)}, queue_timeout=1)
+        running = asyncio.create_task(_call(app, "POST", "/ocr"))
+        await started.wait()
+
+        start, body = await _call(app, "POST", "/ocr")
+        headers = dict(start["headers"])
+        assert start["status"] == 429
+        assert int(headers[b"retry-after"]) >= 1
+        assert headers[b"connection"] == b"close"
+        assert "detail" in json.loads(body["body"])
+
+        finish.set()
+        assert (await running)[0]["status"] == 200
+        assert app.gates()["/ocr"].active == 0
+
+    asyncio.run(scenario())
+
+
+def test_middleware_passes_other_requests_through():
+    async def scenario():
+        app = AdmissionMiddleware(_ok_app, limits={"/ocr": (1, 0)})
+        app.gates()["/ocr"].active = 1
+
+        for method, path in (("GET", "/ocr"), ("POST", "/classify")):
+            start, _ = await _call(app, method, path)
+            assert start["status"] == 200
+
+    asyncio.run(scenario())
@@ -0,0 +1,117 @@
+"""
+Tests de la lectura de lotes ZIP y tar: validación y límites por entrada
+"""
+import io
+import os
+import tarfile
+import zipfile
+
+import pytest
+
+import archives
+
+PDF = b"%PDF-1.7\n" + b"0" * 100
+TEXT = "Factura número 0001, total con IVA".encode("utf-8")
+
+
+def _zip(entries, compression=zipfile.ZIP_DEFLATED):
+    buffer = io.BytesIO()
+    with zipfile.ZipFile(buffer, "w", compression) as archive:
+        for name, data in entries.items():
+            archive.writestr(name, data)
+    buffer.seek(0)
+    return buffer
+
+
+def _tar(entries):
+    buffer = io.BytesIO()
+    with tarfile.open(fileobj=buffer, mode="w:gz") as archive:
+        for name, data in entries.items():
+            info = tarfile.TarInfo(name)
+            info.size = len(data)
+            archive.addfile(info, io.BytesIO(data))
+    buffer.seek(0)
+    return buffer
+
+
+def _by_name(fileobj):
+    return {entry.name: entry for entry in archives.iter_entries(fileobj)}
+
+
+@pytest.mark.parametrize("build", [_zip, _tar])
+def test_valid_and_invalid_entries(build):
+    entries = _by_name(build({
+        "docs/factura.txt": TEXT,
+        "docs/contrato.pdf": PDF,
+        "docs/falso.pdf": b"\x89PNG\r\n\x1a\n",
+        "docs/programa.exe": b"MZ",
+    }))
+
+    assert entries["docs/factura.txt"].source == TEXT
+    assert entries["docs/factura.txt"].mime_type == "text/plain"
+    assert entries["docs/contrato.pdf"].source == PDF
+    assert entries["docs/contrato.pdf"].error is None
+    # Los rechazos se reportan por entrada sin cortar el lote
+    assert "no corresponde" in entries["docs/falso.pdf"].error
+    assert entries["docs/falso.pdf"].source is None
+    assert "no soportado" in entries["docs/programa.exe"].error
+
+
+def test_skips_hidden_files_and_macos_metadata():
+    entries = _by_name(_zip({
+        "factura.txt": TEXT,
+        ".DS_Store": b"\x00",
+        "docs/.oculto.txt": TEXT,
+        "__MACOSX/docs/._factura.txt": b"\x00",
+    }))
+    assert list(entries) == ["factura.txt"]
+
+
+def test_entry_over_limit_is_rejected_without_reading(monkeypatch):
+    monkeypatch.setattr(archives, "ARCHIVE_MAX_ENTRY_BYTES", 1024)
+    entries = _by_name(_zip({"grande.txt": b"a" * 2048, "chico.txt": TEXT}))
+
+    assert "1 KB" in entries["grande.txt"].error
+    assert entries["chico.txt"].source == TEXT
+
+
+def test_total_uncompressed_size_is_capped(monkeypatch):
+    monkeypatch.setattr(archives, "ARCHIVE_MAX_TOTAL_BYTES", 3000)
+    entries = archives.iter_entries(_zip({f"{i}.txt": b"a" * 1024 for i in range(4)}))
+
+    assert next(entries).error is None
+    assert next(entries).error is None
+    with pytest.raises(ValueError, match="descomprimido"):
+        next(entries)
+
+
+def test_entry_count_is_capped(monkeypatch):
+    monkeypatch.setattr(archives, "ARCHIVE_MAX_ENTRIES", 2)
+    with pytest.raises(ValueError, match="2 entradas"):
+        list(archives.iter_entries(_zip({f"{i}.txt": TEXT for i in range(3)})))
+
+
+def test_corrupt_entry_is_reported_and_the_rest_still_read():
+    buffer = _zip({"roto.txt": b"contenido original", "sano.txt": TEXT}, zipfile.ZIP_STORED)
+    data = buffer.getvalue().replace(b"contenido original", b"contenido alterado")
+
+    entries = _by_name(io.BytesIO(data))
+    assert "No se pudo leer" in entries["roto.txt"].error
+    assert entries["sano.txt"].source == TEXT
+
+
+def test_not_an_archive():
+    with pytest.raises(ValueError):
+        archives.detect_format(io.BytesIO(PDF))
+
+
+def test_large_entry_spills_to_disk_and_cleans_up(monkeypatch):
+    monkeypatch.setattr(archives, "UPLOAD_MEMORY_MAX_BYTES", 1024)
+    data = PDF + b"0" * 4096
+    (entry,) = archives.iter_entries(_zip({"grande.pdf": data}))
+
+    assert isinstance(entry.source, str) and entry.source.endswith(".pdf")
+    with open(entry.source, "rb") as f:
+        assert f.read() == data
+    entry.cleanup()
+    assert not os.path.exists(entry.source)
@@ -0,0 +1,111 @@
+"""
+Tests del motor de inferencia NumPy y del formato compacto
+
+El motor tiene que reproducir bit a bit al pipeline de sklearn, tanto
+compilado desde el pipeline como desde el formato compacto.
+"""
+import numpy as np
+import pytest
+
+import compact_model
+import inference_engine
+from classifier_service import DocumentClassifier, ModelState
+
+TEXTS = [
+    "Contrato de arrendamiento entre las partes, con cláusulas de rescisión",
+    "Factura número 0001-00012345, total con IVA incluido a pagar en 30 días",
+    "Informe trimestral de ventas con análisis por región",
+    "Manual de usuario: instalación, configuración y preguntas frecuentes",
+    "Política de privacidad y tratamiento de datos personales",
+    "remito de mercadería entregada contra orden de compra",
+    "xyzzy plugh",
+    "",
+]
+
+
+@pytest.fixture(scope="module")
+def classifier(tmp_path_factory):
+    # models/ y el corpus se resuelven respecto del directorio actual
+    with pytest.MonkeyPatch.context() as monkeypatch:
+        monkeypatch.chdir(tmp_path_factory.mktemp("models"))
+        yield DocumentClassifier()
+
+
+@pytest.fixture(scope="module")
+def model(classifier):
+    texts, labels = classifier.basic_training_data()
+    pipeline = DocumentClassifier.create_vocabulary_pipeline()
+    pipeline.fit([classifier.preprocess_text(text) for text in texts], labels)
+    return pipeline
+
+
+@pytest.fixture(scope="module")
+def texts(classifier):
+    return [classifier.preprocess_text(text) for text in TEXTS]
+
+
+def _engine_proba(engine, texts):
+    return engine.predict_proba([engine.transform(text) for text in texts])
+
+
+def test_engine_matches_sklearn_bit_for_bit(model, texts):
+    engine = inference_engine.InferenceEngine.from_pipeline(model)
+
+    assert np.array_equal(_engine_proba(engine, texts), model.predict_proba(texts))
+    assert list(engine.classes) == list(model.classes_)
+    assert engine.matches(model, texts)
+
+
+def test_engine_rows_match_vectorizer(model, texts):
+    engine = inference_engine.InferenceEngine.from_pipeline(model)
+    features = model.steps[0][1].transform(texts)
+
+    for r, text in enumerate(texts):
+        columns, values = engine.transform(text)
+        start, end = features.indptr[r], features.indptr[r + 1]
+        assert np.array_equal(columns, features.indices[start:end])
+        assert np.array_equal(values, features.data[start:end])
+
+
+def test_compact_format_round_trip(model, texts, tmp_path):
+    compact_model.export_compact(model, str(tmp_path))
+
+    engine = inference_engine.InferenceEngine.from_compact(str(tmp_path))
+    assert np.array_equal(_engine_proba(engine, texts), model.predict_proba(texts))
+
+    loaded = compact_model.load_pipeline(str(tmp_path))
+    assert np.array_equal(loaded.predict_proba(texts), model.predict_proba(texts))
+    assert list(loaded.predict(texts)) == list(model.predict(texts))
+
+
+def test_compact_online_model_round_trip(classifier, texts, tmp_path):
+    online = DocumentClassifier.create_online_pipeline()
+    classifier._partial_fit(online, *classifier.basic_training_data())
+    compact_model.export_compact(online, str(tmp_path))
+
+    loaded = compact_model.load_pipeline(str(tmp_path))
+    assert np.array_equal(loaded.predict_proba(texts), online.predict_proba(texts))
+
+
+def test_compile_pipeline_rejects_online_model(classifier, texts):
+    online = DocumentClassifier.create_online_pipeline()
+    classifier._partial_fit(online, *classifier.basic_training_data())
+
+    assert inference_engine.compile_pipeline(online, texts) is None
+
+
+def test_compile_pipeline_rejects_mismatch(model, texts, monkeypatch):
+    # Un motor que no reproduce a sklearn se descarta
+    monkeypatch.setattr(inference_engine.InferenceEngine, "predict_proba",
+                        lambda self, rows: np.zeros((len(list(rows)), len(self.classes))))
+    assert inference_engine.compile_pipeline(model, texts) is None
+
+
+def test_classifier_engine_and_sklearn_paths_agree(classifier, monkeypatch):
+    state = classifier._state
+    assert state.engine is not None
+    with_engine = classifier.analyze_documents(TEXTS)
+
+    # Misma versión con otro nombre (no comparte la caché) y sin motor
+    monkeypatch.setattr(classifier, "_state", ModelState(state.model, f"{state.version}-sklearn"))
+    assert classifier.analyze_documents(TEXTS) == with_engine
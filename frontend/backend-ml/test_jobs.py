@@ -0,0 +1,177 @@
+"""
+Tests de la persistencia y la cola de trabajos masivos
+"""
+import asyncio
+import sqlite3
+
+import pytest
+
+import jobs
+from jobs import JobManager, JobStore
+
+FILES = [("a.txt", "text/plain", "/tmp/a.txt"), ("b.pdf", "application/pdf", "/tmp/b.pdf")]
+
+
+@pytest.fixture
+def db_path(tmp_path):
+    return str(tmp_path / "jobs.db")
+
+
+@pytest.fixture
+def store(db_path):
+    store = JobStore(db_path)
+    yield store
+    store.close()
+
+
+def test_job_completes_when_every_file_finishes(store):
+    store.create_job("j1", FILES, [{"lang": "spa"}, {}])
+    job = store.get_job("j1")
+    assert (job["status"], job["total"], job["processed"], job["failed"]) == ("queued", 2, 0, 0)
+    assert [f["status"] for f in job["files"]] == ["pending", "pending"]
+
+    store.start_file("j1", 0)
+    assert store.get_job("j1")["status"] == "running"
+    assert store.finish_file("j1", 0, True, {"success": True, "text": "ñandú"}) == "running"
+    assert store.finish_file("j1", 1, False, {"success": False, "error": "x"}) == "completed"
+
+    job = store.get_job("j1")
+    assert (job["status"], job["processed"], job["failed"]) == ("completed", 1, 1)
+    assert job["files"][0]["result"] == {"success": True, "text": "ñandú"}
+    assert store.get_job("j1", include_results=False)["files"][0]["result"] is None
+    assert store.get_results("j1", [0, 1]) == {
+        0: {"success": True, "text": "ñandú"},
+        1: {"success": False, "error": "x"},
+    }
+    assert store.get_job("missing") is None
+
+
+def test_jobs_persist_across_reopen(db_path):
+    store = JobStore(db_path)
+    store.create_job("j1", FILES)
+    store.finish_file("j1", 0, True, {"success": True})
+    store.close()
+
+    reopened = JobStore(db_path)
+    try:
+        job = reopened.get_job("j1")
+        assert (job["processed"], [f["status"] for f in job["files"]]) == (1, ["done", "pending"])
+    finally:
+        reopened.close()
+
+
+def test_pending_files_resets_running_and_keeps_options(store):
+    store.create_job("j1", FILES, [{"lang": "spa"}, {}])
+    store.start_file("j1", 0)
+
+    pending = store.pending_files()
+    assert pending == [
+        ("j1", 0, "/tmp/a.txt", "a.txt", "text/plain", {"lang": "spa"}),
+        ("j1", 1, "/tmp/b.pdf", "b.pdf", "application/pdf", {}),
+    ]
+    assert store.get_job("j1")["files"][0]["status"] == "pending"
+
+
+def test_pending_files_by_worker(store):
+    store.create_job("j1", FILES, worker=100)
+    store.create_job("j2", FILES[:1], worker=200)
+    store.start_file("j1", 0)
+    store.start_file("j2", 0)
+
+    assert [(job_id, idx) for job_id, idx, *_ in store.pending_files(worker=100)] == [("j1", 0), ("j1", 1)]
+    # Lo que tiene en curso otro worker no se toca
+    assert store.get_job("j2")["files"][0]["status"] == "running"
+
+    store.assign_files([("j2", 0)], 100)
+    assert ("j2", 0) in [(job_id, idx) for job_id, idx, *_ in store.pending_files(worker=100)]
+
+
+def test_purge_finished_only_removes_old_completed_jobs(store, db_path):
+    store.create_job("old", FILES[:1])
+    store.finish_file("old", 0, True, {"success": True})
+    store.create_job("recent", FILES[:1])
+    store.finish_file("recent", 0, True, {"success": True})
+    store.create_job("unfinished", FILES[:1])
+
+    with sqlite3.connect(db_path) as conn:
+        conn.execute("UPDATE jobs SET updated_at = '2000-01-01T00:00:00' WHERE id IN ('old', 'unfinished')")
+
+    assert store.purge_finished(7) == ["old"]
+    assert store.get_job("old") is None
+    assert store.get_job("recent") is not None
+    assert store.get_job("unfinished") is not None
+    # Los archivos del trabajo se borran en cascada
+    assert all(job_id != "old" for job_id, *_ in store.pending_files())
+
+
+def _write_files(manager, job_id, names):
+    files = []
+    for name in names:
+        path = manager.job_dir(job_id) / name
+        path.write_text(name)
+        files.append((name, "text/plain", str(path)))
+    return files
+
+
+def test_manager_processes_submitted_job(store, tmp_path):
+    async def processor(path, filename, mime_type, options):
+        if filename == "bad.txt":
+            raise ValueError("archivo ilegible")
+        with open(path) as f:
+            return {"success": True, "text": f.read(), **options}
+
+    async def scenario():
+        manager = JobManager(store, workers=2, jobs_dir=tmp_path / "jobs")
+        await manager.start(processor)
+        job_id = manager.new_job_id()
+        files = _write_files(manager, job_id, ["one.txt", "bad.txt", "two.txt"])
+        await manager.submit(job_id, files, [{"lang": "spa"}, {}, {}])
+
+        while (await manager.get(job_id))["status"] != "completed":
+            await manager.wait_for_change(1)
+        assert manager.idle()
+        await manager.stop()
+        return job_id
+
+    job_id = asyncio.run(scenario())
+    job = store.get_job(job_id)
+    assert (job["processed"], job["failed"]) == (2, 1)
+    assert job["files"][0]["result"] == {"success": True, "text": "one.txt", "lang": "spa"}
+    assert job["files"][1]["result"]["error"] == "archivo ilegible"
+    # El directorio del trabajo se borra al terminar
+    assert not (tmp_path / "jobs" / job_id).exists()
+
+
+def test_manager_resumes_unfinished_files(store, tmp_path, monkeypatch):
+    monkeypatch.setattr(jobs, "JOB_RETENTION_DAYS", 0)
+    manager = JobManager(store, workers=1, jobs_dir=tmp_path / "jobs")
+    (tmp_path / "jobs").mkdir()
+    job_id = manager.new_job_id()
+    files = _write_files(manager, job_id, ["one.txt", "two.txt"])
+    store.create_job(job_id, files, worker=4242)
+    store.start_file(job_id, 0)
+
+    # El padre recupera la cola del worker caído antes de dársela a otro
+    assert [idx for _, idx, *_ in manager.recover_worker(4242)] == [0, 1]
+
+    processed = []
+
+    async def processor(path, filename, mime_type, options):
+        processed.append(filename)
+        return {"success": True}
+
+    async def scenario():
+        await manager.start(processor)
+        while (await manager.get(job_id))["status"] != "completed":
+            await manager.wait_for_change(1)
+        await manager.stop()
+
+    asyncio.run(scenario())
+    assert processed == ["one.txt", "two.txt"]
+    assert store.get_job(job_id)["processed"] == 2
+
+
+def test_submit_requires_start(store, tmp_path):
+    manager = JobManager(store, workers=1, jobs_dir=tmp_path)
+    with pytest.raises(RuntimeError):
+        asyncio.run(manager.submit("j1", FILES))
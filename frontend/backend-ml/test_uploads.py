@@ -0,0 +1,159 @@
+"""
+Tests de la validación de uploads: tipo por contenido y límites de tamaño
+"""
+import asyncio
+import io
+import json
+
+import pytest
+from fastapi import HTTPException, UploadFile
+from starlette.datastructures import Headers
+
+import uploads
+from uploads import UploadLimitMiddleware, content_error
+
+PDF = b"%PDF-1.7\n" + b"0" * 100
+PNG = b"\x89PNG\r\n\x1a\n" + b"\x00" * 100
+
+
+class _RecordingFile(io.BytesIO):
+    """BytesIO que registra cuántos bytes se piden en cada lectura"""
+
+    def __init__(self, data):
+        super().__init__(data)
+        self.reads = []
+
+    def read(self, size=-1):
+        self.reads.append(size)
+        return super().read(size)
+
+
+def _upload(data, mime_type, filename="doc"):
+    return UploadFile(_RecordingFile(data), filename=filename,
+                      headers=Headers({"content-type": mime_type}))
+
+
+@pytest.mark.parametrize("head, mime_type", [
+    (PDF, "application/pdf"),
+    (b"garbage\n" + PDF, "application/pdf"),
+    (PNG, "image/png"),
+    (b"\xff\xd8\xff\xe0JFIF", "image/jpeg"),
+    (b"RIFF\x00\x00\x00\x00WEBPVP8 ", "image/webp"),
+    ("Contrato de arrendamiento".encode("utf-8"), "text/plain"),
+])
+def test_content_error_accepts_matching_content(head, mime_type):
+    assert content_error(head, mime_type) is None
+
+
+@pytest.mark.parametrize("head, mime_type", [
+    (PNG, "application/pdf"),
+    (PDF, "image/png"),
+    (b"texto\x00binario", "text/plain"),
+])
+def test_content_error_rejects_mismatched_content(head, mime_type):
+    assert "no corresponde" in content_error(head, mime_type)
+
+
+def test_content_error_rejects_unsupported_type():
+    assert "no soportado" in content_error(PDF, "application/zip")
+
+
+def test_wrong_type_is_rejected_after_sniffing_only():
+    upload = _upload(PNG + b"\x00" * (1024 * 1024), "application/pdf")
+
+    with pytest.raises(HTTPException) as rejected:
+        asyncio.run(uploads._read_head(upload, 16 * 1024 * 1024, 0))
+
+    assert rejected.value.status_code == 415
+    assert upload.file.reads == [uploads._SNIFF_BYTES]
+
+
+def test_valid_upload_is_read_up_to_requested_size():
+    data = PDF + b"0" * (64 * 1024)
+    upload = _upload(data, "application/pdf")
+
+    head = asyncio.run(uploads._read_head(upload, 32 * 1024, 0))
+
+    assert head == data[:32 * 1024]
+    assert upload.file.reads == [uploads._SNIFF_BYTES, 32 * 1024 - uploads._SNIFF_BYTES]
+
+
+def test_read_head_rejects_oversized_upload():
+    upload = _upload(PDF + b"0" * (64 * 1024), "application/pdf")
+
+    with pytest.raises(HTTPException) as rejected:
+        asyncio.run(uploads._read_head(upload, 32 * 1024, 16 * 1024))
+    assert rejected.value.status_code == 413
+
+
+@pytest.mark.parametrize("size, text", [
+    (50 * 1024 * 1024, "50 MB"),
+    (1536 * 1024, "1.5 MB"),
+    (512 * 1024, "512 KB"),
+    (100, "100 bytes"),
+])
+def test_format_size(size, text):
+    assert uploads._format_size(size) == text
+
+
+def test_upload_source_keeps_small_files_in_memory(monkeypatch):
+    async def scenario():
+        monkeypatch.setattr(uploads, "_permits", asyncio.Semaphore(1))
+        async with uploads.upload_source(_upload(PDF, "application/pdf"), max_memory_bytes=1024) as source:
+            assert source == PDF
+
+        data = PDF + b"0" * 4096
+        async with uploads.upload_source(_upload(data, "application/pdf", "big.pdf"),
+                                         max_memory_bytes=1024) as source:
+            assert source.endswith(".pdf")
+            with open(source, "rb") as f:
+                assert f.read() == data
+        return source
+
+    path = asyncio.run(scenario())
+    # El temporal se borra al salir del bloque
+    assert not uploads.os.path.exists(path)
+
+
+def test_save_upload_removes_partial_file(tmp_path):
+    path = tmp_path / "upload.pdf"
+    upload = _upload(PDF + b"0" * (64 * 1024), "application/pdf")
+
+    with pytest.raises(HTTPException) as rejected:
+        asyncio.run(uploads.save_upload(upload, path, max_bytes=32 * 1024))
+    assert rejected.value.status_code == 413
+    assert not path.exists()
+
+
+async def _ok_app(scope, receive, send):
+    await send({"type": "http.response.start", "status": 200, "headers": []})
+    await send({"type": "http.response.body", "body": b"ok"})
+
+
+def _call(app, path, content_length, method="POST"):
+    messages = []
+
+    async def receive():
+        return {"type": "http.request", "body": b"", "more_body": False}
+
+    async def send(message):
+        messages.append(message)
+
+    scope = {"type": "http", "method": method, "path": path,
+             "headers": [(b"content-length", str(content_length).encode("latin-1"))]}
+    asyncio.run(app(scope, receive, send))
+    return messages
+
+
+def test_middleware_rejects_declared_body_over_limit():
+    app = UploadLimitMiddleware(_ok_app, max_bytes=512 * 1024)
+
+    start, body = _call(app, "/ocr", app.max_body + 1)
+    assert start["status"] == 413
+    assert dict(start["headers"])[b"connection"] == b"close"
+    assert json.loads(body["body"])["detail"].endswith("512 KB")
+
+    # El margen del multipart no se cuenta como exceso
+    assert _call(app, "/ocr", 512 * 1024 + 1)[0]["status"] == 200
+    assert _call(app, "/bulk-process", app.max_body + 1)[0]["status"] == 200
+    assert _call(app, "/ocr", app.max_body + 1, method="GET")[0]["status"] == 200
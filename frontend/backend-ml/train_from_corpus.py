@@ -0,0 +1,40 @@
+"""
+Script para entrenar el clasificador de forma incremental con un corpus grande
+
+Uso:
+    python train_from_corpus.py corpus.jsonl [ejemplos_por_bloque]
+
+El corpus es un archivo JSON Lines con un ejemplo por línea:
+    {"text": "factura número 0001 ...", "label": "Factura"}
+"""
+import sys
+import os
+
+# Asegurar que estamos en el directorio correcto
+script_dir = os.path.dirname(os.path.abspath(__file__))
+corpus_path = os.path.abspath(sys.argv[1]) if len(sys.argv) > 1 else None
+os.chdir(script_dir)
+sys.path.insert(0, script_dir)
+
+if not corpus_path:
+    print(__doc__)
+    sys.exit(1)
+
+from classifier_service import DocumentClassifier, TRAINING_CHUNK_SIZE
+
+chunk_size = int(sys.argv[2]) if len(sys.argv) > 2 else TRAINING_CHUNK_SIZE
+
+print("=" * 60)
+print("Entrenamiento incremental del clasificador")
+print("=" * 60)
+print()
+print(f"Corpus: {corpus_path}")
+print(f"Ejemplos por bloque: {chunk_size}")
+print()
+
+classifier = DocumentClassifier()
+total = classifier.train_from_corpus(corpus_path, chunk_size)
+
+print()
+print(f"✅ {total} ejemplos procesados")
+print("=" * 60)
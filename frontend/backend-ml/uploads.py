@@ -0,0 +1,308 @@
+"""
+Manejo de archivos subidos
+
+Antes cada endpoint copiaba el upload a ``temp_uploads/<uuid>``, el extractor
+lo volvía a leer desde disco y al final se borraba: dos pasadas completas por
+disco por documento. Ahora los archivos de hasta ``UPLOAD_MEMORY_MAX_MB`` se
+leen a memoria y se extraen desde los bytes; solo los más grandes se
+guardan en disco. Como cada upload en memoria ocupa hasta ese umbral, a lo
+sumo ``UPLOAD_MAX_INFLIGHT`` uploads se leen a la vez; los demás esperan su
+lugar antes de leer nada.
+
+También se valida el upload mientras se lee: los primeros bytes tienen que
+corresponder al tipo declarado (``%PDF-`` para un PDF, la firma de PNG, JPEG,
+etc. para una imagen) y la copia se corta apenas el archivo supera
+``UPLOAD_MAX_MB``. Un archivo rechazado cuesta unos pocos KB de lectura en
+lugar del archivo completo, y con ``UploadLimitMiddleware`` las peticiones
+que declaran un ``Content-Length`` mayor al límite se rechazan antes de que
+Starlette lea el cuerpo.
+"""
+import asyncio
+import json
+import os
+import threading
+import time
+import uuid
+from contextlib import asynccontextmanager
+from pathlib import Path
+from typing import AsyncIterator, Dict, Optional
+
+from fastapi import HTTPException, UploadFile
+from fastapi.concurrency import run_in_threadpool
+
+import metrics
+from ocr_service import Source
+
+# Directorio temporal para archivos
+UPLOAD_DIR = Path("temp_uploads")
+UPLOAD_DIR.mkdir(exist_ok=True)
+
+# Tamaño a partir del cual un upload se guarda en disco en lugar de memoria
+# (0 = siempre a disco, comportamiento original)
+UPLOAD_MEMORY_MAX_BYTES = int(float(os.getenv("UPLOAD_MEMORY_MAX_MB", "16")) * 1024 * 1024)
+
+# Uploads leídos a la vez en este proceso (0 = OCR_MAX_INFLIGHT): la memoria
+# de los uploads queda acotada a este valor × UPLOAD_MEMORY_MAX_MB
+UPLOAD_MAX_INFLIGHT = int(os.getenv("UPLOAD_MAX_INFLIGHT", "0"))
+
+# Tamaño máximo de un archivo subido (0 = sin límite)
+UPLOAD_MAX_BYTES = int(float(os.getenv("UPLOAD_MAX_MB", "50")) * 1024 * 1024)
+
+# Bloque de copia al volcar un upload grande a disco
+_CHUNK_SIZE = 1024 * 1024
+
+# Bytes del principio del upload con los que se reconoce el tipo de archivo
+_SNIFF_BYTES = 8 * 1024
+
+# Firmas de los formatos de imagen que abre PIL (WebP se reconoce aparte)
+_IMAGE_SIGNATURES = (
+    b"\x89PNG\r\n\x1a\n",   # PNG
+    b"\xff\xd8\xff",          # JPEG
+    b"GIF87a", b"GIF89a",     # GIF
+    b"BM",                    # BMP
+    b"II*\x00", b"MM\x00*",    # TIFF
+)
+
+# Margen para los bordes y cabeceras del multipart sobre el tamaño del archivo
+_MULTIPART_OVERHEAD = 64 * 1024
+
+
+class UploadStats:
+    """Contadores de uploads procesados en memoria, volcados a disco y rechazados"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.memory_files = 0
+        self.memory_bytes = 0
+        self.disk_files = 0
+        self.disk_bytes = 0
+        self.rejected_too_large = 0
+        self.rejected_type = 0
+
+    def record(self, size: int, in_memory: bool):
+        with self._lock:
+            if in_memory:
+                self.memory_files += 1
+                self.memory_bytes += size
+            else:
+                self.disk_files += 1
+                self.disk_bytes += size
+
+    def record_rejected(self, status: int):
+        with self._lock:
+            if status == 413:
+                self.rejected_too_large += 1
+            else:
+                self.rejected_type += 1
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {
+                "memory_threshold_bytes": UPLOAD_MEMORY_MAX_BYTES,
+                "max_bytes": UPLOAD_MAX_BYTES,
+                "memory_files": self.memory_files,
+                "memory_bytes": self.memory_bytes,
+                "disk_files": self.disk_files,
+                "disk_bytes": self.disk_bytes,
+                # Cada archivo en memoria evita una escritura y una lectura completas
+                "disk_io_avoided_bytes": 2 * self.memory_bytes,
+                "rejected_too_large": self.rejected_too_large,
+                "rejected_type": self.rejected_type,
+            }
+
+
+def content_error(head: bytes, mime_type: str) -> Optional[str]:
+    """
+    Motivo del rechazo si los primeros bytes del archivo no corresponden a
+    ``mime_type``, o None si el contenido es válido
+    """
+    if mime_type == 'application/pdf':
+        # Los lectores de PDF aceptan basura antes de la cabecera
+        valid = b"%PDF-" in head[:1024]
+    elif mime_type.startswith('image/'):
+        valid = head.startswith(_IMAGE_SIGNATURES) or (head[:4] == b"RIFF" and head[8:12] == b"WEBP")
+    elif mime_type.startswith('text/'):
+        valid = b"\x00" not in head
+    else:
+        return f"Tipo de archivo no soportado: {mime_type}"
+
+    if not valid:
+        return f"El contenido del archivo no corresponde al tipo {mime_type}"
+    return None
+
+
+def _rejection(status: int, detail: str) -> HTTPException:
+    upload_stats.record_rejected(status)
+    return HTTPException(status_code=status, detail=detail)
+
+
+def _format_size(size: int) -> str:
+    """``52428800`` -> ``"50 MB"``, ``524288`` -> ``"512 KB"``"""
+    for unit, factor in (("MB", 1024 * 1024), ("KB", 1024)):
+        if size >= factor:
+            return f"{round(size / factor, 1):g} {unit}"
+    return f"{size} bytes"
+
+
+def _too_large(max_bytes: int) -> HTTPException:
+    return _rejection(413, f"El archivo supera el tamaño máximo de {_format_size(max_bytes)}")
+
+
+async def _read_head(file: UploadFile, size: int, max_bytes: int) -> bytes:
+    """
+    Lee los primeros ``size`` bytes del upload y valida tipo y tamaño. El tipo
+    se valida con los primeros ``_SNIFF_BYTES``, antes de leer el resto.
+
+    Raises:
+        HTTPException: 415 si el contenido no corresponde al tipo declarado,
+            413 si lo leído ya supera ``max_bytes``
+    """
+    head = await file.read(_SNIFF_BYTES)
+    error = content_error(head, file.content_type or "application/octet-stream")
+    if error:
+        raise _rejection(415, error)
+    if size > len(head) == _SNIFF_BYTES:
+        head += await file.read(size - len(head))
+    if max_bytes > 0 and len(head) > max_bytes:
+        raise _too_large(max_bytes)
+    return head
+
+
+def _spill_to_disk(head: bytes, file: UploadFile, path: Path, max_bytes: int) -> int:
+    """
+    Escribe en disco lo ya leído más el resto del upload; devuelve el tamaño.
+    Corta la copia y lanza 413 apenas se supera ``max_bytes``.
+    """
+    size = len(head)
+    with open(path, "wb") as buffer:
+        buffer.write(head)
+        for chunk in iter(lambda: file.file.read(_CHUNK_SIZE), b""):
+            size += len(chunk)
+            if max_bytes > 0 and size > max_bytes:
+                raise _too_large(max_bytes)
+            buffer.write(chunk)
+    return size
+
+
+async def save_upload(file: UploadFile, path: Path, max_bytes: int = UPLOAD_MAX_BYTES) -> int:
+    """
+    Guarda el upload en ``path`` validando tipo y tamaño; devuelve el tamaño.
+    Si se rechaza, no deja el archivo a medio escribir.
+    """
+    try:
+        with metrics.stage("upload_read"):
+            head = await _read_head(file, _SNIFF_BYTES, max_bytes)
+        with metrics.stage("upload_write"):
+            return await run_in_threadpool(_spill_to_disk, head, file, path, max_bytes)
+    except HTTPException:
+        if os.path.exists(path):
+            os.remove(path)
+        raise
+
+
+_permits: Optional[asyncio.Semaphore] = None
+
+
+def _upload_permits() -> asyncio.Semaphore:
+    """Lugares para leer uploads; se crea dentro del event loop en ejecución"""
+    global _permits
+    if _permits is None:
+        # Con prefork.py max_inflight se ajusta dentro de cada worker, después del import
+        from extraction_executor import extraction_executor
+        _permits = asyncio.Semaphore(UPLOAD_MAX_INFLIGHT or extraction_executor.max_inflight)
+    return _permits
+
+
+@asynccontextmanager
+async def upload_source(file: UploadFile,
+                        max_memory_bytes: int = UPLOAD_MEMORY_MAX_BYTES) -> AsyncIterator[Source]:
+    """
+    Entrega el contenido de un upload listo para ``extraction_executor``:
+    bytes si entra en ``max_memory_bytes``, o la ruta de un archivo temporal
+    que se borra al salir del bloque. Lanza HTTPException (413 o 415) si el
+    upload no pasa la validación, sin haberlo leído completo.
+
+    Antes de leer espera uno de los ``UPLOAD_MAX_INFLIGHT`` lugares. Un upload
+    en memoria lo conserva hasta salir del bloque; uno volcado a disco lo
+    libera apenas termina de escribirse.
+
+    Uso:
+        async with upload_source(file) as source:
+            extraction = await extraction_executor.extract(source, mime_type)
+    """
+    permits = _upload_permits()
+    waiting_since = time.perf_counter()
+    await permits.acquire()
+    metrics.record_stage("upload_wait", time.perf_counter() - waiting_since)
+    holding = True
+    temp_path = None
+    try:
+        # Se lee un byte más que el umbral para saber si el archivo lo supera
+        # sin cargarlo entero
+        with metrics.stage("upload_read"):
+            head = await _read_head(file, max_memory_bytes + 1 if max_memory_bytes > 0 else 0,
+                                    UPLOAD_MAX_BYTES)
+
+        if max_memory_bytes > 0 and len(head) <= max_memory_bytes:
+            upload_stats.record(len(head), in_memory=True)
+            yield head
+            return
+
+        file_ext = os.path.splitext(file.filename or "")[1]
+        temp_path = UPLOAD_DIR / f"{uuid.uuid4()}{file_ext}"
+        with metrics.stage("upload_write"):
+            size = await run_in_threadpool(_spill_to_disk, head, file, temp_path, UPLOAD_MAX_BYTES)
+        # Ya en disco, el upload no ocupa memoria: el lugar se libera antes de extraer
+        del head
+        permits.release()
+        holding = False
+        upload_stats.record(size, in_memory=False)
+        yield str(temp_path)
+    finally:
+        if holding:
+            permits.release()
+        # Limpiar archivo temporal
+        if temp_path is not None and os.path.exists(temp_path):
+            os.remove(temp_path)
+
+
+class UploadLimitMiddleware:
+    """
+    Middleware ASGI que rechaza con 413, antes de leer el cuerpo, las
+    peticiones a ``paths`` cuyo ``Content-Length`` supera el límite más el
+    margen del multipart. Solo sirve para endpoints de un archivo: en los de
+    lotes el cuerpo lleva varios y el límite es por archivo.
+    """
+
+    def __init__(self, app, paths=("/ocr", "/process"), max_bytes: int = UPLOAD_MAX_BYTES):
+        self.app = app
+        self.paths = set(paths)
+        self.max_body = max_bytes + _MULTIPART_OVERHEAD
+        self.max_bytes = max_bytes
+
+    async def __call__(self, scope, receive, send):
+        if (self.max_bytes > 0 and scope["type"] == "http" and scope["method"] == "POST"
+                and scope["path"] in self.paths):
+            for name, value in scope["headers"]:
+                if name == b"content-length" and value.isdigit() and int(value) > self.max_body:
+                    await self._reject(send)
+                    return
+        await self.app(scope, receive, send)
+
+    async def _reject(self, send):
+        body = json.dumps({"detail": _too_large(self.max_bytes).detail}, ensure_ascii=False).encode("utf-8")
+        await send({
+            "type": "http.response.start",
+            "status": 413,
+            "headers": [
+                (b"content-type", b"application/json"),
+                (b"content-length", str(len(body)).encode("latin-1")),
+                # El cuerpo no se leyó: se cierra la conexión en lugar de drenarlo
+                (b"connection", b"close"),
+            ],
+        })
+        await send({"type": "http.response.body", "body": body})
+
+
+# Singleton
+upload_stats = UploadStats()
@@ -1,7 +1,7 @@
 import Button from '@/components/Button';
 import Card from '@/components/Card';
 import { useToast } from '@/components/ToastProvider';
-import { bulkProcessDocuments, checkMLHealth, ProcessedDocument } from '@/services/ml';
+import { checkMLHealth, ProcessedDocument, submitBulkJob, waitForJob } from '@/services/ml';
 import {
   AlertTriangle,
   Brain,
@@ -22,6 +22,7 @@ interface DocumentReview extends ProcessedDocument {
 const BulkImportPage: React.FC = () => {
   const [selectedFiles, setSelectedFiles] = useState<FileList | null>(null);
   const [importing, setImporting] = useState(false);
+  const [progress, setProgress] = useState<{ done: number; total: number } | null>(null);
   const [results, setResults] = useState<DocumentReview[]>([]);
   const [reviewMode, setReviewMode] = useState(false);
   const [saving, setSaving] = useState(false);
@@ -67,11 +68,19 @@ const BulkImportPage: React.FC = () => {
       // Convertir FileList a Array
       const filesArray = Array.from(selectedFiles);
       
-      // Procesar archivos con el backend ML
-      const result = await bulkProcessDocuments(filesArray);
+      // Encolar el lote en el backend ML y consultar el progreso: el trabajo
+      // sigue en el servidor aunque la petición tarde o se corte
+      const job = await submitBulkJob(filesArray);
+      setProgress({ done: 0, total: job.total });
+      const result = await waitForJob(job.job_id, status =>
+        setProgress({ done: status.processed + status.failed, total: status.total })
+      );
+      const documents = result.files
+        .map(file => file.result)
+        .filter((doc): doc is ProcessedDocument => Boolean(doc));
       
       // Convertir resultados para revisión
-      const reviewResults: DocumentReview[] = result.results.map(doc => ({
+      const reviewResults: DocumentReview[] = documents.map(doc => ({
         ...doc,
         approved: doc.success && (doc.confidence || 0) > 0.7, // Auto-aprobar si confianza > 70%
         reviewed: false
@@ -82,7 +91,7 @@ const BulkImportPage: React.FC = () => {
       
       if (result.processed > 0) {
         showToast(
-          `Procesados ${result.processed} de ${result.total_files} archivos. Revisa las clasificaciones antes de guardar.`,
+          `Procesados ${result.processed} de ${result.total} archivos. Revisa las clasificaciones antes de guardar.`,
           'success'
         );
       }
@@ -98,6 +107,7 @@ const BulkImportPage: React.FC = () => {
       showToast('Error al procesar los archivos. Verifica que el servidor ML esté corriendo.', 'error');
     } finally {
       setImporting(false);
+      setProgress(null);
     }
   };
 
@@ -289,6 +299,7 @@ const BulkImportPage: React.FC = () => {
                 <path className="opacity-75" fill="currentColor" d="M4 12a8 8 0 018-8V0C5.373 0 0 5.373 0 12h4zm2 5.291A7.962 7.962 0 014 12H0c0 3.042 1.135 5.824 3 7.938l3-2.647z"></path>
               </svg>
               Procesando con IA...
+              {progress && ` (${progress.done}/${progress.total})`}
             </>
           ) : (
             <>
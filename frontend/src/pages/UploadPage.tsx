@@ -1,6 +1,7 @@
 import { useState } from 'react';
 import { useNavigate } from 'react-router-dom';
 import { useUploadDocument } from '@/hooks/useDocuments';
+import { processDocument } from '@/services/ml';
 import { DocumentCreate } from '@/types';
 import { Upload, FileText, X } from 'lucide-react';
 
@@ -15,6 +16,7 @@ const UploadPage = () => {
     is_public: false,
   });
   const [dragActive, setDragActive] = useState(false);
+  const [extracting, setExtracting] = useState(false);
 
   const uploadMutation = useUploadDocument();
 
@@ -56,8 +58,30 @@ const UploadPage = () => {
       return;
     }
 
+    // Extraer el texto con el servicio ML y enviarlo junto a su confianza OCR;
+    // si el servicio no está disponible el documento se carga igualmente
+    let uploadMetadata = metadata;
+    setExtracting(true);
     try {
-      await uploadMutation.mutateAsync({ file, metadata });
+      const processed = await processDocument(file);
+      if (processed.success && !processed.partial) {
+        uploadMetadata = {
+          ...metadata,
+          category: metadata.category || processed.category,
+          extracted_text: processed.text,
+          ocr_confidence: processed.ocr_confidence != null
+            ? Math.round(processed.ocr_confidence)
+            : undefined,
+        };
+      }
+    } catch (error) {
+      console.warn('ML extraction failed, uploading without text:', error);
+    } finally {
+      setExtracting(false);
+    }
+
+    try {
+      await uploadMutation.mutateAsync({ file, metadata: uploadMetadata });
       navigate('/documents');
     } catch (error) {
       console.error('Upload failed:', error);
@@ -223,10 +247,12 @@ const UploadPage = () => {
           </button>
           <button
             type="submit"
-            disabled={!file || uploadMutation.isPending}
+            disabled={!file || extracting || uploadMutation.isPending}
             className="btn-primary disabled:opacity-50 disabled:cursor-not-allowed"
           >
-            {uploadMutation.isPending ? 'Cargando...' : 'Cargar documento'}
+            {extracting
+              ? 'Extrayendo texto...'
+              : uploadMutation.isPending ? 'Cargando...' : 'Cargar documento'}
           </button>
         </div>
       </form>
@@ -12,6 +12,8 @@ export const documentService = {
     if (metadata.category) formData.append('category', metadata.category);
     if (metadata.tags) formData.append('tags', metadata.tags);
     if (metadata.is_public !== undefined) formData.append('is_public', metadata.is_public.toString());
+    if (metadata.extracted_text !== undefined) formData.append('extracted_text', metadata.extracted_text);
+    if (metadata.ocr_confidence != null) formData.append('ocr_confidence', metadata.ocr_confidence.toString());
 
     const response = await api.post('/api/v1/documents/upload', formData, {
       headers: {
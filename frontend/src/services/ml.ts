@@ -9,8 +9,19 @@ const mlApi = axios.create({
   },
 });
 
+export interface PageInfo {
+  page: number;
+  method: 'text' | 'ocr';
+  seconds: number;
+  confidence?: number | null;
+  dpi?: number | null;
+}
+
 export interface OCRResponse {
   text: string;
+  pages: PageInfo[];
+  ocr_confidence?: number | null;
+  cached: boolean;
   success: boolean;
   message: string;
 }
@@ -24,6 +35,19 @@ export interface ClassificationResponse {
   message: string;
 }
 
+export interface BatchClassificationItem {
+  category: string;
+  confidence: number;
+  all_probabilities: Record<string, number>;
+}
+
+export interface BatchClassificationResponse {
+  total: number;
+  results: BatchClassificationItem[];
+  success: boolean;
+  message: string;
+}
+
 export interface ProcessedDocument {
   filename: string;
   text?: string;
@@ -33,6 +57,12 @@ export interface ProcessedDocument {
   confidence?: number;
   all_probabilities?: Record<string, number>;
   keywords?: string[];
+  pages?: PageInfo[];
+  page_count?: number | null;
+  ocr_confidence?: number | null;
+  cached?: boolean;
+  partial?: boolean;
+  remaining_job_id?: string | null;
   success: boolean;
   error?: string;
 }
@@ -44,6 +74,50 @@ export interface BulkProcessResult {
   results: ProcessedDocument[];
 }
 
+export interface BulkStreamItem extends ProcessedDocument {
+  type: 'file';
+  index: number;
+}
+
+export interface BulkStreamSummary {
+  type: 'summary';
+  total_files: number;
+  processed: number;
+  failed: number;
+}
+
+// El servidor corta el stream (p. ej. un archivo comprimido con demasiadas entradas)
+export interface BulkStreamError {
+  type: 'error';
+  detail: string;
+}
+
+export type JobStatus = 'queued' | 'running' | 'completed';
+
+export interface JobSubmitResponse {
+  job_id: string;
+  status: JobStatus;
+  total: number;
+}
+
+export interface JobFile {
+  index: number;
+  filename: string;
+  status: 'pending' | 'running' | 'done' | 'failed';
+  result?: ProcessedDocument | null;
+}
+
+export interface JobStatusResponse {
+  job_id: string;
+  status: JobStatus;
+  total: number;
+  processed: number;
+  failed: number;
+  created_at: string;
+  updated_at: string;
+  files: JobFile[];
+}
+
 export interface TrainingRequest {
   texts: string[];
   labels: string[];
@@ -53,6 +127,27 @@ export interface TrainingResponse {
   success: boolean;
   message: string;
   trained_samples: number;
+  model_version?: string;
+}
+
+export interface ModelVersion {
+  version: string;
+  file: string;
+  created_at: string;
+  source: string;
+  kind: 'vocabulary' | 'online';
+}
+
+export interface ModelInfoResponse {
+  active: string | null;
+  loaded: string | null;
+  versions: ModelVersion[];
+}
+
+export interface ModelReloadResponse {
+  success: boolean;
+  message: string;
+  model_version: string;
 }
 
 // Extraer texto de un archivo usando OCR
@@ -78,8 +173,22 @@ export const classifyText = async (text: string): Promise<ClassificationResponse
   return response.data;
 };
 
-// Procesar un documento completo (OCR + Clasificación)
-export const processDocument = async (file: File): Promise<ProcessedDocument> => {
+// Clasificar varios textos en una sola llamada
+export const classifyTexts = async (texts: string[]): Promise<BatchClassificationResponse> => {
+  const response = await mlApi.post<BatchClassificationResponse>('/classify-batch', {
+    texts,
+  });
+
+  return response.data;
+};
+
+// Procesar un documento completo (OCR + Clasificación).
+// Con firstPages, un PDF largo se clasifica por sus primeras páginas y el
+// resto queda en el trabajo remaining_job_id (ver waitForJob).
+export const processDocument = async (
+  file: File,
+  firstPages?: number
+): Promise<ProcessedDocument> => {
   const formData = new FormData();
   formData.append('file', file);
 
@@ -87,6 +196,7 @@ export const processDocument = async (file: File): Promise<ProcessedDocument> =>
     headers: {
       'Content-Type': 'multipart/form-data',
     },
+    params: firstPages ? { first_pages: firstPages } : undefined,
   });
 
   return response.data;
@@ -108,6 +218,119 @@ export const bulkProcessDocuments = async (files: File[]): Promise<BulkProcessRe
   return response.data;
 };
 
+// Procesar un lote enviado como un único archivo ZIP o tar
+export const bulkProcessArchive = async (archive: File): Promise<BulkProcessResult> => {
+  const formData = new FormData();
+  formData.append('file', archive);
+
+  const response = await mlApi.post<BulkProcessResult>('/bulk-process-archive', formData, {
+    headers: {
+      'Content-Type': 'multipart/form-data',
+    },
+  });
+
+  return response.data;
+};
+
+// Procesar múltiples documentos recibiendo cada resultado apenas termina.
+// Se usa fetch porque axios no expone el cuerpo en streaming en el navegador.
+export const bulkProcessDocumentsStream = async (
+  files: File[],
+  onResult: (item: BulkStreamItem) => void
+): Promise<BulkStreamSummary> => {
+  const formData = new FormData();
+  files.forEach(file => {
+    formData.append('files', file);
+  });
+
+  const response = await fetch(`${ML_API_URL}/bulk-process?stream=true`, {
+    method: 'POST',
+    body: formData,
+  });
+  if (!response.ok || !response.body) {
+    throw new Error(`Error ${response.status} al procesar el lote`);
+  }
+
+  const reader = response.body.getReader();
+  const decoder = new TextDecoder();
+  let buffer = '';
+  let summary: BulkStreamSummary | null = null;
+  let error: string | null = null;
+
+  for (;;) {
+    const { done, value } = await reader.read();
+    buffer += decoder.decode(value, { stream: !done });
+
+    const lines = buffer.split('\n');
+    buffer = lines.pop() ?? '';
+    for (const line of lines) {
+      if (!line.trim()) continue;
+      const event = JSON.parse(line) as BulkStreamItem | BulkStreamSummary | BulkStreamError;
+      if (event.type === 'summary') {
+        summary = event;
+      } else if (event.type === 'error') {
+        error = event.detail;
+      } else {
+        onResult(event);
+      }
+    }
+
+    if (done) break;
+  }
+
+  if (error) {
+    throw new Error(error);
+  }
+  if (!summary) {
+    throw new Error('El lote terminó sin resumen');
+  }
+  return summary;
+};
+
+// Encolar un procesamiento masivo en segundo plano
+export const submitBulkJob = async (files: File[]): Promise<JobSubmitResponse> => {
+  const formData = new FormData();
+  files.forEach(file => {
+    formData.append('files', file);
+  });
+
+  const response = await mlApi.post<JobSubmitResponse>('/jobs', formData, {
+    headers: {
+      'Content-Type': 'multipart/form-data',
+    },
+  });
+
+  return response.data;
+};
+
+// Consultar el estado de un trabajo
+export const getJob = async (
+  jobId: string,
+  includeResults = true
+): Promise<JobStatusResponse> => {
+  const response = await mlApi.get<JobStatusResponse>(`/jobs/${jobId}`, {
+    params: { include_results: includeResults },
+  });
+
+  return response.data;
+};
+
+// Esperar a que termine un trabajo, informando el progreso en cada consulta
+export const waitForJob = async (
+  jobId: string,
+  onProgress?: (job: JobStatusResponse) => void,
+  intervalMs = 1500
+): Promise<JobStatusResponse> => {
+  for (;;) {
+    const job = await getJob(jobId, false);
+    onProgress?.(job);
+    if (job.status === 'completed') {
+      return getJob(jobId);
+    }
+    await new Promise(resolve => setTimeout(resolve, intervalMs));
+  }
+};
+
 // Entrenar el clasificador con nuevos datos
 export const trainClassifier = async (
   texts: string[],
@@ -121,6 +344,21 @@ export const trainClassifier = async (
   return response.data;
 };
 
+// Consultar las versiones del modelo
+export const getModelInfo = async (): Promise<ModelInfoResponse> => {
+  const response = await mlApi.get<ModelInfoResponse>('/model');
+  return response.data;
+};
+
+// Activar una versión del modelo (sin versión, recarga la activa)
+export const reloadModel = async (version?: string): Promise<ModelReloadResponse> => {
+  const response = await mlApi.post<ModelReloadResponse>('/model/reload', {
+    version,
+  });
+
+  return response.data;
+};
+
 // Verificar salud del servicio ML
 export const checkMLHealth = async (): Promise<boolean> => {
   try {
@@ -135,8 +373,16 @@ export const checkMLHealth = async (): Promise<boolean> => {
 export default {
   extractText,
   classifyText,
+  classifyTexts,
   processDocument,
   bulkProcessDocuments,
+  bulkProcessDocumentsStream,
+  bulkProcessArchive,
+  submitBulkJob,
+  getJob,
+  waitForJob,
   trainClassifier,
+  getModelInfo,
+  reloadModel,
   checkMLHealth,
 };
@@ -64,6 +64,8 @@ export interface Document {
   category?: string;
   tags?: string;
   is_public: boolean;
+  extracted_text?: string;
+  ocr_confidence?: number;
   owner_id: number;
   owner: User;
   current_version: number;
@@ -77,6 +79,8 @@ export interface DocumentCreate {
   category?: string;
   tags?: string;
   is_public?: boolean;
+  extracted_text?: string;
+  ocr_confidence?: number;
 }
 
 export interface DocumentUpdate {